@@ -2,6 +2,73 @@ import React, { useState, useRef, useEffect } from 'react';
 import { Button, TextField, Box } from '@mui/material';
 import { ArrowForward } from '@mui/icons-material';
 
+// Convert between column labels (A, AA) and zero-based indices
+const columnToIndex = (column) =>
+  column.split('').reduce((index, char) => index * 26 + char.charCodeAt(0) - 64, 0) - 1;
+
+const indexToColumn = (index) => {
+  let label = '';
+  for (let n = index + 1; n > 0; n = Math.floor((n - 1) / 26)) {
+    label = String.fromCharCode(65 + ((n - 1) % 26)) + label;
+  }
+  return label;
+};
+
+// Number formats behind the backend's format names
+const NUMBER_FORMATS = {
+  CURRENCY: '$#,##0.00',
+  PERCENTAGE: '0.00%',
+  NUMBER: '#,##0.00',
+  DATE: 'mm/dd/yyyy'
+};
+
+// One-line summary of a format, clear or insert update
+const describeUpdate = (update) => {
+  if (update.type === 'format') return `${update.range}: ${update.format.toLowerCase()} format`;
+  if (update.type === 'insert') return `${update.range}: inserted, cells shifted ${update.shift}`;
+  return `${update.range}: cleared`;
+};
+
+// Collect the cells that changed since the last sync into rectangular blocks.
+// Each row contributes its changed column span, and consecutive rows with the
+// same span are merged into one block.
+const diffBlocks = (prevValues, values, origin) => {
+  const [, originColumn, originRow] = origin.replace(/\$/g, '').match(/^([A-Z]+)(\d+)$/);
+  const firstColumn = columnToIndex(originColumn);
+  const firstRow = parseInt(originRow, 10);
+  const blocks = [];
+  let current = null;
+
+  values.forEach((row, r) => {
+    const prevRow = prevValues[r] || [];
+    let left = -1;
+    let right = -1;
+    row.forEach((value, c) => {
+      if (prevRow[c] !== value) {
+        if (left < 0) left = c;
+        right = c;
+      }
+    });
+    if (left < 0) {
+      current = null;
+      return;
+    }
+    if (current && current.left === left && current.right === right) {
+      current.bottom = r;
+      current.values.push(row.slice(left, right + 1));
+    } else {
+      current = { top: r, bottom: r, left, right, values: [row.slice(left, right + 1)] };
+      blocks.push(current);
+    }
+  });
+
+  return blocks.map(block => ({
+    address: `${indexToColumn(firstColumn + block.left)}${firstRow + block.top}:` +
+      `${indexToColumn(firstColumn + block.right)}${firstRow + block.bottom}`,
+    values: block.values
+  }));
+};
+
 // New TypewriterText component
 const TypewriterText = ({ content, onComplete }) => {
   const [displayedContent, setDisplayedContent] = useState('');
@@ -33,6 +100,32 @@ const ChatInterface = () => {
   const messagesEndRef = useRef(null);
   const chatContainerRef = useRef(null);
   const wsRef = useRef(null);
+  // Last grid sent per sheet, used to send only changed blocks
+  const lastSyncRef = useRef({});
+  // Ids for request frames, echoed back on replies and cancellations
+  const requestCounterRef = useRef(0);
+  const nextRequestId = () => `r${++requestCounterRef.current}`;
+
+  // Build a versioned sync payload, falling back to the full grid when the
+  // sheet is new to this connection or its used range moved
+  const buildSyncPayload = (sheetName, address, values, forceFull = false) => {
+    const last = lastSyncRef.current[sheetName];
+    const version = last ? last.version + 1 : 1;
+    const origin = address.split('!').pop().split(':')[0];
+    lastSyncRef.current[sheetName] = { origin, values, version };
+
+    if (forceFull || !last || last.origin !== origin) {
+      return { sheet: sheetName, address, version, full: true, values };
+    }
+    return {
+      sheet: sheetName,
+      address,
+      version,
+      base_version: last.version,
+      full: false,
+      blocks: diffBlocks(last.values, values, origin)
+    };
+  };
 
   // Handle suggestion clicks
   const handleSuggestionClick = (suggestion) => {
@@ -42,9 +135,13 @@ const ChatInterface = () => {
         content: suggestion
       }]);
 
+      // A new request replaces one still in flight
       wsRef.current.send(JSON.stringify({
         type: 'suggestion',
-        content: suggestion
+        content: suggestion,
+        stream: true,
+        supersede: true,
+        request_id: nextRequestId()
       }));
     }
   };
@@ -61,51 +158,128 @@ const ChatInterface = () => {
     };
 
     const connectWebSocket = () => {
-      const ws = new WebSocket('ws://localhost:8000/ws');
+      // Resume the previous session so history survives reconnects to any worker
+      const sessionId = sessionStorage.getItem('fintelligentSession');
+      const ws = new WebSocket('ws://localhost:8000/ws' + (sessionId ? `?session=${sessionId}` : ''));
       
       ws.onopen = () => {
         console.log('Connected to WebSocket');
         setWsStatus('connected');
+        // A new connection starts without server-side snapshots
+        lastSyncRef.current = {};
       };
 
       ws.onmessage = async (event) => {
         console.log('Received message:', event.data);
         const response = JSON.parse(event.data);
+
+        if (response.session_id) {
+          sessionStorage.setItem('fintelligentSession', response.session_id);
+        }
+
+        // The backend lost track of our sheet versions, send the full grid
+        if (response.type === 'resync') {
+          syncExcelData(true);
+          return;
+        }
+
+        // A superseded request stops streaming; drop its partial reply
+        if (response.type === 'cancelled') {
+          setMessages(prev => prev.filter(msg => !msg.streaming));
+          return;
+        }
+
         setIsTyping(true);
+
+        // Whole-sheet summaries report blocks done before the answer streams
+        if (response.type === 'progress') {
+          const stage = response.stage === 'reduce' ? 'Combining summaries' : 'Reading the sheet';
+          setMessages(prev => [
+            ...prev.filter(msg => !msg.progress),
+            { type: 'assistant', content: `${stage}: ${response.done} of ${response.total} blocks...`, streaming: true, progress: true }
+          ]);
+          return;
+        }
+
+        // Streamed replies arrive as delta frames that grow a single message
+        if (response.type === 'delta') {
+          setMessages(prev => {
+            const last = prev[prev.length - 1];
+            if (last && last.progress) {
+              return [...prev.slice(0, -1), { type: 'assistant', content: response.content, streaming: true }];
+            }
+            if (last && last.streaming) {
+              return [...prev.slice(0, -1), { ...last, content: last.content + response.content }];
+            }
+            return [...prev, { type: 'assistant', content: response.content, streaming: true }];
+          });
+          return;
+        }
+
+        // The final frame of a stream replaces the partial message and is
+        // shown as-is, since the text has already been displayed
+        const isNew = !response.stream_end;
+        const dropStreaming = (prev) => prev.filter(msg => !msg.streaming);
+        if (!isNew) {
+          setIsTyping(false);
+        }
         
         try {
           if (response.type === 'excel_update') {
-            let updateSuccess = true;
-            try {
-              await Excel.run(async (context) => {
-                const sheet = context.workbook.worksheets.getActiveWorksheet();
-                
-                for (const update of response.updates) {
-                  const { cell, value } = update;
-                  const range = sheet.getRange(cell);
-                  range.values = [[value]];
-                }
-                
-                await context.sync();
-              });
-            } catch (error) {
-              console.error('Error updating Excel:', error);
-              updateSuccess = false;
+            // The server applies each batch itself when it can reach the workbook,
+            // including rolling back failed ones, so only write when asked to
+            let updateSuccess = !(response.update_status || []).some(
+              status => status.status === 'failed' || status.status === 'rolled_back' || status.status === 'not_applied'
+            );
+            if (response.apply_on_client) {
+              try {
+                await Excel.run(async (context) => {
+                  const sheet = context.workbook.worksheets.getActiveWorksheet();
+                  // Inserts come first so the other updates address the shifted sheet
+                  const ordered = [
+                    ...response.updates.filter(update => update.type === 'insert'),
+                    ...response.updates.filter(update => update.type !== 'insert')
+                  ];
+                  
+                  for (const update of ordered) {
+                    if (update.type === 'insert') {
+                      sheet.getRange(update.range).insert(
+                        update.shift === 'right' ? Excel.InsertShiftDirection.right : Excel.InsertShiftDirection.down
+                      );
+                    } else if (update.type === 'clear') {
+                      sheet.getRange(update.range).clear(Excel.ClearApplyTo.contents);
+                    } else if (update.type === 'format') {
+                      const range = sheet.getRange(update.range);
+                      range.load('rowCount,columnCount');
+                      await context.sync();
+                      const format = NUMBER_FORMATS[update.format] || 'General';
+                      range.numberFormat = Array.from({ length: range.rowCount }, () => Array(range.columnCount).fill(format));
+                    } else {
+                      sheet.getRange(update.cell).values = [[update.value]];
+                    }
+                  }
+                  
+                  await context.sync();
+                });
+              } catch (error) {
+                console.error('Error updating Excel:', error);
+                updateSuccess = false;
+              }
             }
 
-            setMessages(prev => [...prev, {
+            setMessages(prev => [...dropStreaming(prev), {
               type: 'assistant',
               content: response.content,
               updates: updateSuccess ? response.updates : undefined,
               error: !updateSuccess,
-              isNew: true
+              isNew
             }]);
           } else if (response.error) {
-            setMessages(prev => [...prev, {
+            setMessages(prev => [...dropStreaming(prev), {
               type: 'assistant',
               content: response.message || 'An error occurred',
               error: true,
-              isNew: true
+              isNew
             }]);
           } else {
             setMessages(prev => {
@@ -113,12 +287,12 @@ const ChatInterface = () => {
                 type: 'assistant',
                 content: response.content,
                 suggestions: isFirstMessage ? response.suggestions : undefined,
-                isNew: true
+                isNew
               };
               if (isFirstMessage) {
                 setTimeout(() => setIsFirstMessage(false), 0);
               }
-              return [...prev, newMessage];
+              return [...dropStreaming(prev), newMessage];
             });
           }
         } catch (error) {
@@ -157,21 +331,19 @@ const ChatInterface = () => {
   }, []);
 
   // Sync Excel data with backend
-  const syncExcelData = async () => {
+  const syncExcelData = async (forceFull = false) => {
     try {
       await Excel.run(async (context) => {
         const sheet = context.workbook.worksheets.getActiveWorksheet();
         const usedRange = sheet.getUsedRange();
+        sheet.load('name');
         usedRange.load(['values', 'address']);
         await context.sync();
 
-        if (wsRef.current && wsStatus === 'connected') {
+        if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
           wsRef.current.send(JSON.stringify({
             type: 'excel_sync',
-            content: {
-              values: usedRange.values,
-              address: usedRange.address
-            }
+            content: buildSyncPayload(sheet.name, usedRange.address, usedRange.values, forceFull)
           }));
         }
       });
@@ -191,16 +363,17 @@ const ChatInterface = () => {
         await Excel.run(async (context) => {
           const sheet = context.workbook.worksheets.getActiveWorksheet();
           const usedRange = sheet.getUsedRange();
+          sheet.load('name');
           usedRange.load(['values', 'address']);
           await context.sync();
 
           wsRef.current.send(JSON.stringify({
             type: 'message',
             content: inputValue.trim(),
-            excel_context: {
-              values: usedRange.values,
-              address: usedRange.address
-            }
+            stream: true,
+            supersede: true,
+            request_id: nextRequestId(),
+            sync: buildSyncPayload(sheet.name, usedRange.address, usedRange.values)
           }));
         });
       } catch (error) {
@@ -299,7 +472,7 @@ const ChatInterface = () => {
                         <div className="text-xs text-gray-600">Updates made:</div>
                         {message.updates.map((update, i) => (
                           <div key={i} className="text-xs">
-                            {update.cell}: {update.value}
+                            {update.type === 'update' ? `${update.cell}: ${update.value}` : describeUpdate(update)}
                           </div>
                         ))}
                       </Box>
@@ -0,0 +1,57 @@
+from typing import Optional, Tuple
+import re
+
+# Matches A1-style references such as "B2", "$AA$10" or "'My Sheet'!C3:D9"
+# Rows start at 1, so "A0" is not a cell
+CELL_PATTERN = re.compile(r'^\$?([A-Za-z]{1,3})\$?([1-9]\d*)$')
+
+def column_to_index(column: str) -> int:
+    """Convert a column label (A, Z, AA) to a zero-based index"""
+    index = 0
+    for char in column.upper():
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+def index_to_column(index: int) -> str:
+    """Convert a zero-based column index to its label"""
+    label = ""
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        label = chr(ord('A') + remainder) + label
+    return label
+
+def split_sheet(address: str) -> Tuple[Optional[str], str]:
+    """Split "Sheet1!A1:B2" into the sheet name and the range part"""
+    if '!' not in address:
+        return None, address
+    sheet, range_ = address.rsplit('!', 1)
+    return sheet.strip("'"), range_
+
+def parse_cell(cell: str) -> Tuple[int, int]:
+    """Parse a cell reference into zero-based (row, column)"""
+    match = CELL_PATTERN.match(cell.strip())
+    if not match:
+        raise ValueError(f"Invalid cell reference: {cell}")
+    column, row = match.groups()
+    return int(row) - 1, column_to_index(column)
+
+def parse_range(address: str) -> Tuple[int, int, int, int]:
+    """Parse a range into zero-based inclusive (first_row, first_col, last_row, last_col)"""
+    _, range_ = split_sheet(address)
+    start, _, end = range_.partition(':')
+    first_row, first_col = parse_cell(start)
+    last_row, last_col = parse_cell(end) if end else (first_row, first_col)
+    return (min(first_row, last_row), min(first_col, last_col),
+            max(first_row, last_row), max(first_col, last_col))
+
+def format_cell(row: int, column: int) -> str:
+    """Format zero-based (row, column) as an A1 reference"""
+    return f"{index_to_column(column)}{row + 1}"
+
+def format_range(first_row: int, first_col: int, last_row: int, last_col: int) -> str:
+    """Format zero-based inclusive bounds as an A1 range"""
+    start = format_cell(first_row, first_col)
+    if (first_row, first_col) == (last_row, last_col):
+        return start
+    return f"{start}:{format_cell(last_row, last_col)}"
@@ -0,0 +1,368 @@
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from datetime import date, datetime, time
+from .addressing import parse_range, index_to_column
+import numpy as np
+import hashlib
+import json
+import pickle
+import struct
+
+def _is_blank(value: Any) -> bool:
+    return value is None or value == "" or (isinstance(value, float) and value != value)
+
+def _is_number(value: Any) -> bool:
+    return type(value) in (int, float)
+
+def _category_key(value: Any) -> Tuple[type, Any]:
+    # True, 1 and 1.0 hash alike but are different cells
+    return type(value), value
+
+# Dtypes of column buffers in serialized snapshots, fixed to little-endian
+BUFFER_DTYPES = {"number": "<f8", "text": "<i4"}
+# Cell types JSON cannot carry, tagged by name in serialized categories
+TEMPORAL_TYPES = {"datetime": datetime, "date": date, "time": time}
+
+def _encode_category(value: Any) -> Any:
+    for name, kind in TEMPORAL_TYPES.items():
+        if type(value) is kind:
+            return {name: value.isoformat()}
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+def _decode_category(value: Any) -> Any:
+    if isinstance(value, dict):
+        (name, text), = value.items()
+        return TEMPORAL_TYPES[name].fromisoformat(text)
+    if isinstance(value, list):
+        raise ValueError("Unexpected list among categories")
+    return value
+
+class Column:
+    """
+    One column of cells. Purely numeric columns are float64 arrays with NaN
+    for blanks; any other column is dictionary-encoded as int32 codes into a
+    list of distinct values, with -1 for blanks. Arrays are read-only.
+    """
+
+    __slots__ = ("kind", "data", "categories", "_lookup")
+
+    def __init__(self, kind: str, data: np.ndarray, categories: Optional[List[Any]] = None,
+                 lookup: Optional[Dict[Tuple[type, Any], int]] = None):
+        data.flags.writeable = False
+        self.kind = kind
+        self.data = data
+        # Append-only and shared between versions of a column: older versions
+        # never hold codes past the categories that existed when they were made
+        self.categories = categories
+        self._lookup = lookup
+
+    @classmethod
+    def encode(cls, values: Sequence[Any]) -> "Column":
+        if all(_is_number(v) or _is_blank(v) for v in values):
+            data = np.fromiter((np.nan if _is_blank(v) else v for v in values), dtype=np.float64, count=len(values))
+            return cls("number", data)
+        categories: List[Any] = []
+        lookup: Dict[Tuple[type, Any], int] = {}
+
+        def code(value: Any) -> int:
+            key = _category_key(value)
+            if key not in lookup:
+                lookup[key] = len(categories)
+                categories.append(value)
+            return lookup[key]
+
+        codes = np.fromiter((-1 if _is_blank(v) else code(v) for v in values), dtype=np.int32, count=len(values))
+        return cls("text", codes, categories, lookup)
+
+    @classmethod
+    def blank(cls, length: int) -> "Column":
+        return cls("number", np.full(length, np.nan))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def get(self, row: int) -> Any:
+        if self.kind == "number":
+            value = self.data[row]
+            return None if np.isnan(value) else float(value)
+        code = self.data[row]
+        return None if code < 0 else self.categories[code]
+
+    def to_list(self) -> List[Any]:
+        if self.kind == "number":
+            return [None if v != v else v for v in self.data.tolist()]
+        categories = self.categories
+        return [None if c < 0 else categories[c] for c in self.data.tolist()]
+
+    def numeric(self) -> np.ndarray:
+        """Values as float64 with NaN for blanks and non-numeric cells, without copying numeric columns"""
+        if self.kind == "number":
+            return self.data
+        as_float = np.array([v if _is_number(v) else np.nan for v in self.categories] + [np.nan], dtype=np.float64)
+        # Code -1 picks the trailing NaN
+        return as_float[self.data]
+
+    def count(self) -> int:
+        """Number of non-blank cells"""
+        if self.kind == "number":
+            return int(np.count_nonzero(~np.isnan(self.data)))
+        return int(np.count_nonzero(self.data >= 0))
+
+    def distinct(self) -> int:
+        if self.kind == "number":
+            return int(len(np.unique(self.data[~np.isnan(self.data)])))
+        return int(len(np.unique(self.data[self.data >= 0])))
+
+    def with_values(self, updates: Dict[int, Any], length: int) -> "Column":
+        """A copy resized to length with some cells replaced; this column is unchanged"""
+        if not updates and length == len(self):
+            return self
+        if self.kind == "number" and all(_is_number(v) or _is_blank(v) for v in updates.values()):
+            data = np.full(length, np.nan)
+            keep = min(length, len(self))
+            data[:keep] = self.data[:keep]
+            for row, value in updates.items():
+                data[row] = np.nan if _is_blank(value) else value
+            return Column("number", data)
+
+        if self.kind == "number":
+            # A non-numeric value turns the column into a dictionary-encoded one
+            values = self.to_list()[:length]
+            values.extend([None] * (length - len(values)))
+            for row, value in updates.items():
+                values[row] = value
+            return Column.encode(values)
+
+        codes = np.full(length, -1, dtype=np.int32)
+        keep = min(length, len(self))
+        codes[:keep] = self.data[:keep]
+        for row, value in updates.items():
+            if _is_blank(value):
+                codes[row] = -1
+            else:
+                key = _category_key(value)
+                code = self._lookup.get(key)
+                if code is None:
+                    code = self._lookup[key] = len(self.categories)
+                    self.categories.append(value)
+                codes[row] = code
+        return Column("text", codes, self.categories, self._lookup)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+class ColumnarSheet:
+    """
+    Immutable columnar snapshot of a sheet's used range: a header row, typed
+    columns and the address they came from. Managers share one instance;
+    only frames sent to the client turn it back into rows.
+    """
+
+    def __init__(self, columns: Tuple[Column, ...], headers: Tuple[str, ...], address: str,
+                 has_header: bool, sheet: Optional[str] = None):
+        self.columns = columns
+        self.headers = headers
+        self.address = address
+        self.has_header = has_header
+        self.sheet = sheet
+        first_row, self.first_col, _, _ = parse_range(address) if address else (0, 0, 0, 0)
+        # Zero-based sheet row of the first data row
+        self.data_start_row = first_row + (1 if has_header else 0)
+        self.row_count = len(columns[0]) if columns else 0
+        self.column_letters = tuple(index_to_column(self.first_col + i) for i in range(len(columns)))
+        self._fingerprint: Optional[str] = None
+
+    @classmethod
+    def from_rows(cls, values: Any, address: str, sheet: Optional[str] = None,
+                  headers: Optional[Sequence[Any]] = None) -> "ColumnarSheet":
+        """Build from a list of rows; a first row holding any text is taken as the header"""
+        # xlwings collapses single rows and cells, restore the 2D shape
+        if values is None:
+            values = []
+        elif not isinstance(values, (list, tuple)):
+            values = [[values]]
+        elif values and not isinstance(values[0], (list, tuple)):
+            values = [values]
+
+        has_header = headers is None and bool(values) and any(isinstance(v, str) for v in values[0])
+        if has_header:
+            headers, values = values[0], values[1:]
+
+        width = max([len(row) for row in values] + [len(headers or [])])
+        rows = [row if len(row) == width else list(row) + [None] * (width - len(row)) for row in values]
+        columns = tuple(Column.encode(column) for column in zip(*rows)) if rows else tuple(
+            Column.blank(0) for _ in range(width)
+        )
+        return cls(columns, cls._unique_headers(headers, width), address, has_header, sheet)
+
+    @staticmethod
+    def _unique_headers(headers: Optional[Sequence[Any]], width: int) -> Tuple[str, ...]:
+        headers = list(headers or [])[:width]
+        headers += [None] * (width - len(headers))
+        unique, seen = [], {}
+        for i, header in enumerate(headers):
+            header = str(header) if not _is_blank(header) else f"Column{i}"
+            if header in seen:
+                seen[header] += 1
+                header = f"{header}_{seen[header]}"
+            else:
+                seen[header] = 0
+            unique.append(header)
+        return tuple(unique)
+
+    @property
+    def column_count(self) -> int:
+        return len(self.columns)
+
+    @property
+    def cell_count(self) -> int:
+        return self.row_count * self.column_count
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self.columns)
+
+    def is_empty(self) -> bool:
+        return not self.has_header and not any(column.count() for column in self.columns)
+
+    def row(self, r: int) -> List[Any]:
+        return [column.get(r) for column in self.columns]
+
+    def value_at(self, row: int, column: int) -> Any:
+        """Value at a zero-based sheet position, the header row included"""
+        c = column - self.first_col
+        if not 0 <= c < self.column_count:
+            return None
+        if self.has_header and row == self.data_start_row - 1:
+            return self.headers[c]
+        r = row - self.data_start_row
+        return self.columns[c].get(r) if 0 <= r < self.row_count else None
+
+    def to_rows(self, include_header: bool = True) -> List[List[Any]]:
+        """Rows for serialization, with the header row first when the sheet has one"""
+        rows = [list(row) for row in zip(*(column.to_list() for column in self.columns))]
+        if include_header and self.has_header:
+            rows.insert(0, list(self.headers))
+        return rows
+
+    def numeric_matrix(self, indices: Sequence[int]) -> np.ndarray:
+        """Rows x columns float64 matrix of the given columns"""
+        if not indices:
+            return np.empty((self.row_count, 0))
+        return np.column_stack([self.columns[i].numeric() for i in indices])
+
+    def to_frame(self):
+        """pandas view of the data rows, for code that needs a DataFrame"""
+        import pandas as pd
+        return pd.DataFrame(
+            {i: column.data if column.kind == "number" else column.to_list() for i, column in enumerate(self.columns)},
+            copy=False
+        )
+
+    def fingerprint(self) -> str:
+        """Content hash over the column buffers, computed once"""
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(pickle.dumps((self.address, self.headers, self.has_header)))
+            for column in self.columns:
+                digest.update(column.kind.encode())
+                digest.update(column.data.tobytes())
+                if column.kind == "text":
+                    digest.update(pickle.dumps(column.categories[:int(column.data.max(initial=-1)) + 1]))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def to_bytes(self, metadata: Optional[Dict[str, Any]] = None) -> bytes:
+        """
+        Serialize for a shared store: a length-prefixed JSON header, then each
+        column's buffer. Loading it runs no code, unlike pickle.
+        """
+        header = {
+            "meta": metadata or {},
+            "address": self.address,
+            "headers": list(self.headers),
+            "has_header": self.has_header,
+            "sheet": self.sheet,
+            "columns": [
+                {"kind": column.kind, "length": len(column),
+                 "categories": [_encode_category(v) for v in column.categories] if column.kind == "text" else None}
+                for column in self.columns
+            ]
+        }
+        encoded = json.dumps(header).encode()
+        buffers = [column.data.astype(BUFFER_DTYPES[column.kind], copy=False).tobytes() for column in self.columns]
+        return struct.pack("<I", len(encoded)) + encoded + b"".join(buffers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Tuple["ColumnarSheet", Dict[str, Any]]:
+        """Snapshot and metadata written by to_bytes; raises ValueError on malformed data"""
+        try:
+            (length,) = struct.unpack_from("<I", data)
+            header = json.loads(data[4:4 + length])
+            offset = 4 + length
+            columns = []
+            for spec in header["columns"]:
+                kind, rows = spec["kind"], int(spec["length"])
+                dtype = np.dtype(BUFFER_DTYPES[kind])
+                end = offset + rows * dtype.itemsize
+                if rows < 0 or end > len(data):
+                    raise ValueError("Column buffer runs past the end of the data")
+                array = np.frombuffer(data, dtype=dtype, count=rows, offset=offset).astype(dtype.newbyteorder("="))
+                offset = end
+                if kind == "number":
+                    columns.append(Column("number", array))
+                    continue
+                categories = [_decode_category(v) for v in spec["categories"]]
+                if rows and (array.min() < -1 or array.max() >= len(categories)):
+                    raise ValueError("Category code out of range")
+                lookup = {_category_key(v): i for i, v in enumerate(categories)}
+                columns.append(Column("text", array, categories, lookup))
+            if offset != len(data) or len({len(column) for column in columns}) > 1:
+                raise ValueError("Column lengths do not match")
+            table = cls(tuple(columns), tuple(str(h) for h in header["headers"]), str(header["address"]),
+                        bool(header["has_header"]), header["sheet"])
+        except (KeyError, TypeError, struct.error, json.JSONDecodeError) as e:
+            raise ValueError(f"Malformed snapshot: {e}")
+        return table, header["meta"]
+
+    def with_blocks(self, address: str, blocks: List[Dict[str, Any]]) -> "ColumnarSheet":
+        """
+        A new snapshot resized to address with the cell blocks written.
+        Columns no block touches are shared with this snapshot.
+        """
+        first_row, first_col, last_row, last_col = parse_range(address)
+        if (first_row, self.first_col) != (self.data_start_row - self.has_header, first_col):
+            raise ValueError("Used range origin moved; a full resync is required")
+
+        row_count = last_row - first_row + 1 - self.has_header
+        width = last_col - first_col + 1
+        updates: List[Dict[int, Any]] = [{} for _ in range(width)]
+        headers = list(self.headers[:width]) + [None] * max(0, width - self.column_count)
+        for block in blocks:
+            top, left, _, _ = parse_range(block["address"])
+            for r, row in enumerate(block["values"]):
+                for c, value in enumerate(row):
+                    column = left - first_col + c
+                    data_row = top + r - self.data_start_row
+                    if data_row < 0:
+                        headers[column] = value
+                    else:
+                        updates[column][data_row] = value
+
+        columns = tuple(
+            (self.columns[c] if c < self.column_count else Column.blank(0)).with_values(updates[c], row_count)
+            for c in range(width)
+        )
+        return ColumnarSheet(columns, self._unique_headers(headers, width), address, self.has_header, self.sheet)
+
+def table_from_context(excel_context: Dict[str, Any]) -> Optional[ColumnarSheet]:
+    """The snapshot of a context, building one from raw values sent by clients"""
+    table = excel_context.get("table")
+    if table is None and excel_context.get("values"):
+        table = ColumnarSheet.from_rows(
+            excel_context["values"], excel_context.get("address") or "A1",
+            excel_context.get("sheet"), excel_context.get("headers")
+        )
+    return table
@@ -4,11 +4,81 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# Get API key from environment variable
+# DEBUG adds per-stage spans to the log, INFO one structured line per request
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Expose /debug/profiler/start and /stop, which sample the event loop's stack
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_INTERVAL_SECONDS = float(os.getenv("PROFILER_INTERVAL_SECONDS", "0.005"))
+# Directory to record every /ws session into, for replay by benchmarks.harness
+WS_RECORD_DIR = os.getenv("WS_RECORD_DIR") or None
+
+# Get API key from environment variable; without one the app still starts,
+# and requests that need the model fail with an error reply
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("No OPENAI_API_KEY found in environment variables")
+# Build the OpenAI client and open a connection to the endpoint in the
+# background at startup; otherwise both wait for the first completion
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "true").lower() == "true"
+
+# Optional override so the backend can talk to any OpenAI-compatible endpoint
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+
+# Maximum number of in-flight completions across all connections
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+# Upstream token budget per minute shared fairly by all connections, 0 to disable,
+# and the tokens reserved for each reply when estimating a request's cost
+AI_TOKENS_PER_MINUTE = int(os.getenv("AI_TOKENS_PER_MINUTE", "0"))
+AI_COMPLETION_TOKENS = int(os.getenv("AI_COMPLETION_TOKENS", "512"))
+# Attempts per completion; transient failures back off exponentially with jitter
+AI_RETRY_ATTEMPTS = int(os.getenv("AI_RETRY_ATTEMPTS", "3"))
+AI_RETRY_BASE_SECONDS = float(os.getenv("AI_RETRY_BASE_SECONDS", "0.5"))
+AI_RETRY_MAX_SECONDS = float(os.getenv("AI_RETRY_MAX_SECONDS", "8"))
+# Maximum number of frames queued per socket before reads are paused
+CONNECTION_QUEUE_SIZE = int(os.getenv("CONNECTION_QUEUE_SIZE", "16"))
+# Seconds a queued excel_sync waits for newer syncs of the same sheet to fold in
+SYNC_DEBOUNCE_SECONDS = float(os.getenv("SYNC_DEBOUNCE_SECONDS", "0.15"))
+
+# Completion cache: in-memory LRU with TTL, optionally backed by sqlite
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "900"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH") or None
+# Replies that modify the sheet are not cached unless enabled
+CACHE_EXCEL_UPDATES = os.getenv("CACHE_EXCEL_UPDATES", "false").lower() == "true"
+
+# Shared state for sessions, sheet snapshots and cached replies; a redis:// URL
+# lets several workers serve the same clients, anything else keeps it in-process
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL") or None
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+# Seconds a broadcast waits on one socket before giving up on it
+BROADCAST_TIMEOUT_SECONDS = float(os.getenv("BROADCAST_TIMEOUT_SECONDS", "5"))
+
+# Approximate token budget for the sheet description in each prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Budget for the index of the other sheets, and the cell bound on sheets loaded on demand
+WORKBOOK_TOKEN_BUDGET = int(os.getenv("WORKBOOK_TOKEN_BUDGET", "600"))
+WORKBOOK_CACHE_CELLS = int(os.getenv("WORKBOOK_CACHE_CELLS", "1000000"))
+# Seconds between background checks of the active sheet, and the longest its
+# values are trusted when nothing signals a change
+EXCEL_CHECK_INTERVAL_SECONDS = float(os.getenv("EXCEL_CHECK_INTERVAL_SECONDS", "1"))
+EXCEL_MAX_AGE_SECONDS = float(os.getenv("EXCEL_MAX_AGE_SECONDS", "10"))
+
+# Conversation memory per connection; older turns are summarized past the budget
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "40"))
+
+# Answer simple formula and formatting requests locally, without the LLM
+LOCAL_INTENTS = os.getenv("LOCAL_INTENTS", "true").lower() == "true"
+
+# Whole-sheet requests on large sheets are answered by summarizing blocks of
+# about this many tokens, this many at once per request, then combining them
+SUMMARY_BLOCK_TOKENS = int(os.getenv("SUMMARY_BLOCK_TOKENS", "3000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+
+# Have the model write each sheet version's welcome message ahead of time, once
+# syncs have been quiet this long; connects use a template until it is ready
+PRECOMPUTE_WELCOME = os.getenv("PRECOMPUTE_WELCOME", "true").lower() == "true"
+PRECOMPUTE_DELAY_SECONDS = float(os.getenv("PRECOMPUTE_DELAY_SECONDS", "3"))
 
 DEBUG_MODE = True
 HOST = "0.0.0.0"
-PORT = 8000
\ No newline at end of file
+PORT = 8000
@@ -1,13 +1,58 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import time
+# Taken first so the startup report covers every import below
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-import json
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import uuid
 from .managers.connection_manager import ConnectionManager
 from .managers.excel_manager import ExcelManager
 from .managers.ai_manager import AIManager
+from .managers.cache_manager import ResponseCache
+from .managers.context_builder import ContextBuilder
+from .managers.intent_engine import IntentEngine
+from .managers.state_store import create_state_store
+from .managers.request_scheduler import RequestScheduler, RequestCancelled
+from .managers.precompute_manager import PrecomputeManager, WELCOME_PROMPT
+from .columnar import table_from_context
+from .recorder import SessionRecorder
+from .telemetry import configure_logging, metrics, trace, span, SamplingProfiler
 from . import config
 import re
 
-app = FastAPI(title="Fintelligent")
+configure_logging(config.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+# Seconds from the start of this module's import to each startup milestone
+startup_seconds = {}
+
+async def warm_up():
+    """Build the LLM client and connect to the endpoint before the first request needs them"""
+    try:
+        timings = await ai_manager.warm_up()
+    except Exception as e:
+        logger.warning("Skipping warm-up: %s", e)
+        return
+    startup_seconds["warm"] = time.perf_counter() - _import_started
+    logger.info("Warmed up after %.0f ms: client %.0f ms, connection %.0f ms",
+                startup_seconds["warm"] * 1000, timings["client"] * 1000, timings["connect"] * 1000)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up runs in the background so the worker takes connections at once
+    startup_seconds["ready"] = time.perf_counter() - _import_started
+    logger.info("Imported in %.0f ms, ready after %.0f ms",
+                startup_seconds["import"] * 1000, startup_seconds["ready"] * 1000)
+    task = asyncio.create_task(warm_up()) if config.STARTUP_WARM_UP else None
+    yield
+    if task:
+        task.cancel()
+
+app = FastAPI(title="Fintelligent", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,107 +62,312 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-connection_manager = ConnectionManager()
-excel_manager = ExcelManager()
-ai_manager = AIManager(config.OPENAI_API_KEY)
+# Sessions, snapshots and cached replies live here so any worker can serve a client;
+# None with a single worker, which keeps them in process
+state_store = create_state_store(config.STATE_BACKEND_URL)
+connection_manager = ConnectionManager(
+    history_token_budget=config.HISTORY_TOKEN_BUDGET,
+    history_max_messages=config.HISTORY_MAX_MESSAGES,
+    store=state_store,
+    session_ttl=config.SESSION_TTL_SECONDS,
+    broadcast_timeout=config.BROADCAST_TIMEOUT_SECONDS,
+    recorder=SessionRecorder(config.WS_RECORD_DIR) if config.WS_RECORD_DIR else None
+)
+excel_manager = ExcelManager(
+    max_sheet_cells=config.WORKBOOK_CACHE_CELLS,
+    check_interval=config.EXCEL_CHECK_INTERVAL_SECONDS,
+    max_age=config.EXCEL_MAX_AGE_SECONDS
+)
+ai_manager = AIManager(
+    config.OPENAI_API_KEY,
+    base_url=config.OPENAI_BASE_URL,
+    model=config.OPENAI_MODEL,
+    max_concurrency=config.AI_MAX_CONCURRENCY,
+    tokens_per_minute=config.AI_TOKENS_PER_MINUTE,
+    completion_tokens=config.AI_COMPLETION_TOKENS,
+    retry_attempts=config.AI_RETRY_ATTEMPTS,
+    retry_base_delay=config.AI_RETRY_BASE_SECONDS,
+    retry_max_delay=config.AI_RETRY_MAX_SECONDS,
+    summary_block_tokens=config.SUMMARY_BLOCK_TOKENS,
+    summary_concurrency=config.SUMMARY_CONCURRENCY,
+    cache=ResponseCache(
+        max_entries=config.CACHE_MAX_ENTRIES,
+        ttl_seconds=config.CACHE_TTL_SECONDS,
+        db_path=config.CACHE_DB_PATH,
+        store=state_store
+    ),
+    cache_updates=config.CACHE_EXCEL_UPDATES,
+    context_builder=ContextBuilder(
+        token_budget=config.CONTEXT_TOKEN_BUDGET,
+        workbook_budget=config.WORKBOOK_TOKEN_BUDGET
+    ),
+    intent_engine=IntentEngine() if config.LOCAL_INTENTS else None
+)
+# Suggestions and welcome messages, worked out per sheet version ahead of the client
+precompute = PrecomputeManager(
+    ai_manager,
+    cache=ai_manager.cache,
+    delay=config.PRECOMPUTE_DELAY_SECONDS,
+    llm_welcome=config.PRECOMPUTE_WELCOME
+)
+
+async def apply_excel_updates(response: dict):
+    """
+    Apply the updates carried by an excel_update response as one batch. Each
+    batch is applied in one place only: here when the server can reach the
+    workbook, otherwise by the add-in, told so by apply_on_client.
+    """
+    if response.get("type") == "excel_update" and response.get("updates"):
+        if not await excel_manager.run(excel_manager.connect_to_excel):
+            response["apply_on_client"] = True
+            return
+        # Evaluate the downstream cells locally before writing
+        impact = await excel_manager.preview_updates(response["updates"])
+        result = await excel_manager.apply_updates(response["updates"])
+        response["update_status"] = result["statuses"]
+        
+        # Add appropriate status message
+        if result["success"]:
+            response["content"] += "\n\nExcel has been updated successfully!"
+            if impact:
+                response["impact"] = impact
+                response["content"] += "\n\nRecalculated cells:\n" + "\n".join(
+                    f"- {cell['cell']}: {cell['old']} -> {cell['new']}" for cell in impact[:10]
+                )
+        elif result["rolled_back"]:
+            response["content"] += "\n\nAn Excel update failed, so all changes were rolled back. Please check the formula and try again."
+        else:
+            response["content"] += "\n\nSome Excel updates failed. Please check the formula and try again."
+
+# Frame types used as metric labels; anything else is counted as "other"
+FRAME_TYPES = {"message", "suggestion", "excel_sync", "file"}
+
+def _runtime_gauges() -> dict:
+    """Gauges read from the managers whenever /metrics is scraped"""
+    cache = ai_manager.cache.stats() if ai_manager.cache else {}
+    limiter = ai_manager.limiter.stats()
+    return {
+        "fintelligent_active_connections": len(connection_manager.active_connections),
+        "fintelligent_cache_hits": cache.get("hits"),
+        "fintelligent_cache_misses": cache.get("misses"),
+        "fintelligent_cache_disk_hits": cache.get("disk_hits"),
+        "fintelligent_cache_shared_hits": cache.get("shared_hits"),
+        "fintelligent_cache_hit_ratio": cache.get("hit_ratio"),
+        "fintelligent_ai_in_flight": limiter["in_flight"],
+        "fintelligent_ai_queued": limiter["queued"],
+        "fintelligent_ai_tokens_available": limiter["tokens"],
+        "fintelligent_startup_import_seconds": startup_seconds.get("import"),
+        "fintelligent_startup_ready_seconds": startup_seconds.get("ready"),
+        "fintelligent_startup_warm_seconds": startup_seconds.get("warm"),
+    }
+
+metrics.register_collector(_runtime_gauges)
+profiler = SamplingProfiler(config.PROFILER_INTERVAL_SECONDS) if config.PROFILER_ENABLED else None
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of the stage histograms, counters and gauges"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/debug/profiler/start")
+async def start_profiler():
+    """Start sampling the event loop thread"""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler disabled, set PROFILER_ENABLED=true")
+    profiler.start()
+    return {"running": True}
+
+@app.post("/debug/profiler/stop")
+async def stop_profiler():
+    """Stop sampling and return folded stacks for a flame graph"""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler disabled, set PROFILER_ENABLED=true")
+    return PlainTextResponse(profiler.stop())
+
+async def handle_message(websocket: WebSocket, message: dict, scheduler: RequestScheduler = None):
+    """Process a single client frame under a request trace"""
+    message_type = message.get("type", "")
+    request_id = message.get("request_id") or uuid.uuid4().hex[:12]
+    with trace(request_id, message_type if message_type in FRAME_TYPES else "other") as request:
+        await process_message(websocket, message, scheduler, request)
+
+async def process_message(websocket: WebSocket, message: dict, scheduler, request):
+    """Process a single client frame and send the response"""
+    logger.debug("Received message: %s", message)
+    session = connection_manager.get_session(websocket)
+    snapshots = session.snapshots
+    
+    try:
+        message_type = message.get("type", "")
+        
+        # Apply the sheet sync carried by the frame before building context
+        sync = message.get("content") if message_type == "excel_sync" else message.get("sync")
+        with span("sync"):
+            synced = not isinstance(sync, dict) or await snapshots.sync(sync)
+        if isinstance(sync, dict) and synced:
+            # The client saw the sheet change, so the server-side read is stale too
+            excel_manager.mark_changed()
+        if not synced:
+            # Our snapshot is out of step with the client, ask for the full sheet
+            await connection_manager.send(websocket, {"type": "resync", "sheet": snapshots.active_sheet})
+            if message_type == "excel_sync":
+                return
+        
+        # Prefer the synced snapshot and only fall back to reading Excel directly
+        excel_content = message.get("excel_context") or await snapshots.load_context()
+        if excel_content and "values" in excel_content:
+            # Raw rows sent by older clients become a columnar snapshot once, here
+            excel_content = {k: v for k, v in excel_content.items() if k != "values"}
+            with span("table_build"):
+                excel_content["table"] = table_from_context(message["excel_context"])
+        if excel_content is None:
+            excel_content = await excel_manager.get_context()
+        
+        if message_type == "excel_sync":
+            # Handle Excel sync requests
+            response = {
+                "type": "message",
+                "content": "Excel data synced successfully",
+                "suggestions": await precompute.suggestions(excel_content, session.session_id)
+            }
+            await connection_manager.send(websocket, response)
+        
+        elif message_type in ["message", "suggestion"]:
+            content = message.get("content", "")
+            if isinstance(sync, dict) and synced:
+                precompute.schedule(excel_content, session.session_id)
+            # Clients can bypass the response cache for a single request
+            use_cache = not message.get("no_cache", False)
+            
+            # Index the other sheets and pull in the ones the message refers to
+            workbook = await excel_manager.get_workbook_context(
+                content, excel_content.get("sheet") if excel_content else None
+            )
+            if workbook:
+                excel_content = dict(excel_content or {}, workbook=workbook)
+            
+            async def respond() -> dict:
+                if message.get("stream"):
+                    # Forward progress and completion deltas as they arrive, then the parsed result
+                    response = None
+                    async for frame in ai_manager.stream_message(content, excel_content, use_cache, session):
+                        if frame["type"] in ("delta", "progress"):
+                            await connection_manager.send(websocket, frame)
+                        else:
+                            response = frame
+                    if response is None:
+                        # The stream stopped after deltas without a final frame
+                        response = {"type": "error", "content": "Error: the reply ended before it was complete",
+                                    "error": True}
+                    response["stream_end"] = True
+                    return response
+                # Process message with AI
+                return await ai_manager.analyze_message(content, excel_content, use_cache, session)
+            
+            # A cancel frame or a superseding message stops the request here;
+            # the client has already been told it was cancelled
+            try:
+                response = await scheduler.cancellable(respond()) if scheduler else await respond()
+            except RequestCancelled:
+                request.outcome = "cancelled"
+                return
+            if message.get("request_id"):
+                response["request_id"] = message["request_id"]
+            if response.get("type") == "error":
+                request.outcome = "error"
+            
+            await apply_excel_updates(response)
+            with span("send"):
+                await connection_manager.send(websocket, response)
+            
+            # Summarize old turns after replying, before this socket's next frame
+            await ai_manager.compact_history(session)
+            await session.save()
+        
+        elif message_type == "file":
+            # Handle file content updates
+            file_content = message.get("content")
+            if isinstance(file_content, dict) and file_content.get("values"):
+                file_content = dict(file_content, table=table_from_context(file_content))
+            response = {
+                "type": "message",
+                "content": "File content received and processed",
+                "suggestions": ai_manager.get_suggestions(file_content)
+            }
+            await connection_manager.send(websocket, response)
+        
+        else:
+            response = {
+                "type": "error",
+                "content": "Unsupported message type",
+                "error": True
+            }
+            await connection_manager.send(websocket, response)
+            
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        logger.exception("Error processing message")
+        request.outcome = "error"
+        response = {
+            "type": "error",
+            "content": f"Error: {str(e)}",
+            "error": True
+        }
+        # Clients waiting on the request ID need the failure tied to it too
+        if message.get("request_id"):
+            response["request_id"] = message["request_id"]
+        await connection_manager.send(websocket, response)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await connection_manager.connect(websocket)
+    # Frames are read independently of processing so a slow completion on
+    # this socket only delays this socket's own queue, and so a newer frame
+    # can cancel the request in flight
+    scheduler = RequestScheduler(
+        lambda frame: handle_message(websocket, frame, scheduler),
+        max_pending=config.CONNECTION_QUEUE_SIZE,
+        sync_debounce=config.SYNC_DEBOUNCE_SECONDS
+    )
+    session = connection_manager.get_session(websocket)
+    worker = None
     try:
-        # Get initial Excel content
-        excel_content = None
-        if excel_manager.connect_to_excel():
-            excel_content = excel_manager.read_active_sheet()
+        # Get initial Excel content; a resumed session already has a snapshot
+        excel_content = await session.snapshots.load_context() or await excel_manager.get_context()
         
-        # Get welcome message and suggestions
-        welcome_response = ai_manager.analyze_message(
-            "Generate a welcome message appropriate for the current context.",
-            excel_content
-        )
+        # The welcome is precomputed for this sheet version, or built from it
+        # without waiting on the model
+        with trace(uuid.uuid4().hex[:12], "welcome"):
+            welcome = await precompute.welcome(excel_content, session.session_id)
+        if not session.history:
+            session.add_turn(WELCOME_PROMPT, welcome["content"])
         
-        # Send welcome message with suggestions
-        await websocket.send_json({
+        # Send welcome message with suggestions, and the id to resume this session with
+        await connection_manager.send(websocket, {
             "type": "message",
-            "content": welcome_response["content"],
-            "suggestions": ai_manager.get_suggestions(excel_content)
+            "session_id": session.session_id,
+            "content": welcome["content"],
+            "suggestions": welcome["suggestions"]
         })
         
+        worker = asyncio.create_task(scheduler.run())
+        
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            print(f"Received message: {message}")  # Debug print
-            
-            # Update Excel content for each message
-            excel_content = None
-            if excel_manager.connect_to_excel():
-                excel_content = excel_manager.read_active_sheet()
-            
-            try:
-                message_type = message.get("type", "")
-                
-                if message_type == "excel_sync":
-                    # Handle Excel sync requests
-                    response = {
-                        "type": "message",
-                        "content": "Excel data synced successfully",
-                        "suggestions": ai_manager.get_suggestions(message.get("content"))
-                    }
-                    await websocket.send_json(response)
-                
-                elif message_type in ["message", "suggestion"]:
-                    # Process message with AI
-                    response = ai_manager.analyze_message(
-                        message.get("content", ""),
-                        message.get("excel_context", excel_content)
-                    )
-                    
-                    # Handle Excel updates
-                    if response.get("type") == "excel_update" and response.get("updates"):
-                        update_success = True
-                        for update in response["updates"]:
-                            if update["type"] == "update":
-                                if not excel_manager.update_cell(update["cell"], update["value"]):
-                                    update_success = False
-                                    break
-                            elif update["type"] == "format":
-                                if not excel_manager.format_range(update["range"], update["format"]):
-                                    update_success = False
-                                    break
-                        
-                        # Add appropriate status message
-                        if update_success:
-                            response["content"] += "\n\nExcel has been updated successfully!"
-                        else:
-                            response["content"] += "\n\nSome Excel updates failed. Please check the formula and try again."
-                    
-                    await websocket.send_json(response)
-                
-                elif message_type == "file":
-                    # Handle file content updates
-                    response = {
-                        "type": "message",
-                        "content": "File content received and processed",
-                        "suggestions": ai_manager.get_suggestions(message.get("content"))
-                    }
-                    await websocket.send_json(response)
-                
-                else:
-                    response = {
-                        "type": "error",
-                        "content": "Unsupported message type",
-                        "error": True
-                    }
-                    await websocket.send_json(response)
-                    
-            except Exception as e:
-                print(f"Error processing message: {e}")  # Debug print
-                await websocket.send_json({
-                    "type": "error",
-                    "content": f"Error: {str(e)}",
-                    "error": True
+            for cancelled in await scheduler.submit(await connection_manager.receive(websocket)):
+                await connection_manager.send(websocket, {
+                    "type": "cancelled",
+                    "request_id": cancelled.get("request_id"),
+                    "content": cancelled.get("content", "")
                 })
                 
     except WebSocketDisconnect:
-        connection_manager.disconnect(websocket)
-        print("Client disconnected")  # Debug print
\ No newline at end of file
+        logger.debug("Client disconnected")
+    finally:
+        if worker:
+            worker.cancel()
+        precompute.release(session.session_id)
+        await connection_manager.disconnect(websocket)
+
+# Modules imported and managers built; the LLM client is not, see warm_up
+startup_seconds["import"] = time.perf_counter() - _import_started
@@ -1,66 +1,413 @@
-from typing import Dict, List, Any, Optional, Tuple
-from openai import OpenAI
-import pandas as pd
-import json
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator
+from .cache_manager import ResponseCache
+from .context_builder import ContextBuilder, estimate_tokens
+from .session_manager import ConversationSession
+from .intent_engine import IntentEngine
+from .analysis_engine import AnalysisEngine
+from .suggestion_engine import SuggestionEngine
+from .summary_manager import SummaryManager
+from .request_scheduler import FairRateLimiter, retry_with_jitter
+from ..operations import EDIT_TOOL, OperationError, parse_tool_call, validate_operations, describe_operation
+from ..telemetry import span, record_span, record_usage
+import asyncio
+import logging
+import threading
+import time
 import re
 
+logger = logging.getLogger(__name__)
+
+# Commands listed in an excel_update reply before the rest are summarized
+MAX_LISTED_COMMANDS = 20
+
+# Catches references such as B2, AA10 or C2:F20 in a user message
+CELL_REFERENCE_PATTERN = re.compile(r'\b\$?[A-Z]{1,3}\$?\d+(?::\$?[A-Z]{1,3}\$?\d+)?\b')
+
 class AIManager:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
-        self.current_excel_context = None
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 model: str = "gpt-4", max_concurrency: int = 8,
+                 cache: Optional[ResponseCache] = None, cache_updates: bool = False,
+                 context_builder: Optional[ContextBuilder] = None,
+                 intent_engine: Optional[IntentEngine] = None,
+                 analysis_engine: Optional[AnalysisEngine] = None,
+                 suggestion_engine: Optional[SuggestionEngine] = None,
+                 tokens_per_minute: int = 0, completion_tokens: int = 512,
+                 retry_attempts: int = 3, retry_base_delay: float = 0.5, retry_max_delay: float = 8.0,
+                 summary_block_tokens: int = 3000, summary_concurrency: int = 4):
+        # The client and the openai package, slow to import, wait for first use or warm_up
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.retryable_errors: Tuple[type, ...] = ()
+        self.model = model
+        # Bounds completions in flight and tokens per minute across every socket,
+        # granting waiting connections in turn
+        self.limiter = FairRateLimiter(max_concurrency, tokens_per_minute)
+        # Tokens reserved for the reply when estimating a request's cost
+        self.completion_tokens = completion_tokens
+        self.retry_attempts = retry_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.cache = cache
+        self.cache_updates = cache_updates
+        self.context_builder = context_builder or ContextBuilder()
+        # Handles simple formula and formatting requests without an API call
+        self.intent_engine = intent_engine
+        self.analysis_engine = analysis_engine or AnalysisEngine()
+        self.suggestion_engine = suggestion_engine or SuggestionEngine()
+        # Answers whole-sheet requests on large sheets by map-reduce over blocks of rows
+        self.summarizer = SummaryManager(self, block_tokens=summary_block_tokens,
+                                         max_concurrency=summary_concurrency)
     
-    def analyze_message(self, message: str, excel_context: Optional[Dict] = None) -> Dict[str, Any]:
+    @property
+    def client(self):
+        """The OpenAI client, built on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    if not self.api_key:
+                        raise ValueError("No OPENAI_API_KEY found in environment variables")
+                    from openai import AsyncOpenAI, APIConnectionError, InternalServerError, RateLimitError
+                    # Upstream failures worth retrying; timeouts are APIConnectionErrors
+                    self.retryable_errors = (APIConnectionError, InternalServerError, RateLimitError)
+                    # Retries are ours, with jitter, rather than the client's
+                    self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
+
+    async def warm_up(self) -> Dict[str, float]:
+        """
+        Build the client off the event loop, then open a pooled connection to
+        the endpoint so the first completion skips the TCP and TLS handshakes.
+        Returns the seconds each step took.
+        """
+        started = time.perf_counter()
+        client = await asyncio.to_thread(lambda: self.client)
+        built = time.perf_counter()
+        try:
+            # Listing models is free and leaves the connection in the pool
+            await client.models.list()
+        except Exception as e:
+            logger.warning("Could not reach the LLM endpoint while warming up: %s", e)
+        return {"client": built - started, "connect": time.perf_counter() - built}
+
+    async def analyze_message(self, message: str, excel_context: Optional[Dict] = None,
+                              use_cache: bool = True,
+                              session: Optional[ConversationSession] = None) -> Dict[str, Any]:
         """
         Analyze user message and generate appropriate response or Excel commands
         """
         try:
-            # Update Excel context
-            self.current_excel_context = excel_context
-
-            # Get AI response
-            response = self.client.chat.completions.create(
-                model="gpt-4",  
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": self._construct_user_prompt(message, excel_context)}
-                ]
-            )
-
-            ai_response = response.choices[0].message.content
-
-            # Check if response contains Excel commands
-            if self._contains_excel_command(message):
-                result = self._parse_excel_commands(ai_response)
-                # Ensure boolean values are converted to strings in updates
-                if result.get("updates"):
-                    for update in result["updates"]:
-                        for key, value in update.items():
-                            if isinstance(value, bool):
-                                update[key] = str(value)
+            local_result = self._match_local(message, excel_context, session)
+            if local_result:
+                return local_result
+
+            if self.summarizer.wants_summary(message, excel_context):
+                result = None
+                async for frame in self.summarizer.summarize(message, excel_context, session, use_cache):
+                    if frame["type"] not in ("progress", "delta"):
+                        result = frame
+                if result is None:
+                    return {"type": "error", "message": "Error processing request: the summary produced no answer"}
+                if session:
+                    session.add_turn(message, result["content"])
                 return result
-            
-            # If it's an analysis request, process the data
-            if any(word in message.lower() for word in ['analyze', 'calculate', 'find', 'show']):
-                analysis_result = self._process_analysis_request(ai_response)
-                # Convert any boolean values to strings in analysis details
-                if "analysis" in analysis_result:
-                    for key, value in analysis_result["analysis"].items():
-                        if isinstance(value, bool):
-                            analysis_result["analysis"][key] = str(value)
-                return analysis_result
-            
-            # Regular response
+
+            analysis, messages, cache_key = self._prepare(message, excel_context, session, use_cache)
+            tools = self._tools_for(message)
+
+            with span("cache_lookup"):
+                cached = await self.cache.get(cache_key) if cache_key else None
+            if cached is None:
+                # Get AI response without blocking the event loop
+                async with self.limiter.acquire(self._owner(session), self._request_cost(messages)) as lease:
+                    with span("llm"):
+                        response = await self._create_completion(messages, **tools)
+                    if response.usage and response.usage.total_tokens:
+                        lease.charge(response.usage.total_tokens)
+                reply = response.choices[0].message
+                ai_response = reply.content or ""
+                tool_calls = [(call.function.name, call.function.arguments) for call in reply.tool_calls or []]
+                self._record_usage(messages, ai_response + "".join(args for _, args in tool_calls), response.usage)
+                with span("parse"):
+                    result = self._build_response(message, ai_response, excel_context, tool_calls, analysis)
+                await self._cache_response(cache_key, ai_response, tool_calls, result)
+            else:
+                ai_response, tool_calls = self._from_cache(cached)
+                with span("parse"):
+                    result = self._build_response(message, ai_response, excel_context, tool_calls, analysis)
+
+            if session:
+                session.add_turn(message, self._history_text(ai_response, result))
+            return result
+
+        except Exception as e:
+            logger.exception("Error processing request")
             return {
-                "type": "message",
-                "content": ai_response
+                "type": "error",
+                "message": f"Error processing request: {str(e)}"
             }
 
+    async def stream_message(self, message: str, excel_context: Optional[Dict] = None,
+                             use_cache: bool = True,
+                             session: Optional[ConversationSession] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the reply as delta frames, then yield the final parsed response
+        """
+        try:
+            local_result = self._match_local(message, excel_context, session)
+            if local_result:
+                yield local_result
+                return
+
+            if self.summarizer.wants_summary(message, excel_context):
+                # Progress frames precede the answer's deltas
+                result = None
+                async for frame in self.summarizer.summarize(message, excel_context, session, use_cache, stream=True):
+                    if frame["type"] not in ("progress", "delta"):
+                        result = frame
+                    yield frame
+                if result is None:
+                    yield {"type": "error", "message": "Error processing request: the summary produced no answer"}
+                elif session:
+                    session.add_turn(message, result["content"])
+                return
+
+            analysis, messages, cache_key = self._prepare(message, excel_context, session, use_cache)
+            tools = self._tools_for(message)
+
+            with span("cache_lookup"):
+                cached = await self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                # Replay a cached reply as a single delta
+                ai_response, tool_calls = self._from_cache(cached)
+                if ai_response:
+                    yield {"type": "delta", "content": ai_response}
+                result = self._build_response(message, ai_response, excel_context, tool_calls, analysis)
+                if session:
+                    session.add_turn(message, self._history_text(ai_response, result))
+                yield result
+                return
+
+            chunks = []
+            # Tool call arguments arrive in fragments; each call is decoded once, complete
+            calls: Dict[int, List[str]] = {}
+            async with self.limiter.acquire(self._owner(session), self._request_cost(messages)):
+                started = time.perf_counter()
+                stream = await self._create_completion(messages, stream=True, **tools)
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if not chunks and not calls and (delta.content or delta.tool_calls):
+                        record_span("llm_first_token", time.perf_counter() - started)
+                    for call in delta.tool_calls or []:
+                        name, arguments = calls.setdefault(call.index, ["", ""])
+                        if call.function:
+                            calls[call.index] = [name + (call.function.name or ""),
+                                                 arguments + (call.function.arguments or "")]
+                    if delta.content:
+                        chunks.append(delta.content)
+                        yield {"type": "delta", "content": delta.content}
+
+                record_span("llm", time.perf_counter() - started)
+
+            ai_response = "".join(chunks)
+            tool_calls = [tuple(calls[index]) for index in sorted(calls)]
+            # Streams report no usage unless asked, which not every endpoint supports
+            self._record_usage(messages, ai_response + "".join(args for _, args in tool_calls))
+            with span("parse"):
+                result = self._build_response(message, ai_response, excel_context, tool_calls, analysis)
+            await self._cache_response(cache_key, ai_response, tool_calls, result)
+            if session:
+                session.add_turn(message, self._history_text(ai_response, result))
+            yield result
+
         except Exception as e:
-            return {
+            logger.exception("Error processing request")
+            yield {
                 "type": "error",
                 "message": f"Error processing request: {str(e)}"
             }
 
+    def _match_local(self, message: str, excel_context: Optional[Dict],
+                     session: Optional[ConversationSession]) -> Optional[Dict[str, Any]]:
+        """
+        Answer simple edit requests locally when the intent engine is confident
+        and its operations pass the same checks as the model's
+        """
+        if not self.intent_engine:
+            return None
+        operations = self.intent_engine.match(message)
+        if not operations:
+            return None
+        updates, errors = validate_operations(operations, excel_context)
+        if errors or not updates:
+            # The model explains what cannot be done, or reads the request differently
+            logger.debug("Local intent left to the model: %s", "; ".join(errors))
+            return None
+        result = {
+            "type": "excel_update",
+            "content": "I'll help you modify the Excel sheet:\n" + "\n".join(describe_operation(u) for u in updates),
+            "updates": updates,
+            "local": True
+        }
+        if session:
+            session.add_turn(message, result["content"])
+        return result
+
+    def _prepare(self, message: str, excel_context: Optional[Dict], session: Optional[ConversationSession],
+                 use_cache: bool) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, str]], Optional[str]]:
+        """Compute the analysis, the prompt and its cache key"""
+        with span("analysis"):
+            analysis = self._run_analysis(message, excel_context)
+        with span("prompt_build"):
+            messages = self._build_messages(message, excel_context, session, analysis)
+            cache_key = self._cache_key(messages) if use_cache else None
+        return analysis, messages, cache_key
+
+    def _record_usage(self, messages: List[Dict[str, str]], reply: Optional[str], usage: Any = None):
+        """Record reported token usage, or an estimate when the endpoint gave none"""
+        if usage is not None and usage.total_tokens:
+            record_usage(self.model, usage.prompt_tokens, usage.completion_tokens)
+        else:
+            record_usage(self.model, sum(estimate_tokens(m["content"]) for m in messages),
+                         estimate_tokens(reply or ""), estimated=True)
+
+    def _owner(self, session: Optional[ConversationSession]) -> str:
+        """Rate limiter queue a request waits in, one per session"""
+        return session.session_id if session else "server"
+
+    def _request_cost(self, messages: List[Dict[str, str]]) -> int:
+        """Estimated tokens a completion spends: the prompt plus room for the reply"""
+        return sum(estimate_tokens(m["content"]) for m in messages) + self.completion_tokens
+
+    async def _create_completion(self, messages: List[Dict[str, str]], **kwargs):
+        """Create a completion, retrying transient upstream failures with jittered backoff"""
+        client = self.client
+        return await retry_with_jitter(
+            lambda: client.chat.completions.create(model=self.model, messages=messages, **kwargs),
+            self.retryable_errors,
+            attempts=self.retry_attempts,
+            base_delay=self.retry_base_delay,
+            max_delay=self.retry_max_delay
+        )
+
+    def _tools_for(self, message: str) -> Dict[str, Any]:
+        """Completion arguments offering the edit tool, for messages that may change the sheet"""
+        if not self._contains_excel_command(message):
+            return {}
+        return {"tools": [EDIT_TOOL], "tool_choice": "auto"}
+
+    def _cache_key(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Key a completion by model and the exact prompt, which embeds the context slice"""
+        if not self.cache:
+            return None
+        return self.cache.make_key(self.model, messages)
+
+    async def _cache_response(self, cache_key: Optional[str], ai_response: str,
+                              tool_calls: List[Tuple[str, str]], result: Dict[str, Any]):
+        """Store a completion unless it failed or modifies the sheet"""
+        if not cache_key or result.get("type") == "error":
+            return
+        if result.get("type") == "excel_update" and not self.cache_updates:
+            return
+        if tool_calls:
+            await self.cache.set(cache_key, {"content": ai_response, "tool_calls": [list(call) for call in tool_calls]})
+        else:
+            await self.cache.set(cache_key, ai_response)
+
+    @staticmethod
+    def _from_cache(cached: Any) -> Tuple[str, List[Tuple[str, str]]]:
+        """Reply text and tool calls of a cached completion, stored as text when it had no calls"""
+        if isinstance(cached, dict):
+            return cached.get("content") or "", [tuple(call) for call in cached.get("tool_calls", [])]
+        return cached, []
+
+    @staticmethod
+    def _history_text(ai_response: str, result: Dict[str, Any]) -> str:
+        """What the model said plus the edits it made, or why they were refused"""
+        if result.get("type") == "excel_update" or result.get("rejected"):
+            return result["content"]
+        return ai_response
+
+    async def compact_history(self, session: ConversationSession):
+        """
+        Fold the oldest exchanges into the session's running summary once the
+        history exceeds its token budget. Only the evicted exchanges and the
+        previous summary are sent, so each compaction stays small.
+        """
+        if not session.needs_compaction():
+            return
+        oldest = session.take_oldest()
+        if not oldest:
+            return
+
+        transcript = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in oldest)
+        messages = [
+            {"role": "system", "content": (
+                "You maintain a running summary of a conversation between an analyst and "
+                "Fintelligent, an Excel assistant. Merge the new exchanges into the summary. "
+                "Keep cell references, figures and decisions, and stay under 150 words."
+            )},
+            {"role": "user", "content": f"Current summary:\n{session.summary or 'None'}\n\nNew exchanges:\n{transcript}"}
+        ]
+        try:
+            async with self.limiter.acquire(self._owner(session), self._request_cost(messages)) as lease:
+                with span("summarize"):
+                    response = await self._create_completion(messages)
+                if response.usage and response.usage.total_tokens:
+                    lease.charge(response.usage.total_tokens)
+            self._record_usage(messages, response.choices[0].message.content, response.usage)
+            session.summary = response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning("Error summarizing history: %s", e)
+            session.restore_oldest(oldest)
+
+    def _is_analysis_request(self, message: str) -> bool:
+        return any(word in message.lower() for word in ['analyze', 'calculate', 'find', 'show'])
+
+    def _run_analysis(self, message: str, excel_context: Optional[Dict]) -> Optional[Dict[str, Any]]:
+        """Compute the numeric analysis of the sheet for analysis requests"""
+        if not self._is_analysis_request(message) or not excel_context or excel_context.get('table') is None:
+            return None
+        profile = self.context_builder.get_profile(excel_context)
+        return self.analysis_engine.analyze(profile, self.context_builder.profile_key(excel_context), message)
+
+    def _build_messages(self, message: str, excel_context: Optional[Dict],
+                        session: Optional[ConversationSession] = None,
+                        analysis: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """Build the chat messages sent to the model"""
+        history = session.history_messages() if session else []
+        return [
+            {"role": "system", "content": self._get_system_prompt()},
+            *history,
+            {"role": "user", "content": self._construct_user_prompt(message, excel_context, analysis)}
+        ]
+
+    def _build_response(self, message: str, ai_response: str, excel_context: Optional[Dict],
+                        tool_calls: Optional[List[Tuple[str, str]]] = None,
+                        analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Turn the completion text and tool calls into a client response"""
+        if tool_calls:
+            return self._build_update_response(ai_response, tool_calls, excel_context)
+        
+        # If it's an analysis request, process the data
+        if self._is_analysis_request(message):
+            analysis_result = self._process_analysis_request(ai_response, excel_context, analysis)
+            # Convert any boolean values to strings in analysis details
+            if "analysis" in analysis_result:
+                for key, value in analysis_result["analysis"].items():
+                    if isinstance(value, bool):
+                        analysis_result["analysis"][key] = str(value)
+            return analysis_result
+        
+        # Regular response
+        return {
+            "type": "message",
+            "content": ai_response
+        }
+
     def _get_system_prompt(self) -> str:
         """Get the system prompt for the AI"""
         return """You are an AI assistant integrated with Excel. Your name is Fintelligent.
@@ -72,7 +419,6 @@ class AIManager:
         Don't add any latex to your responses.
         End your responses with a question if relevant.
         Don't make lists or bullet points, keep it in sentence structure.
-        When you are updating for calculations, don't put any quotes or backticks around the formula.
 
         You can:
         1. Analyze Excel data and provide insights
@@ -80,14 +426,9 @@ class AIManager:
         3. Apply formatting and formulas
         
         When responding to requests that require Excel modifications:
-        1. Use specific cell references
-        2. Return commands in a structured format
-        3. Explain what changes will be made
-
-        For Excel updates, return commands like:
-        UPDATE A1 TO 100
-        UPDATE B2 TO =SUM(B1:B10)
-        FORMAT A1:A10 AS CURRENCY
+        1. Make every change through the edit_sheet tool, never as commands in your reply
+        2. Use specific cell references, and write formulas starting with =
+        3. Explain briefly what changes will be made
         
         You are capable of reading and extracting numerical values from tables, charts, and structured data. When you see data presented in a table format:
 
@@ -111,132 +452,88 @@ class AIManager:
             
         """
 
-    def _construct_user_prompt(self, message: str, excel_context: Optional[Dict]) -> str:
+    def _construct_user_prompt(self, message: str, excel_context: Optional[Dict],
+                               analysis: Optional[Dict[str, Any]] = None) -> str:
         """Construct the user prompt with context"""
         user_prompt = f"User request: {message}\n"
         if excel_context:
             user_prompt += f"Current Excel context:\n"
             user_prompt += f"- Active range: {excel_context.get('activeRange', 'None')}\n"
             user_prompt += f"- Used range: {excel_context.get('address', 'None')}\n"
-            if 'values' in excel_context:
-                user_prompt += "- Data preview: "
-                user_prompt += str(pd.DataFrame(excel_context['values'][:5]).to_string())
+            if excel_context.get('table') is not None:
+                user_prompt += self.context_builder.build(message, excel_context)
+            if excel_context.get('workbook'):
+                user_prompt += self.context_builder.build_workbook(message, excel_context['workbook'])
+            if analysis:
+                user_prompt += "- Computed analysis over all rows (exact figures, narrate these rather than recalculating):\n"
+                user_prompt += self.analysis_engine.render(analysis)
         return user_prompt
 
     def _contains_excel_command(self, message: str) -> bool:
         """Check if message contains Excel command keywords"""
         command_keywords = [
-            'update', 'change', 'set', 'modify', 'insert',
+            'update', 'change', 'set', 'modify', 'insert', 'clear', 'delete',
             'format', 'style', 'color', 'fill',
             'formula', 'calculate', '=sum', '=average',
             'average', 'sum', 'put', 'place'  
         ]
         # Also check for cell references
-        cell_pattern = r'[A-Z]\d+(?::[A-Z]\d+)?'
-        has_cell_reference = bool(re.search(cell_pattern, message.upper()))
+        has_cell_reference = bool(CELL_REFERENCE_PATTERN.search(message.upper()))
         
         return has_cell_reference or any(keyword in message.lower() for keyword in command_keywords)
 
-    def _parse_excel_commands(self, ai_response: str) -> Dict[str, Any]:
-        """Parse AI response for Excel commands"""
-        try:
-            updates = []
-            commands = []
-            lines = ai_response.split('\n')
-            
-            if not any('UPDATE' in line.upper() or 'FORMAT' in line.upper() for line in lines):
-                lines = self._convert_to_excel_commands(ai_response)
-            
-            for line in lines:
-                # Parse UPDATE commands
-                if 'UPDATE' in line.upper():
-                    match = re.match(r'UPDATE\s+([A-Z]\d+)\s+TO\s+(.+)', line.upper())
-                    if match:
-                        cell, value = match.groups()
-                        # Handle formula cases
-                        if 'AVERAGE' in value:
-                            value = value.replace('AVERAGE', '=AVERAGE')
-                        elif 'SUM' in value:
-                            value = value.replace('SUM', '=SUM')
-                        updates.append({
-                            "type": "update",
-                            "cell": cell,
-                            "value": value.strip()
-                        })
-                
-                # Parse FORMAT commands
-                elif 'FORMAT' in line.upper():
-                    match = re.match(r'FORMAT\s+([A-Z]\d+(?::[A-Z]\d+)?)\s+AS\s+(.+)', line.upper())
-                    if match:
-                        range_, format_type = match.groups()
-                        updates.append({
-                            "type": "format",
-                            "range": range_,
-                            "format": format_type.strip()
-                        })
-                
-                # Store the command for reference
-                if 'UPDATE' in line.upper() or 'FORMAT' in line.upper():
-                    commands.append(line.strip())
-
-            if updates:
-                return {
-                    "type": "excel_update",
-                    "content": "I'll help you modify the Excel sheet:\n" + "\n".join(commands),
-                    "updates": updates
-                }
-            
-            return {
-                "type": "message",
-                "content": ai_response
-            }
+    def _build_update_response(self, ai_response: str, tool_calls: List[Tuple[str, str]],
+                               excel_context: Optional[Dict]) -> Dict[str, Any]:
+        """
+        Decode the edit tool calls and check them against the sheet snapshot.
+        Nothing is applied unless every operation is valid.
+        """
+        operations, errors = [], []
+        for name, arguments in tool_calls:
+            try:
+                operations.extend(parse_tool_call(name, arguments))
+            except OperationError as e:
+                errors.append(str(e))
+        updates, invalid = validate_operations(operations, excel_context)
+        errors.extend(invalid)
 
-        except Exception as e:
+        if errors:
+            logger.warning("Rejected sheet edits: %s", "; ".join(errors))
             return {
-                "type": "error",
-                "message": f"Error parsing Excel commands: {str(e)}"
+                "type": "message",
+                "content": (ai_response + "\n\n" if ai_response else "")
+                    + "I couldn't make these changes, so the sheet was left as it was:\n"
+                    + "\n".join(f"- {error}" for error in errors),
+                "rejected": errors
             }
+        if not updates:
+            return {"type": "message", "content": ai_response or "There was nothing to change."}
 
-    def _convert_to_excel_commands(self, text: str) -> List[str]:
-        """Convert natural language to Excel commands"""
-        commands = []
-        # Look for patterns like "average of A1:A3 in A4" or "put average of A1:A3 in A4"
-        avg_match = re.search(r'average\s+of\s+([A-Z]\d+(?::[A-Z]\d+)?)\s+(?:in|to|into|at)\s+([A-Z]\d+)', text.lower())
-        if avg_match:
-            source, dest = avg_match.groups()
-            commands.append(f"UPDATE {dest} TO =AVERAGE({source})")
-        
-        # Look for patterns like "sum of A1:A3 in A4"
-        sum_match = re.search(r'sum\s+of\s+([A-Z]\d+(?::[A-Z]\d+)?)\s+(?:in|to|into|at)\s+([A-Z]\d+)', text.lower())
-        if sum_match:
-            source, dest = sum_match.groups()
-            commands.append(f"UPDATE {dest} TO =SUM({source})")
-            
-        return commands
+        commands = [describe_operation(update) for update in updates[:MAX_LISTED_COMMANDS]]
+        if len(updates) > MAX_LISTED_COMMANDS:
+            commands.append(f"...and {len(updates) - MAX_LISTED_COMMANDS} more")
+        content = "I'll help you modify the Excel sheet:\n" + "\n".join(commands)
+        if ai_response:
+            content = f"{ai_response}\n\n{content}"
+        return {"type": "excel_update", "content": content, "updates": updates}
 
-    def _process_analysis_request(self, ai_response: str) -> Dict[str, Any]:
+    def _process_analysis_request(self, ai_response: str, excel_context: Optional[Dict] = None,
+                                  analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Process data analysis requests with JSON-safe values"""
         try:
-            if not self.current_excel_context or 'values' not in self.current_excel_context:
+            if analysis is None:
+                analysis = self._run_analysis("analyze", excel_context)
+            if not analysis:
                 return {
                     "type": "message",
                     "content": ai_response
                 }
 
-            df = pd.DataFrame(self.current_excel_context['values'])
-            
-            # Convert boolean values to strings for JSON serialization
-            analysis_details = {
-                "rows": int(len(df)),
-                "columns": int(len(df.columns)),
-                "numeric_columns": int(len(df.select_dtypes(include=['int64', 'float64']).columns)),
-                "has_missing_values": str(df.isnull().any().any())
-            }
-
+            # Copy, the engine caches the result and booleans are stringified later
             return {
                 "type": "message",
                 "content": ai_response,
-                "analysis": analysis_details
+                "analysis": dict(analysis)
             }
 
         except Exception as e:
@@ -245,46 +542,28 @@ class AIManager:
                 "message": f"Error processing analysis: {str(e)}"
             }
 
+    def _has_data(self, excel_context: Optional[Dict]) -> bool:
+        return not (
+            excel_context is None
+            or excel_context.get('is_empty', True)
+            or excel_context.get('table') is None
+        )
+
     def get_suggestions(self, excel_context: Optional[Dict] = None) -> List[str]:
         """Generate context-aware suggestions based on whether sheet is empty or has data"""
-        
-        # Check if excel_context is None or indicates an empty sheet
-        is_empty = (
-            excel_context is None 
-            or excel_context.get('is_empty', True) 
-            or not excel_context.get('values')
-        )
-        
-        if is_empty:
+        if not self._has_data(excel_context):
             # Return generic suggestions for empty sheets
             return [
                 "How do I get started with Excel?",
                 "What can this AI assistant help me with?",
                 "Show me basic Excel formulas"
             ]
-        
-        # Sheet has data - provide data-specific suggestions
-        suggestions = []
-        
-        # Get data characteristics
-        row_count = excel_context.get('row_count', 0)
-        column_count = excel_context.get('column_count', 0)
-        
-        if row_count > 0 and column_count > 0:
-            suggestions.extend([
-                "Analyze this data",
-                "Create a summary of this data",
-                "Find patterns or trends"
-            ])
-        
-        # Ensure we return exactly 3 suggestions
-        default_suggestions = [
-            "How can I improve this data?",
-            "What insights can you find?",
-            "What calculations would be useful?"
-        ]
-        
-        while len(suggestions) < 3:
-            suggestions.append(default_suggestions[len(suggestions)])
-        
-        return suggestions[:3]
\ No newline at end of file
+        # Phrased around the sheet's own columns, from the cached profile
+        return self.suggestion_engine.suggest(self.context_builder.get_profile(excel_context))
+
+    def get_welcome(self, excel_context: Optional[Dict] = None) -> str:
+        """Welcome message describing the sheet, built without an API call"""
+        if not self._has_data(excel_context):
+            return self.suggestion_engine.welcome(None)
+        profile = self.context_builder.get_profile(excel_context)
+        return self.suggestion_engine.welcome(profile, excel_context.get("sheet"))
@@ -0,0 +1,263 @@
+from typing import Dict, List, Any, Optional
+from collections import OrderedDict
+from .context_builder import SheetProfile, estimate_tokens
+import numpy as np
+import re
+
+# Rows whose label marks them as cash flows, discount rates or time periods
+CASH_FLOW_PATTERN = re.compile(r'cash\s*flow|\bfcf\b|\bcf\b|net cash', re.I)
+RATE_LABEL_PATTERN = re.compile(r'discount rate|\bwacc\b|cost of capital|hurdle rate', re.I)
+# A percentage in a message is a discount rate only beside rate wording, as in
+# "at 8%", "discount rate of 8%" or "9% WACC"; "grew 12%" is not one. A bare
+# "at" must be followed by the number itself, so "at year end it grew 12%" is not
+RATE_MESSAGE_PATTERN = re.compile(
+    r'(?:\b(?:discount(?:ed|ing)?|rate of return|wacc|cost of capital|hurdle)\b[^%\d.]{0,20}?|\bat\s+)'
+    r'(\d+(?:\.\d+)?)\s*%'
+    r'|(\d+(?:\.\d+)?)\s*%\s*(?:discount|rate of return|wacc|cost of capital|hurdle)\b',
+    re.I
+)
+
+def _number(value: Any, digits: int = 6) -> Optional[float]:
+    """JSON-safe rounded float, or None for NaN and infinities"""
+    if value is None:
+        return None
+    value = float(value)
+    if not np.isfinite(value):
+        return None
+    return round(value, digits)
+
+class AnalysisEngine:
+    """
+    Vectorized numeric analysis over the full sheet. Results are cached per
+    snapshot so only the computed figures, never the raw grid, reach the model.
+    """
+
+    def __init__(self, max_entries: int = 32, max_items: int = 10):
+        self.max_entries = max_entries
+        self.max_items = max_items
+        self._results: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+    def analyze(self, profile: SheetProfile, key: str, message: str = "") -> Dict[str, Any]:
+        """Return the analysis of a profiled snapshot, computing it on first use"""
+        rate = self._discount_rate(profile, message)
+        cache_key = (key, rate)
+        result = self._results.get(cache_key)
+        if result is None:
+            result = self._compute(profile, rate)
+            self._results[cache_key] = result
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        self._results.move_to_end(cache_key)
+        return result
+
+    def _compute(self, profile: SheetProfile, rate: Optional[float]) -> Dict[str, Any]:
+        table = profile.table
+        numeric_columns = profile.numeric_columns
+        matrix = table.numeric_matrix(numeric_columns)
+
+        result = {
+            "rows": table.row_count,
+            "columns": table.column_count,
+            "numeric_columns": len(numeric_columns),
+            "has_missing_values": any(column.count() < table.row_count for column in table.columns),
+            "column_stats": self._column_stats(profile, matrix),
+            "correlations": self._correlations(profile, matrix),
+            "outliers": self._outliers(profile, matrix)
+        }
+
+        # Line items laid out across period columns, as in most financial models
+        label_column = next((i for i in range(table.column_count) if i not in numeric_columns), None)
+        if label_column is not None and len(numeric_columns) >= 3:
+            result["row_series"] = self._row_series(profile, matrix, label_column, rate)
+        return result
+
+    def _column_stats(self, profile: SheetProfile, matrix: np.ndarray) -> List[Dict[str, Any]]:
+        """Descriptive statistics, trend slope, growth and rolling mean for each numeric column"""
+        if matrix.shape[1] == 0:
+            return []
+        with np.errstate(all="ignore"):
+            count = np.sum(~np.isnan(matrix), axis=0)
+            mean = np.nanmean(matrix, axis=0)
+            std = np.nanstd(matrix, axis=0, ddof=1)
+            minimum, maximum = np.nanmin(matrix, axis=0), np.nanmax(matrix, axis=0)
+            quartiles = np.nanpercentile(matrix, [25, 50, 75], axis=0)
+            total = np.nansum(matrix, axis=0)
+            slope = _slopes(matrix.T)
+
+        stats = []
+        for j, i in enumerate(profile.numeric_columns):
+            values = matrix[:, j][~np.isnan(matrix[:, j])]
+            entry = {
+                "header": profile.headers[i],
+                "column": profile.columns[i],
+                "count": int(count[j]),
+                "sum": _number(total[j]),
+                "mean": _number(mean[j]),
+                "std": _number(std[j]),
+                "min": _number(minimum[j]),
+                "p25": _number(quartiles[0][j]),
+                "median": _number(quartiles[1][j]),
+                "p75": _number(quartiles[2][j]),
+                "max": _number(maximum[j]),
+                "trend_slope_per_row": _number(slope[j])
+            }
+            if len(values) >= 2 and values[0]:
+                entry["total_growth"] = _number(values[-1] / values[0] - 1)
+            if len(values) >= 3:
+                entry["rolling_mean_3_last"] = _number(values[-3:].mean())
+            stats.append(entry)
+        return stats
+
+    def _row_series(self, profile: SheetProfile, matrix: np.ndarray, label_column: int,
+                    rate: Optional[float]) -> List[Dict[str, Any]]:
+        """Growth, CAGR, trend and cash-flow metrics for labelled rows across period columns"""
+        labels = profile.table.columns[label_column].to_list()
+        complete = ~np.isnan(matrix).any(axis=1)
+        rows = [r for r in range(len(labels)) if isinstance(labels[r], str) and labels[r].strip() and complete[r]]
+        if not rows:
+            return []
+
+        series = matrix[rows]
+        periods = series.shape[1]
+        with np.errstate(all="ignore"):
+            growth = series[:, 1:] / series[:, :-1] - 1
+            first, last = series[:, 0], series[:, -1]
+            cagr = np.where((first > 0) & (last > 0), (last / first) ** (1 / (periods - 1)) - 1, np.nan)
+            slope = _slopes(series)
+            rolling = series[:, -3:].mean(axis=1)
+
+        results = []
+        for k, r in enumerate(rows):
+            entry = {
+                "label": labels[r].strip(),
+                "row": profile.data_start_row + r + 1,
+                "period_growth": [_number(g) for g in growth[k]],
+                "cagr": _number(cagr[k]),
+                "trend_slope_per_period": _number(slope[k]),
+                "rolling_mean_3_last": _number(rolling[k])
+            }
+            if CASH_FLOW_PATTERN.search(entry["label"]):
+                entry["irr"] = _number(_irr(series[k]))
+                if rate is not None:
+                    entry["npv_rate"] = rate
+                    entry["npv"] = _number(_npv(rate, series[k]), 2)
+            results.append(entry)
+        return results
+
+    def _correlations(self, profile: SheetProfile, matrix: np.ndarray) -> List[Dict[str, Any]]:
+        """Strongest pairwise correlations between numeric columns"""
+        if matrix.shape[1] < 2 or matrix.shape[0] < 3:
+            return []
+        with np.errstate(all="ignore"):
+            corr = np.ma.corrcoef(np.ma.masked_invalid(matrix), rowvar=False).filled(np.nan)
+        pairs = []
+        for a in range(corr.shape[0]):
+            for b in range(a + 1, corr.shape[1]):
+                if np.isfinite(corr[a, b]) and abs(corr[a, b]) >= 0.7:
+                    pairs.append({
+                        "columns": [profile.headers[profile.numeric_columns[a]], profile.headers[profile.numeric_columns[b]]],
+                        "r": _number(corr[a, b], 3)
+                    })
+        pairs.sort(key=lambda p: -abs(p["r"]))
+        return pairs[:self.max_items]
+
+    def _outliers(self, profile: SheetProfile, matrix: np.ndarray) -> List[Dict[str, Any]]:
+        """Cells more than three standard deviations from their column mean"""
+        if matrix.shape[0] < 4 or matrix.shape[1] == 0:
+            return []
+        with np.errstate(all="ignore"):
+            z = (matrix - np.nanmean(matrix, axis=0)) / np.nanstd(matrix, axis=0)
+        rows, columns = np.nonzero(np.abs(np.nan_to_num(z)) > 3)
+        order = np.argsort(-np.abs(z[rows, columns]))[:self.max_items]
+        return [
+            {
+                "cell": f"{profile.columns[profile.numeric_columns[columns[k]]]}{profile.data_start_row + rows[k] + 1}",
+                "value": _number(matrix[rows[k], columns[k]]),
+                "z": _number(z[rows[k], columns[k]], 2)
+            }
+            for k in order
+        ]
+
+    @staticmethod
+    def _discount_rate(profile: SheetProfile, message: str) -> Optional[float]:
+        """Discount rate named in the message, else a labelled rate in the sheet"""
+        match = RATE_MESSAGE_PATTERN.search(message or "")
+        if match:
+            return float(match.group(1) or match.group(2)) / 100
+        for label, rows in profile.labels.items():
+            if RATE_LABEL_PATTERN.search(label):
+                for value in profile.table.row(rows[0]):
+                    number = _to_float_scalar(value)
+                    if number is not None and 0 < number < 1:
+                        return number
+        return None
+
+    def render(self, analysis: Dict[str, Any], token_budget: int = 800) -> str:
+        """Compact text rendering of the analysis for the prompt"""
+        lines = []
+        for stats in analysis.get("column_stats", []):
+            line = (f"  {stats['header']} ({stats['column']}): sum {stats['sum']}, mean {stats['mean']}, "
+                    f"median {stats['median']}, std {stats['std']}, min {stats['min']}, max {stats['max']}, "
+                    f"slope/row {stats['trend_slope_per_row']}")
+            if "total_growth" in stats:
+                line += f", first-to-last growth {_percent(stats['total_growth'])}"
+            lines.append(line + "\n")
+        for entry in analysis.get("row_series", [])[:self.max_items * 3]:
+            line = f"  Row {entry['row']} {entry['label']}: CAGR {_percent(entry['cagr'])}, slope/period {entry['trend_slope_per_period']}"
+            line += ", growth " + "/".join(_percent(g) for g in entry["period_growth"])
+            if "irr" in entry:
+                line += f", IRR {_percent(entry['irr'])}"
+            if "npv" in entry:
+                line += f", NPV at {entry['npv_rate']:.2%} {entry['npv']}"
+            lines.append(line + "\n")
+        for pair in analysis.get("correlations", []):
+            lines.append(f"  Correlation {pair['columns'][0]} vs {pair['columns'][1]}: r={pair['r']}\n")
+        for outlier in analysis.get("outliers", []):
+            lines.append(f"  Outlier {outlier['cell']}={outlier['value']} (z={outlier['z']})\n")
+
+        text, budget = "", token_budget
+        for line in lines:
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            text += line
+            budget -= cost
+        return text
+
+def _to_float_scalar(value: Any) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if np.isfinite(number) else None
+
+def _percent(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.2%}"
+
+def _slopes(series: np.ndarray) -> np.ndarray:
+    """Least-squares slope of each row of a 2D array against its position, ignoring NaNs"""
+    if series.size == 0:
+        return np.full(series.shape[0], np.nan)
+    x = np.broadcast_to(np.arange(series.shape[1], dtype=float), series.shape)
+    mask = ~np.isnan(series)
+    n = mask.sum(axis=1)
+    x_mean = np.where(mask, x, 0).sum(axis=1) / n
+    y_mean = np.where(mask, series, 0).sum(axis=1) / n
+    dx = np.where(mask, x - x_mean[:, None], 0)
+    dy = np.where(mask, series - y_mean[:, None], 0)
+    return (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+
+def _npv(rate: float, flows: np.ndarray) -> float:
+    """Net present value with the first flow at t=0"""
+    return float(np.sum(flows / (1 + rate) ** np.arange(len(flows))))
+
+def _irr(flows: np.ndarray) -> Optional[float]:
+    """Internal rate of return from the roots of the NPV polynomial"""
+    if not (np.any(flows > 0) and np.any(flows < 0)):
+        return None
+    # NPV = sum(c_t * x^t) with x = 1 / (1 + r)
+    roots = np.roots(flows[::-1])
+    rates = [1 / root.real - 1 for root in roots if abs(root.imag) < 1e-9 and root.real > 0]
+    if not rates:
+        return None
+    return min(rates, key=abs)
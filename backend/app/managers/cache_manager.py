@@ -0,0 +1,133 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from .state_store import StateStore
+
+class ResponseCache:
+    """
+    LRU + TTL cache for completion text with an optional sqlite tier and an
+    optional shared state store, so every worker can reuse a completion.
+    The sqlite tier runs on its own thread, off the event loop.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 900, db_path: Optional[str] = None,
+                 store: Optional[StateStore] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.shared_hits = 0
+
+        self._db = None
+        self._db_executor = None
+        if db_path:
+            # One thread owns the connection, so statements never interleave
+            self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-db")
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, created REAL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash the parts that determine a completion into a cache key"""
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return a cached value, or None when missing or expired"""
+        value = self._get_memory(key)
+        if value is None and self._db is not None:
+            value = await self._run_db(self._get_disk, key)
+        if value is None and self.store is not None:
+            data = await self.store.get(f"response:{key}")
+            if data:
+                value = json.loads(data)
+                with self._lock:
+                    self._store(key, value, time.time())
+                    self.shared_hits += 1
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any):
+        """Cache a JSON-serializable value"""
+        created = time.time()
+        with self._lock:
+            self._store(key, value, created)
+        if self._db is not None:
+            await self._run_db(self._set_disk, key, value, created)
+        if self.store is not None:
+            await self.store.set(f"response:{key}", json.dumps(value).encode(), self.ttl_seconds)
+
+    async def _run_db(self, fn, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, fn, *args)
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                return entry[0]
+            if entry:
+                del self._entries[key]
+            return None
+
+    def _get_disk(self, key: str) -> Optional[Any]:
+        """sqlite lookup, on the database thread"""
+        now = time.time()
+        row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row and now - row[1] <= self.ttl_seconds:
+            value = json.loads(row[0])
+            with self._lock:
+                self._store(key, value, row[1])
+                self.disk_hits += 1
+            return value
+        if row:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+        return None
+
+    def _set_disk(self, key: str, value: Any, created: float):
+        """sqlite write, on the database thread"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)",
+            (key, json.dumps(value), created)
+        )
+        self._db.execute("DELETE FROM responses WHERE created < ?", (created - self.ttl_seconds,))
+        self._db.commit()
+
+    def _store(self, key: str, value: Any, created: float):
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "shared_hits": self.shared_hits,
+            "entries": len(self._entries),
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
@@ -1,17 +1,105 @@
-from fastapi import WebSocket
-from typing import List
+from fastapi import WebSocket, WebSocketDisconnect
+from typing import Dict, List, Any, Optional
+from .session_manager import ConversationSession
+from .state_store import StateStore
+from ..protocol import JsonCodec, negotiate
+from ..recorder import SessionRecorder
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Session ids come from the client, so only accept the shape we hand out
+SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, history_token_budget: int = 1500, history_max_messages: int = 40,
+                 store: Optional[StateStore] = None, session_ttl: float = 86400, broadcast_timeout: float = 5.0,
+                 recorder: Optional[SessionRecorder] = None):
         self.active_connections: List[WebSocket] = []
+        self.sessions: Dict[WebSocket, ConversationSession] = {}
+        self.codecs: Dict[WebSocket, Any] = {}
+        self.history_token_budget = history_token_budget
+        self.history_max_messages = history_max_messages
+        self.store = store
+        self.session_ttl = session_ttl
+        self.broadcast_timeout = broadcast_timeout
+        # Captures every frame of every connection for offline replay when set
+        self.recorder = recorder
+        self.recordings: Dict[WebSocket, Any] = {}
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+        # Clients offer binary framing as a subprotocol; JSON is the fallback
+        offered = websocket.scope.get("subprotocols", [])
+        codec = negotiate(offered)
+        await websocket.accept(subprotocol=codec.subprotocol if codec.subprotocol in offered else None)
+        self.codecs[websocket] = codec
         self.active_connections.append(websocket)
+        # A reconnecting client names its session and resumes it from the store
+        session_id = websocket.query_params.get("session", "")
+        session = ConversationSession(
+            self.history_token_budget, self.history_max_messages,
+            session_id if SESSION_ID_PATTERN.match(session_id) else None,
+            self.store, self.session_ttl
+        )
+        await session.restore()
+        self.sessions[websocket] = session
+        if self.recorder:
+            self.recordings[websocket] = self.recorder.open(session.session_id)
 
-    def disconnect(self, websocket: WebSocket):
+    async def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
+        session = self.sessions.pop(websocket, None)
+        self.codecs.pop(websocket, None)
+        recording = self.recordings.pop(websocket, None)
+        if recording:
+            recording.close()
+        # Shared sessions stay until their TTL so the client can resume on
+        # any worker; a process-local store would otherwise only ever grow
+        if session and self.store is not None and not self.store.shared:
+            await session.discard()
+
+    def get_session(self, websocket: WebSocket) -> ConversationSession:
+        """Return the session owned by this connection"""
+        return self.sessions[websocket]
+
+    async def send(self, websocket: WebSocket, frame: Dict[str, Any]):
+        """Send a frame in the connection's negotiated encoding"""
+        codec = self.codecs.get(websocket) or JsonCodec()
+        data = codec.encode(frame)
+        recording = self.recordings.get(websocket)
+        if recording:
+            recording.write("out", frame)
+        if codec.binary:
+            await websocket.send_bytes(data)
+        else:
+            await websocket.send_text(data)
+
+    async def receive(self, websocket: WebSocket) -> Dict[str, Any]:
+        """Receive and decode the next text or binary frame"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        data = message["bytes"] if message.get("bytes") is not None else message["text"]
+        frame = (self.codecs.get(websocket) or JsonCodec()).decode(data)
+        recording = self.recordings.get(websocket)
+        if recording:
+            recording.write("in", frame)
+        return frame
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+    async def broadcast(self, frame: Dict[str, Any], timeout: Optional[float] = None) -> List[WebSocket]:
+        """
+        Send a frame to every connection at once, so one slow client cannot
+        hold up the rest. Returns the connections that failed or timed out.
+        """
+        timeout = self.broadcast_timeout if timeout is None else timeout
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self.send(connection, frame), timeout) for connection in connections),
+            return_exceptions=True
+        )
+        failed = [connection for connection, result in zip(connections, results) if isinstance(result, BaseException)]
+        if failed:
+            logger.warning("Broadcast failed for %d of %d connections", len(failed), len(connections))
+        return failed
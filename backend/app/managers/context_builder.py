@@ -0,0 +1,233 @@
+from typing import Dict, List, Any, Optional
+from collections import OrderedDict
+from ..columnar import ColumnarSheet, table_from_context
+import numpy as np
+import re
+
+# Cell references such as B7 or C2:D10 mentioned in a user message
+REFERENCE_PATTERN = re.compile(r'\b\$?([A-Z]{1,3})\$?(\d+)(?::\$?([A-Z]{1,3})\$?(\d+))?\b')
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token"""
+    return len(text) // 4 + 1
+
+def _format_value(value: Any) -> str:
+    """Cell value as text, whole floats without the trailing .0"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def message_phrases(message: str, max_words: int = 8) -> set:
+    """Every run of up to max_words words in a message, for label lookups"""
+    words = [w.strip(".,;:!?\"'()") for w in message.lower().split()]
+    return {
+        " ".join(words[i:j])
+        for i in range(len(words))
+        for j in range(i + 1, min(i + max_words, len(words)) + 1)
+    }
+
+class SheetProfile:
+    """Column statistics and label lookups computed once per sheet snapshot"""
+
+    def __init__(self, table: ColumnarSheet):
+        self.table = table
+        self.row_count = table.row_count
+        self.first_col = table.first_col
+        # Zero-based sheet row of the first data row
+        self.data_start_row = table.data_start_row
+        self.headers = list(table.headers)
+        self.columns = list(table.column_letters)
+
+        # Per-column statistics straight from the column arrays
+        self.numeric_columns = []
+        self.stats = []
+        for i, column in enumerate(table.columns):
+            non_null = column.count()
+            numeric = column.numeric()
+            numeric_count = int(np.count_nonzero(~np.isnan(numeric)))
+            is_numeric = bool(non_null) and numeric_count >= 0.8 * non_null
+            stats = {
+                "header": self.headers[i],
+                "column": self.columns[i],
+                "type": "number" if is_numeric else "text",
+                "nulls": self.row_count - non_null,
+                "distinct": column.distinct()
+            }
+            if is_numeric:
+                self.numeric_columns.append(i)
+                stats.update(min=np.nanmin(numeric), max=np.nanmax(numeric), mean=np.nanmean(numeric))
+            self.stats.append(stats)
+
+        # Rows of each text label, used to find rows named in a message.
+        # Dictionary codes let every row of a label be found with one sort.
+        self.labels: Dict[str, List[int]] = {}
+        for i, column in enumerate(table.columns):
+            if i in self.numeric_columns or column.kind != "text":
+                continue
+            order = np.argsort(column.data, kind="stable")
+            codes, starts, counts = np.unique(column.data[order], return_index=True, return_counts=True)
+            for code, start, count in zip(codes.tolist(), starts.tolist(), counts.tolist()):
+                value = column.categories[code] if code >= 0 else None
+                if not isinstance(value, str) or len(value.strip()) < 3:
+                    continue
+                rows = self.labels.setdefault(value.strip().lower(), [])
+                rows.extend(order[start:start + 5 - len(rows)].tolist())
+
+class ContextBuilder:
+    """Packs sheet context into the user prompt within a token budget"""
+
+    def __init__(self, token_budget: int = 1500, max_profiles: int = 32, sample_rows: int = 5,
+                 workbook_budget: int = 600):
+        self.token_budget = token_budget
+        self.workbook_budget = workbook_budget
+        self.max_profiles = max_profiles
+        self.sample_rows = sample_rows
+        self._profiles: "OrderedDict[str, SheetProfile]" = OrderedDict()
+
+    def get_profile(self, excel_context: Dict[str, Any]) -> SheetProfile:
+        """Return the cached profile of a snapshot, computing it on first use"""
+        key = self.profile_key(excel_context)
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = SheetProfile(table_from_context(excel_context))
+            self._profiles[key] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        self._profiles.move_to_end(key)
+        return profile
+
+    def profile_key(self, excel_context: Dict[str, Any]) -> str:
+        """Identity of a snapshot: its fingerprint, or a hash of its contents"""
+        return excel_context.get("fingerprint") or table_from_context(excel_context).fingerprint()
+
+    def build(self, message: str, excel_context: Dict[str, Any], token_budget: Optional[int] = None) -> str:
+        """Describe the sheet for the prompt: column summaries, matching rows, then a sample"""
+        profile = self.get_profile(excel_context)
+        sections = [f"- Size: {profile.row_count} data rows x {len(profile.headers)} columns\n"]
+        budget = (token_budget or self.token_budget) - estimate_tokens(sections[0])
+
+        # Columns named in the message come first
+        phrases = message_phrases(message)
+        mentioned = [i for i, h in enumerate(profile.headers) if h.lower() in phrases]
+        order = mentioned + [i for i in range(len(profile.headers)) if i not in mentioned]
+        lines = []
+        for i in order:
+            line = self._describe_column(profile.stats[i])
+            cost = estimate_tokens(line)
+            if cost > budget:
+                lines.append(f"  ... {len(order) - len(lines)} more columns\n")
+                break
+            lines.append(line)
+            budget -= cost
+        sections.append("- Columns:\n" + "".join(lines))
+
+        # Rows referenced by cell address or by label, then the first rows as a sample
+        relevant = self._relevant_rows(message, profile)
+        sample = [r for r in range(min(self.sample_rows, profile.row_count)) if r not in relevant]
+        for title, rows in (("Relevant rows", relevant), ("Sample rows", sample)):
+            lines = []
+            for r in rows:
+                line = self._describe_row(profile, r)
+                if not line:
+                    continue
+                cost = estimate_tokens(line)
+                if cost > budget:
+                    break
+                lines.append(line)
+                budget -= cost
+            if lines:
+                sections.append(f"- {title}:\n" + "".join(lines))
+
+        return "".join(sections)
+
+    def build_workbook(self, message: str, workbook: Dict[str, Any]) -> str:
+        """Describe the rest of the workbook: other tabs, quoted cells, formula dependencies, named sheets"""
+        budget = self.workbook_budget
+        sections = []
+
+        lines = []
+        sheets = [s for s in workbook.get("sheets", []) if s["name"] != workbook.get("active_sheet")]
+        for i, sheet in enumerate(sheets):
+            line = f"  {sheet['name']} ({sheet['address']}): {', '.join(sheet['headers'][:12])}\n"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                lines.append(f"  ... {len(sheets) - i} more sheets\n")
+                break
+            lines.append(line)
+            budget -= cost
+        if lines:
+            sections.append("- Other sheets:\n" + "".join(lines))
+
+        # Cells quoted from other sheets are worth the full context budget
+        budget += self.token_budget
+        lines = []
+        for cells in workbook.get("cells", []):
+            values = ", ".join(_format_value(v) for row in cells["values"] for v in row if v is not None and v != "")
+            label = f" ({cells['label']})" if cells["label"] else ""
+            line = f"  '{cells['sheet']}'!{cells['address']}{label}: {values}\n"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        if lines:
+            sections.append("- Cells from other sheets:\n" + "".join(lines))
+
+        lines = []
+        for cell in workbook.get("dependencies", []):
+            line = f"  {cell['cell']}"
+            if cell["formula"]:
+                line += f" = {cell['formula']}, reads {', '.join(cell['precedents'])}"
+            if cell["dependents"]:
+                more = cell["dependent_count"] - len(cell["dependents"])
+                line += f"; feeds {', '.join(cell['dependents'])}" + (f" and {more} more" if more else "")
+            line += "\n"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        if lines:
+            sections.append("- Formula dependencies:\n" + "".join(lines))
+
+        for name, context in workbook.get("sheet_contexts", {}).items():
+            if budget <= 0 or context.get("table") is None:
+                continue
+            text = f"- Sheet {name} ({context['address']}):\n" + self.build(message, context, budget)
+            sections.append(text)
+            budget -= estimate_tokens(text)
+
+        return "".join(sections)
+
+    def _relevant_rows(self, message: str, profile: SheetProfile) -> List[int]:
+        """Data rows named in the message through cell references or row labels"""
+        rows = []
+        row_count = profile.row_count
+        for match in REFERENCE_PATTERN.finditer(message.upper()):
+            start = int(match.group(2)) - 1
+            end = int(match.group(4)) - 1 if match.group(4) else start
+            for sheet_row in range(min(start, end), min(max(start, end), min(start, end) + 20) + 1):
+                r = sheet_row - profile.data_start_row
+                if 0 <= r < row_count and r not in rows:
+                    rows.append(r)
+
+        for phrase in message_phrases(message):
+            rows.extend(r for r in profile.labels.get(phrase, []) if r not in rows)
+        return rows
+
+    @staticmethod
+    def _describe_column(stats: Dict[str, Any]) -> str:
+        line = f"  {stats['header']} ({stats['column']}): {stats['type']}"
+        if stats["type"] == "number":
+            line += f", min {stats['min']:.4g}, max {stats['max']:.4g}, mean {stats['mean']:.4g}"
+        return line + f", nulls {stats['nulls']}, distinct {stats['distinct']}\n"
+
+    @staticmethod
+    def _describe_row(profile: SheetProfile, r: int) -> str:
+        sheet_row = profile.data_start_row + r + 1
+        cells = [
+            f"{profile.columns[i]}{sheet_row}={_format_value(value)}"
+            for i, value in enumerate(profile.table.row(r))
+            if value is not None and value == value and value != ""
+        ]
+        return f"  Row {sheet_row}: " + ", ".join(cells) + "\n" if cells else ""
@@ -0,0 +1,265 @@
+from typing import Dict, List, Any, Optional
+from ..addressing import parse_range, index_to_column
+
+class ExcelBackend:
+    """Interface to a live workbook; every call runs on the Excel worker thread"""
+
+    def initialize_thread(self):
+        """Prepare the worker thread before the first call"""
+
+    def connect(self) -> bool:
+        """Attach to the active workbook and sheet"""
+        raise NotImplementedError
+
+    def workbook_name(self) -> str:
+        raise NotImplementedError
+
+    def sheet_name(self) -> str:
+        raise NotImplementedError
+
+    def sheet_names(self) -> List[str]:
+        """Names of every sheet in the workbook, in tab order"""
+        raise NotImplementedError
+
+    def used_range_address(self, sheet: Optional[str] = None) -> str:
+        """Used range of a sheet, defaulting to the active one"""
+        raise NotImplementedError
+
+    def used_range_values(self, sheet: Optional[str] = None) -> Any:
+        """Values of the used range as a list of rows, a single row or a scalar"""
+        raise NotImplementedError
+
+    def change_count(self) -> Optional[int]:
+        """Counter that moves whenever cell contents change, or None when the backend cannot tell"""
+        return None
+
+    def get_values(self, address: str, sheet: Optional[str] = None) -> List[List[Any]]:
+        """Values of a rectangular range as a list of rows"""
+        raise NotImplementedError
+
+    def get_formulas(self, address: str) -> List[List[Any]]:
+        """Formulas (or constants) of a rectangular range as a list of rows"""
+        raise NotImplementedError
+
+    def get_number_format(self, address: str) -> Optional[str]:
+        """Number format of a range, or None when its cells differ"""
+        raise NotImplementedError
+
+    def set_value(self, address: str, value: Any):
+        """Write a scalar, or a list of rows matching the range shape"""
+        raise NotImplementedError
+
+    def set_number_format(self, address: str, number_format: str):
+        """Apply a number format to a range, which may list several areas"""
+        raise NotImplementedError
+
+    def insert_range(self, address: str, shift: str):
+        """Insert blank cells at a range, moving existing cells down or right"""
+        raise NotImplementedError
+
+    def delete_range(self, address: str, shift: str):
+        """Delete the cells of a range, moving the cells after them up or left"""
+        raise NotImplementedError
+
+def as_grid(value: Any) -> List[List[Any]]:
+    """Normalize a scalar, row or nested sequence into a list of rows"""
+    if not isinstance(value, (list, tuple)):
+        return [[value]]
+    if not value or not isinstance(value[0], (list, tuple)):
+        return [list(value)]
+    return [list(row) for row in value]
+
+class XlwingsBackend(ExcelBackend):
+    """Talks to a running Excel instance through xlwings"""
+
+    def __init__(self):
+        self.wb = None
+        self.active_sheet = None
+
+    def initialize_thread(self):
+        # COM objects must be used from an initialized apartment on Windows
+        try:
+            import pythoncom
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+
+    def connect(self) -> bool:
+        import xlwings as xw
+
+        self.wb = xw.books.active
+        self.active_sheet = self.wb.sheets.active
+        return True
+
+    def workbook_name(self) -> str:
+        return self.wb.name
+
+    def sheet_name(self) -> str:
+        return self.active_sheet.name
+
+    def sheet_names(self) -> List[str]:
+        return [sheet.name for sheet in self.wb.sheets]
+
+    def _sheet(self, sheet: Optional[str]):
+        return self.wb.sheets[sheet] if sheet else self.active_sheet
+
+    def used_range_address(self, sheet: Optional[str] = None) -> str:
+        return self._sheet(sheet).used_range.address
+
+    def used_range_values(self, sheet: Optional[str] = None) -> Any:
+        return self._sheet(sheet).used_range.value
+
+    def get_values(self, address: str, sheet: Optional[str] = None) -> List[List[Any]]:
+        # ndim=2 keeps single rows and columns as lists of rows
+        return as_grid(self._sheet(sheet).range(address).options(ndim=2).value)
+
+    def get_formulas(self, address: str) -> List[List[Any]]:
+        return as_grid(self.active_sheet.range(address).formula)
+
+    def get_number_format(self, address: str) -> Optional[str]:
+        return self.active_sheet.range(address).number_format
+
+    def set_value(self, address: str, value: Any):
+        self.active_sheet.range(address).value = value
+
+    def set_number_format(self, address: str, number_format: str):
+        self.active_sheet.range(address).number_format = number_format
+
+    def insert_range(self, address: str, shift: str):
+        self.active_sheet.range(address).insert(shift=shift)
+
+    def delete_range(self, address: str, shift: str):
+        self.active_sheet.range(address).delete(shift=shift)
+
+class FakeWorkbookBackend(ExcelBackend):
+    """In-memory workbook for tests and benchmarks on machines without Excel"""
+
+    def __init__(self, sheets: Optional[Dict[str, List[List[Any]]]] = None, name: str = "Book1.xlsx"):
+        self.name = name
+        self.sheets: Dict[str, List[List[Any]]] = {k: [list(r) for r in v] for k, v in (sheets or {"Sheet1": []}).items()}
+        self.active = next(iter(self.sheets))
+        # Per cell, by zero-based (row, column) of the active sheet; absent is General
+        self.number_formats: Dict[tuple, str] = {}
+        self.calls = 0
+        # Bumped by every write; tests editing sheets directly bump it themselves
+        self.changes = 0
+
+    def connect(self) -> bool:
+        self.calls += 1
+        return True
+
+    def workbook_name(self) -> str:
+        return self.name
+
+    def sheet_name(self) -> str:
+        return self.active
+
+    def sheet_names(self) -> List[str]:
+        self.calls += 1
+        return list(self.sheets)
+
+    def used_range_address(self, sheet: Optional[str] = None) -> str:
+        grid = self.sheets[sheet or self.active]
+        rows = len(grid)
+        columns = max((len(row) for row in grid), default=0)
+        return f"$A$1:${index_to_column(max(columns, 1) - 1)}${max(rows, 1)}"
+
+    def change_count(self) -> Optional[int]:
+        return self.changes
+
+    def used_range_values(self, sheet: Optional[str] = None) -> Any:
+        self.calls += 1
+        grid = self.sheets[sheet or self.active]
+        if not grid:
+            return None
+        columns = max(len(row) for row in grid)
+        values = [list(row) + [None] * (columns - len(row)) for row in grid]
+        # Mirror xlwings, which collapses single rows and cells
+        if len(values) == 1:
+            return values[0] if columns > 1 else values[0][0]
+        return values
+
+    def get_formulas(self, address: str) -> List[List[Any]]:
+        return self.get_values(address)
+
+    def get_values(self, address: str, sheet: Optional[str] = None) -> List[List[Any]]:
+        self.calls += 1
+        first_row, first_col, last_row, last_col = parse_range(address)
+        grid = self.sheets[sheet or self.active]
+        return [
+            [grid[r][c] if r < len(grid) and c < len(grid[r]) else None for c in range(first_col, last_col + 1)]
+            for r in range(first_row, last_row + 1)
+        ]
+
+    def get_number_format(self, address: str) -> Optional[str]:
+        self.calls += 1
+        first_row, first_col, last_row, last_col = parse_range(address)
+        formats = {self.number_formats.get((r, c), "General")
+                   for r in range(first_row, last_row + 1) for c in range(first_col, last_col + 1)}
+        return formats.pop() if len(formats) == 1 else None
+
+    def set_value(self, address: str, value: Any):
+        self.calls += 1
+        self.changes += 1
+        first_row, first_col, last_row, last_col = parse_range(address)
+        rows = value if isinstance(value, list) and value and isinstance(value[0], list) else None
+        grid = self.sheets[self.active]
+        for r in range(first_row, last_row + 1):
+            while len(grid) <= r:
+                grid.append([])
+            for c in range(first_col, last_col + 1):
+                row = grid[r]
+                row.extend([None] * (c + 1 - len(row)))
+                row[c] = rows[r - first_row][c - first_col] if rows else value
+
+    def set_number_format(self, address: str, number_format: str):
+        self.calls += 1
+        for area in address.split(","):
+            first_row, first_col, last_row, last_col = parse_range(area)
+            for r in range(first_row, last_row + 1):
+                for c in range(first_col, last_col + 1):
+                    self.number_formats[(r, c)] = number_format
+
+    def insert_range(self, address: str, shift: str):
+        self.calls += 1
+        self._shift(address, shift, insert=True)
+
+    def delete_range(self, address: str, shift: str):
+        self.calls += 1
+        self._shift(address, shift, insert=False)
+
+    def _shift(self, address: str, shift: str, insert: bool):
+        self.changes += 1
+        first_row, first_col, last_row, last_col = parse_range(address)
+        grid = self.sheets[self.active]
+        if shift in ("right", "left"):
+            for r in range(first_row, min(last_row + 1, len(grid))):
+                row = grid[r]
+                if first_col >= len(row):
+                    continue
+                if insert:
+                    row[first_col:first_col] = [None] * (last_col - first_col + 1)
+                else:
+                    del row[first_col:last_col + 1]
+            return
+        # Down or up: move each column of the range independently
+        height = last_row - first_row + 1
+        for c in range(first_col, last_col + 1):
+            column = [row[c] if c < len(row) else None for row in grid]
+            if first_row >= len(column):
+                continue
+            if insert:
+                column[first_row:first_row] = [None] * height
+            else:
+                del column[first_row:last_row + 1]
+                column.extend([None] * height)
+            while len(grid) < len(column):
+                grid.append([])
+            for r, value in enumerate(column):
+                row = grid[r]
+                if value is not None or c < len(row):
+                    row.extend([None] * (c + 1 - len(row)))
+                    row[c] = value
+        # Rows emptied by a deletion no longer count towards the used range
+        while grid and not any(value is not None for value in grid[-1]):
+            grid.pop()
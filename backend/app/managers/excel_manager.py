@@ -1,121 +1,507 @@
-import xlwings as xw
-import pandas as pd
+from typing import Dict, List, Any, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
+from .excel_backends import ExcelBackend, XlwingsBackend, as_grid
+from .workbook_index import WorkbookIndex, SheetStore
+from .formula_graph import FormulaGraph
+from .context_builder import REFERENCE_PATTERN
+from ..columnar import ColumnarSheet
+from ..addressing import parse_cell, parse_range, format_cell, format_range
+from ..operations import NUMBER_FORMATS
+from ..telemetry import span
+import asyncio
+import contextvars
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 class ExcelManager:
-    def __init__(self):
-        self.wb = None
-        self.active_sheet = None
-    
+    def __init__(self, backend: Optional[ExcelBackend] = None, max_sheet_cells: int = 1_000_000,
+                 check_interval: float = 1.0, max_age: float = 10.0):
+        self.backend = backend or XlwingsBackend()
+        self.connected = False
+        # Every workbook call runs on this single thread, off the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="excel",
+            initializer=self.backend.initialize_thread
+        )
+        self._cached_context: Optional[Dict[str, Any]] = None
+        self._cache_key = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Background checks run at most every check_interval seconds. Values
+        # are read only when the cheap signals move, or after max_age when
+        # the backend has no change counter and a user edit could go unseen
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._checked = 0.0
+        self._read_at = 0.0
+        self._changes = 0
+        # Every sheet's shape and labels; bodies of other sheets load on demand
+        self.index = WorkbookIndex()
+        self.sheet_store = SheetStore(max_cells=max_sheet_cells)
+        # Formulas of the active sheet, for impact queries and recalculation previews
+        self.formula_graph = FormulaGraph()
+
     def connect_to_excel(self) -> bool:
         """Establish connection to active Excel workbook"""
         try:
-            self.wb = xw.books.active
-            self.active_sheet = self.wb.sheets.active
-            return True
+            self.connected = self.backend.connect()
+            return self.connected
         except Exception as e:
-            print(f"Error connecting to Excel: {e}")
+            logger.warning("Error connecting to Excel: %s", e)
+            self.connected = False
             return False
-    
+
     def read_active_sheet(self) -> dict:
         """Read data from active Excel sheet and determine if it's empty"""
-        if not self.active_sheet:
+        if not self.connected:
             return {"error": "No active sheet", "is_empty": True}
-        
+
         try:
-            used_range = self.active_sheet.used_range
-            values = used_range.value
-            
-            # Check if sheet is truly empty
-            if not values or (isinstance(values, list) and len(values) == 1 and not any(values[0])):
-                return {
-                    "is_empty": True,
-                    "values": [],
-                    "address": "",
-                    "activeRange": ""
-                }
-                
-            df = pd.DataFrame(values)
-            
-            if df.empty or (len(df) == 1 and df.iloc[0].isna().all()):
-                return {
-                    "is_empty": True,
-                    "values": [],
-                    "address": "",
-                    "activeRange": ""
-                }
-            
-            # Extract headers from first row
-            headers = df.iloc[0] if any(isinstance(x, str) for x in df.iloc[0]) else [f"Column{i}" for i in range(len(df.columns))]
-            
-            # Create unique headers
-            unique_headers = []
-            seen = {}
-            for header in headers:
-                if header in seen:
-                    seen[header] += 1
-                    unique_headers.append(f"{header}_{seen[header]}")
-                else:
-                    seen[header] = 0
-                    unique_headers.append(header)
-            
-            # Set the unique headers
-            df.columns = unique_headers
-            
-            # Remove header row if it was used
-            df = df.iloc[1:] if any(isinstance(x, str) for x in values[0]) else df
-            
-            # Reset index to ensure proper serialization
-            df = df.reset_index(drop=True)
-            
-            # Get the address of the used range
-            address = used_range.address
-            
-            return {
-                "is_empty": False,
-                "values": df.values.tolist(),
-                "headers": unique_headers,
-                "address": address,
-                "activeRange": address,  # Using used range as active range
-                "row_count": len(df),
-                "column_count": len(df.columns)
-            }
-            
+            return self._build_context(self.backend.used_range_values(), self.backend.used_range_address())
         except Exception as e:
-            print(f"Error reading sheet: {e}")
+            logger.warning("Error reading sheet: %s", e)
             return {"error": f"Error reading sheet: {e}", "is_empty": True}
-    
+
+    def _build_context(self, values: Any, address: str, sheet: Optional[str] = None) -> dict:
+        """Build the sheet context from raw used range values"""
+        # Check if sheet is truly empty
+        if not values or (isinstance(values, list) and len(values) == 1 and not any(values[0])):
+            return {
+                "is_empty": True,
+                "table": None,
+                "address": "",
+                "activeRange": ""
+            }
+
+        return self._table_context(ColumnarSheet.from_rows(values, address, sheet))
+
+    @staticmethod
+    def _table_context(table: ColumnarSheet) -> dict:
+        address = table.address
+        return {
+            "is_empty": table.is_empty(),
+            "table": table,
+            "headers": list(table.headers),
+            "address": address,
+            "activeRange": address,  # Using used range as active range
+            "row_count": table.row_count,
+            "column_count": table.column_count,
+            # Zero-based sheet row of the first data row
+            "data_start_row": table.data_start_row
+        }
+
+    # Number formats applied by format updates
+    NUMBER_FORMATS = NUMBER_FORMATS
+
+    # Excel rejects multi-area addresses longer than 255 characters
+    MAX_AREA_ADDRESS = 250
+
+    @staticmethod
+    def _clean_value(value: Any) -> Any:
+        """Normalize formula syntax produced by the AI"""
+        # Values arrive typed, so text is written as-is; only a doubled
+        # equals sign is repaired
+        if isinstance(value, str) and value.startswith('=='):
+            value = value[1:]
+        return value
+
     def update_cell(self, cell: str, value: any) -> bool:
         """Update specific cell in Excel with given value"""
         try:
-            # Remove extra equal sign if present in formulas
-            # Clean up formula syntax
-            if isinstance(value, str):
-                if value.startswith('=='):
-                    value = value[1:]  # Remove one equals sign
-                elif not value.startswith('=') and any(func in value.upper() for func in ['SUM', 'AVERAGE', 'MAX', 'MIN']):
-                    value = '=' + value  # Add equals sign if missing
-            
-            self.active_sheet.range(cell).value = value
+            self.backend.set_value(cell, self._clean_value(value))
             return True
         except Exception as e:
-            print(f"Error updating cell: {e}")
+            logger.warning("Error updating cell: %s", e)
             return False
-    
+
     def format_range(self, range_: str, format_type: str) -> bool:
         """Apply formatting to specified range"""
         try:
-            range_obj = self.active_sheet.range(range_)
-            format_type = format_type.upper()
-            
-            if format_type == "CURRENCY":
-                range_obj.number_format = "$#,##0.00"
-            elif format_type == "PERCENTAGE":
-                range_obj.number_format = "0.00%"
-            elif format_type == "NUMBER":
-                range_obj.number_format = "#,##0.00"
-            elif format_type == "DATE":
-                range_obj.number_format = "mm/dd/yyyy"
+            number_format = self.NUMBER_FORMATS.get(format_type.upper())
+            if number_format:
+                self.backend.set_number_format(range_, number_format)
             return True
         except Exception as e:
-            print(f"Error formatting range: {e}")
-            return False
\ No newline at end of file
+            logger.warning("Error formatting range: %s", e)
+            return False
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run a workbook call on the Excel worker thread"""
+        loop = asyncio.get_running_loop()
+        # Carry the caller's context so spans on the worker join its request
+        return await loop.run_in_executor(self._executor, contextvars.copy_context().run, fn, *args)
+
+    async def get_context(self) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached sheet context immediately and refresh it in the
+        background. Only the very first call waits for a read.
+        """
+        if self._cached_context is None:
+            return await self.refresh()
+        due = time.monotonic() - self._checked >= self.check_interval
+        if due and (self._refresh_task is None or self._refresh_task.done()):
+            self._checked = time.monotonic()
+            self._refresh_task = asyncio.create_task(self.refresh())
+        return self._cached_context
+
+    async def refresh(self) -> Optional[Dict[str, Any]]:
+        """Re-read the active sheet on the worker thread"""
+        return await self.run(self._refresh)
+
+    def invalidate(self):
+        """Drop the cached context, e.g. after writing to the sheet"""
+        self._cache_key = None
+        self.sheet_store.clear()
+        self.index.expire()
+
+    def mark_changed(self):
+        """Note a change reported from outside, such as a client's sheet sync"""
+        self._changes += 1
+
+    def _refresh(self) -> Optional[Dict[str, Any]]:
+        """
+        Check the workbook, sheet, used range and change counters, and read the
+        values only when one of them moved or the cached read is too old
+        """
+        if not self.connect_to_excel():
+            self._cached_context, self._cache_key = None, None
+            return None
+        try:
+            with span("excel_check"):
+                cache_key = (
+                    self.backend.workbook_name(),
+                    self.backend.sheet_name(),
+                    self.backend.used_range_address(),
+                    self.backend.change_count(),
+                    self._changes
+                )
+            stale = cache_key[3] is None and time.monotonic() - self._read_at > self.max_age
+            if cache_key == self._cache_key and not stale:
+                return self._cached_context
+            with span("excel_read"):
+                values = self.backend.used_range_values()
+        except Exception as e:
+            logger.warning("Error reading sheet: %s", e)
+            return self._cached_context
+
+        address = cache_key[2]
+        self._read_at = time.monotonic()
+        with span("table_build"):
+            context = self._build_context(values, address)
+        fingerprint = context["table"].fingerprint() if context.get("table") is not None else address
+        previous = self._cached_context
+        if previous is None or previous.get("fingerprint") != fingerprint or previous.get("sheet") != cache_key[1]:
+            # Unchanged content keeps the same context, so caches keyed on it still hit
+            context["fingerprint"] = fingerprint
+            context["sheet"] = cache_key[1]
+            self._cached_context = context
+            with span("formula_load"):
+                self._load_formulas(cache_key[1], address, values)
+        self._cache_key = cache_key
+        return self._cached_context
+
+    async def get_workbook_context(self, message: str, active_sheet: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Index every sheet and load the other sheets a message refers to.
+        Returns None when no workbook is reachable.
+        """
+        with span("workbook_context"):
+            return await self.run(self._workbook_context, message, active_sheet)
+
+    def _workbook_context(self, message: str, active_sheet: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not self.connect_to_excel():
+            return None
+        try:
+            for name in self.index.refresh(self.backend):
+                self.sheet_store.discard(name)
+            active_sheet = active_sheet or self.backend.sheet_name()
+            refs = self.index.lookup(message, exclude=active_sheet)
+            dependencies = self._describe_dependencies(message, active_sheet)
+
+            cells, sheet_contexts = [], {}
+            for name, ranges in refs.items():
+                sheet = self._load_sheet(name)
+                table = sheet["table"]
+                for address, label in ranges:
+                    top, left, bottom, right = parse_range(address)
+                    rows = [[table.value_at(r, c) for c in range(left, right + 1)] for r in range(top, bottom + 1)]
+                    cells.append({"sheet": name, "address": address, "label": label, "values": rows})
+                if not ranges:
+                    if sheet["context"] is None:
+                        sheet["context"] = self._table_context(table)
+                        sheet["context"].update(sheet=name, fingerprint=f"{name}:{table.fingerprint()}")
+                    sheet_contexts[name] = sheet["context"]
+        except Exception as e:
+            logger.warning("Error reading workbook: %s", e)
+            return None
+
+        return {
+            "workbook": self.index.workbook,
+            "active_sheet": active_sheet,
+            "sheets": self.index.summary(),
+            "cells": cells,
+            "sheet_contexts": sheet_contexts,
+            "dependencies": dependencies
+        }
+
+    def _describe_dependencies(self, message: str, sheet: str, max_cells: int = 5) -> List[Dict[str, Any]]:
+        """Formula, precedents and dependents of the active-sheet cells a message names"""
+        cells = [m.group(1) + m.group(2) for m in REFERENCE_PATTERN.finditer(message.upper())][:max_cells]
+        if not cells or (self._refresh() or {}).get("sheet") != sheet:
+            return []
+        return self.formula_graph.describe(sheet, cells)
+
+    def _load_sheet(self, name: str) -> Dict[str, Any]:
+        """Body of a sheet from the store, read from the workbook on a miss"""
+        address = self.index.sheets[name].address
+        sheet = self.sheet_store.get(name, address)
+        if sheet is None:
+            sheet = self.sheet_store.put(name, address, self.backend.used_range_values(name))
+        return sheet
+
+    def _load_formulas(self, sheet: str, address: str, values: Any):
+        """Bring the formula graph in line with the sheet; only changed cells are re-parsed"""
+        try:
+            grid = as_grid(values) if values is not None else []
+            self.formula_graph.load_sheet(sheet, address, self.backend.get_formulas(address), grid)
+        except Exception as e:
+            logger.warning("Error reading formulas: %s", e)
+
+    async def preview_updates(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Values the cells downstream of the updates would take, evaluated locally"""
+        with span("recalc_preview"):
+            return await self.run(self._preview_updates, updates)
+
+    def _preview_updates(self, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Inserts move cells, which the graph cannot follow until the sheet is re-read
+        if any(update.get("type") == "insert" for update in updates):
+            return []
+        sheet = (self._refresh() or {}).get("sheet")
+        if sheet is None:
+            return []
+        try:
+            changes = self._cell_changes(updates)
+            self._attach_sheets(sheet, list(changes))
+            return self.formula_graph.preview(sheet, changes)
+        except (KeyError, ValueError) as e:
+            logger.warning("Error previewing updates: %s", e)
+            return []
+
+    def _attach_sheets(self, sheet: str, cells: List[str]):
+        """
+        Give the formula graph the current values of the other sheets read
+        downstream of the cells. Cells reading a sheet that cannot be loaded
+        are left out of previews.
+        """
+        self.formula_graph.external = {}
+        names = self.formula_graph.unresolved_sheets(sheet, cells)
+        if not names:
+            return
+        try:
+            for name in self.index.refresh(self.backend):
+                self.sheet_store.discard(name)
+            self.formula_graph.external = {
+                name: self._load_sheet(name)["table"].value_at for name in names if name in self.index.sheets
+            }
+        except Exception as e:
+            logger.warning("Error reading precedent sheets: %s", e)
+
+    def _cell_changes(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Cell writes of a batch by address, a later write to a cell winning"""
+        changes = {}
+        for update in updates:
+            if update.get("type") == "update":
+                changes[update["cell"].upper().replace("$", "")] = self._clean_value(update["value"])
+            elif update.get("type") == "clear":
+                first_row, first_col, last_row, last_col = parse_range(update["range"])
+                for r in range(first_row, last_row + 1):
+                    for c in range(first_col, last_col + 1):
+                        changes[format_cell(r, c)] = None
+        return changes
+
+    async def apply_updates(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply AI-generated updates as one batch on the worker thread"""
+        with span("excel_write"):
+            return await self.run(self.apply_batch, updates)
+
+    def apply_batch(self, updates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Apply updates as a transaction. Inserts run first, in order. Cell
+        writes and clears are coalesced into rectangular blocks written with
+        one assignment each, and formats are grouped by number format into
+        multi-area ranges. If any step fails, everything already done is
+        undone in reverse.
+        """
+        sheet = (self._cached_context or {}).get("sheet")
+        statuses = [
+            {"index": i, "type": update.get("type"), "target": update.get("cell") or update.get("range"), "status": "pending"}
+            for i, update in enumerate(updates)
+        ]
+
+        try:
+            operations = self._plan_batch(updates, statuses)
+        except ValueError as e:
+            for status in statuses:
+                if status["status"] == "pending":
+                    status["status"] = "not_applied"
+            return {"success": False, "rolled_back": False, "error": str(e), "statuses": statuses}
+
+        undo = []
+        try:
+            for kind, address, payload, indices in operations:
+                try:
+                    if kind == "insert":
+                        self.backend.insert_range(address, payload)
+                        undo.append(("insert", address, payload))
+                    elif kind == "values":
+                        undo.append(("values", address, self.backend.get_formulas(address)))
+                        self.backend.set_value(address, payload)
+                    else:
+                        for area in address.split(","):
+                            undo.extend(("format", block, previous) for block, previous in self._capture_formats(area))
+                        self.backend.set_number_format(address, payload)
+                except Exception as e:
+                    for i in indices:
+                        statuses[i].update(status="failed", error=str(e))
+                    raise
+                for i in indices:
+                    statuses[i]["status"] = "applied"
+        except Exception as e:
+            logger.warning("Error applying updates, rolling back: %s", e)
+            self._rollback(undo)
+            for status in statuses:
+                if status["status"] == "applied":
+                    status["status"] = "rolled_back"
+                elif status["status"] == "pending":
+                    status["status"] = "not_applied"
+            return {"success": False, "rolled_back": True, "error": str(e), "statuses": statuses}
+        finally:
+            self.invalidate()
+
+        if sheet and not any(update.get("type") == "insert" for update in updates):
+            # Keep dependency queries exact until the next read reloads the sheet
+            self.formula_graph.apply(sheet, self._cell_changes(updates))
+
+        return {"success": True, "rolled_back": False, "statuses": statuses}
+
+    def _plan_batch(self, updates: List[Dict[str, Any]], statuses: List[Dict[str, Any]]) -> List[tuple]:
+        """Validate updates and turn them into (kind, address, payload, indices) operations"""
+        cells: Dict[tuple, tuple] = {}
+        formats: Dict[str, List[tuple]] = {}
+        inserts = []
+        errors = []
+
+        for i, update in enumerate(updates):
+            try:
+                if update["type"] == "update":
+                    key = parse_cell(update["cell"])
+                    # A later write to the same cell wins; both report its status
+                    cells[key] = (self._clean_value(update["value"]), cells.get(key, (None, []))[1] + [i])
+                elif update["type"] == "clear":
+                    first_row, first_col, last_row, last_col = parse_range(update["range"])
+                    for key in ((r, c) for r in range(first_row, last_row + 1) for c in range(first_col, last_col + 1)):
+                        cells[key] = (None, cells.get(key, (None, []))[1] + [i])
+                elif update["type"] == "insert":
+                    if update.get("shift", "down") not in ("down", "right"):
+                        raise ValueError(f"Unsupported insert shift: {update['shift']}")
+                    inserts.append(("insert", format_range(*parse_range(update["range"])), update.get("shift", "down"), {i}))
+                elif update["type"] == "format":
+                    number_format = self.NUMBER_FORMATS.get(str(update["format"]).upper())
+                    if not number_format:
+                        statuses[i]["status"] = "skipped"
+                        continue
+                    bounds = parse_range(update["range"])
+                    formats.setdefault(number_format, []).append((format_range(*bounds), i))
+                else:
+                    raise ValueError(f"Unsupported update type: {update['type']}")
+            except (KeyError, ValueError) as e:
+                statuses[i].update(status="invalid", error=str(e))
+                errors.append(str(e))
+
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        operations = inserts
+        for first_row, first_col, last_row, last_col in self._coalesce_blocks(cells.keys()):
+            block = [[cells[(r, c)][0] for c in range(first_col, last_col + 1)] for r in range(first_row, last_row + 1)]
+            indices = {i for r in range(first_row, last_row + 1) for c in range(first_col, last_col + 1) for i in cells[(r, c)][1]}
+            payload = block if len(block) > 1 or len(block[0]) > 1 else block[0][0]
+            operations.append(("values", format_range(first_row, first_col, last_row, last_col), payload, indices))
+
+        for number_format, areas in formats.items():
+            for address, indices in self._join_areas(areas):
+                operations.append(("format", address, number_format, indices))
+        return operations
+
+    @staticmethod
+    def _coalesce_blocks(cells) -> List[tuple]:
+        """Group cells into rectangles: horizontal runs per row, then equal runs on consecutive rows"""
+        runs_by_row: Dict[int, List[tuple]] = {}
+        for row, column in sorted(cells):
+            runs = runs_by_row.setdefault(row, [])
+            if runs and runs[-1][1] == column - 1:
+                runs[-1] = (runs[-1][0], column)
+            else:
+                runs.append((column, column))
+
+        blocks = []
+        open_blocks: Dict[tuple, list] = {}
+        for row in sorted(runs_by_row):
+            next_open = {}
+            for run in runs_by_row[row]:
+                block = open_blocks.get(run)
+                if block and block[2] == row - 1:
+                    block[2] = row
+                else:
+                    block = [row, run[0], row, run[1]]
+                    blocks.append(block)
+                next_open[run] = block
+            open_blocks = next_open
+        return [tuple(block) for block in blocks]
+
+    def _join_areas(self, areas: List[tuple]) -> List[tuple]:
+        """Join range addresses into multi-area addresses within Excel's length limit"""
+        groups = []
+        address, indices = "", set()
+        for area, index in areas:
+            if address and len(address) + len(area) + 1 > self.MAX_AREA_ADDRESS:
+                groups.append((address, indices))
+                address, indices = "", set()
+            address = f"{address},{area}" if address else area
+            indices.add(index)
+        if address:
+            groups.append((address, indices))
+        return groups
+
+    def _capture_formats(self, area: str) -> List[tuple]:
+        """
+        (range, number format) pairs covering an area. Excel reports no format
+        for a range whose cells differ, so mixed ranges are halved until each
+        part is uniform.
+        """
+        number_format = self.backend.get_number_format(area)
+        first_row, first_col, last_row, last_col = parse_range(area)
+        if number_format is not None or (first_row, first_col) == (last_row, last_col):
+            return [(area, number_format)]
+        if last_row - first_row >= last_col - first_col:
+            middle = (first_row + last_row) // 2
+            halves = [(first_row, first_col, middle, last_col), (middle + 1, first_col, last_row, last_col)]
+        else:
+            middle = (first_col + last_col) // 2
+            halves = [(first_row, first_col, last_row, middle), (first_row, middle + 1, last_row, last_col)]
+        return [pair for half in halves for pair in self._capture_formats(format_range(*half))]
+
+    def _rollback(self, undo: List[tuple]):
+        """Restore captured values and formats and remove inserted cells, in reverse order"""
+        for kind, address, previous in reversed(undo):
+            try:
+                if kind == "insert":
+                    self.backend.delete_range(address, "up" if previous == "down" else "left")
+                elif kind == "values":
+                    self.backend.set_value(address, previous if len(previous) > 1 or len(previous[0]) > 1 else previous[0][0])
+                elif previous is not None:
+                    self.backend.set_number_format(address, previous)
+            except Exception as e:
+                logger.error("Error rolling back %s: %s", address, e)
@@ -0,0 +1,517 @@
+from typing import Dict, List, Any, Optional, Tuple, Set, Callable
+from datetime import datetime
+from ..addressing import split_sheet, parse_cell, parse_range, format_cell, format_range
+import math
+import re
+
+# One formula token; functions are matched before references so LOG10( is not a cell
+TOKEN_PATTERN = re.compile(r"""\s*(?:
+    (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?%?|\.\d+%?)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<func>[A-Za-z][A-Za-z0-9.]*)\s*\(
+  | (?P<ref>(?:(?:'[^']+'|[A-Za-z0-9_.]+)!)?\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?)
+  | (?P<bool>TRUE|FALSE)\b
+  | (?P<op><>|<=|>=|[-+*/^&=<>(),])
+)""", re.X | re.I)
+
+ERRORS = {"#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A", "#CIRC!"}
+
+# Binding power of each binary operator, higher binds tighter
+PRECEDENCE = {"=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1, "&": 2, "+": 3, "-": 3, "*": 4, "/": 4, "^": 5}
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+class FormulaError(Exception):
+    """An Excel error value raised during evaluation"""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+class UnsupportedFormula(Exception):
+    """Formula syntax or function the local evaluator does not handle"""
+
+def parse_formula(formula: str, sheet: str) -> tuple:
+    """Parse a formula such as "=SUM(B2:B9)*2" into a tuple syntax tree"""
+    tokens = []
+    text = formula[1:] if formula.startswith("=") else formula
+    position = 0
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if not match or match.end() == position:
+            if text[position:].strip():
+                raise UnsupportedFormula(f"Cannot parse {formula!r} at {text[position:]!r}")
+            break
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        if kind == "func":
+            tokens.append(("op", "("))
+        position = match.end()
+
+    parser = _Parser(tokens, sheet)
+    tree = parser.expression(0)
+    if parser.position != len(tokens):
+        raise UnsupportedFormula(f"Unexpected {tokens[parser.position][1]!r} in {formula!r}")
+    return tree
+
+class _Parser:
+    """Precedence-climbing parser over the token list"""
+
+    def __init__(self, tokens: List[Tuple[str, str]], sheet: str):
+        self.tokens = tokens
+        self.position = 0
+        self.sheet = sheet
+
+    def peek(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, value: Optional[str] = None) -> Tuple[str, str]:
+        token = self.peek()
+        if token[0] is None or (value is not None and token[1] != value):
+            raise UnsupportedFormula(f"Expected {value or 'a value'}")
+        self.position += 1
+        return token
+
+    def expression(self, min_precedence: int) -> tuple:
+        left = self.operand()
+        while True:
+            kind, op = self.peek()
+            precedence = PRECEDENCE.get(op) if kind == "op" else None
+            if precedence is None or precedence < min_precedence:
+                return left
+            self.position += 1
+            # ^ is left-associative in Excel, like the other operators
+            left = ("op", op, left, self.expression(precedence + 1))
+
+    def operand(self) -> tuple:
+        kind, value = self.take()
+        if kind == "number":
+            return ("num", float(value[:-1]) / 100 if value.endswith("%") else float(value))
+        if kind == "string":
+            return ("str", value[1:-1].replace('""', '"'))
+        if kind == "bool":
+            return ("bool", value.upper() == "TRUE")
+        if kind == "ref":
+            sheet, range_ = split_sheet(value)
+            sheet = sheet or self.sheet
+            try:
+                if ":" in range_:
+                    return ("range", sheet) + parse_range(range_)
+                return ("ref", sheet) + parse_cell(range_)
+            except ValueError as e:
+                raise UnsupportedFormula(str(e))
+        if kind == "func":
+            self.take("(")
+            args = []
+            if self.peek()[1] != ")":
+                args.append(self.expression(0))
+                while self.peek()[1] == ",":
+                    self.position += 1
+                    args.append(self.expression(0))
+            self.take(")")
+            return ("func", value.upper(), args)
+        if value == "(":
+            inner = self.expression(0)
+            self.take(")")
+            return inner
+        if value in ("-", "+"):
+            # Unary minus binds tighter than ^ in Excel, so -2^2 is 4
+            operand = self.operand()
+            return ("neg", operand) if value == "-" else operand
+        raise UnsupportedFormula(f"Unexpected {value!r}")
+
+def _references(tree: tuple, cells: Set[tuple], ranges: List[tuple]):
+    """Collect the cells and ranges a syntax tree reads"""
+    kind = tree[0]
+    if kind == "ref":
+        cells.add(tree[1:])
+    elif kind == "range":
+        ranges.append(tree[1:])
+    elif kind == "op":
+        _references(tree[2], cells, ranges)
+        _references(tree[3], cells, ranges)
+    elif kind == "neg":
+        _references(tree[1], cells, ranges)
+    elif kind == "func":
+        for arg in tree[2]:
+            _references(arg, cells, ranges)
+
+def _is_error(value: Any) -> bool:
+    return isinstance(value, str) and value in ERRORS
+
+def _to_number(value: Any) -> float:
+    if _is_error(value):
+        raise FormulaError(value)
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return (value - EXCEL_EPOCH).total_seconds() / 86400
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise FormulaError("#VALUE!")
+
+def _to_text(value: Any) -> str:
+    if _is_error(value):
+        raise FormulaError(value)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class FormulaGraph:
+    """
+    Formulas and values of the loaded sheets with their dependency edges.
+    Cells are keyed by (sheet, row, column) with zero-based indexes. Range
+    references are indexed per column so impact queries never expand them.
+    """
+
+    FUNCTIONS = {"SUM", "AVERAGE", "MIN", "MAX", "COUNT", "PRODUCT", "ABS", "ROUND", "IF"}
+
+    def __init__(self):
+        self.raw: Dict[tuple, Any] = {}
+        self.values: Dict[tuple, Any] = {}
+        self.trees: Dict[tuple, tuple] = {}
+        self.precedents: Dict[tuple, Tuple[Set[tuple], List[tuple]]] = {}
+        self.cell_dependents: Dict[tuple, Set[tuple]] = {}
+        # (sheet, column) -> {dependent: [(first_row, last_row), ...]}
+        self.range_dependents: Dict[tuple, Dict[tuple, List[tuple]]] = {}
+        self.loaded: Set[str] = set()
+        # Values of sheets whose formulas are not loaded, by (row, column)
+        self.external: Dict[str, Callable[[int, int], Any]] = {}
+
+    def load_sheet(self, sheet: str, address: str, formulas: List[List[Any]], values: List[List[Any]]) -> int:
+        """
+        Sync a sheet with its formulas and Excel-computed values, touching the
+        graph only for cells whose formula or constant changed. Returns the
+        number of cells re-parsed.
+        """
+        first_row, first_col, _, _ = parse_range(address)
+        self.loaded.add(sheet)
+        seen = set()
+        uncomputed = []
+        changed = 0
+        for r, row in enumerate(formulas):
+            value_row = values[r] if r < len(values) else []
+            for c, raw in enumerate(row):
+                key = (sheet, first_row + r, first_col + c)
+                if raw is None or raw == "":
+                    continue
+                seen.add(key)
+                if self.raw.get(key) != raw:
+                    self._set(key, raw)
+                    changed += 1
+                value = value_row[c] if c < len(value_row) else None
+                self.values[key] = value
+                if key in self.trees and value == raw:
+                    # No calculation engine behind the values, evaluate locally
+                    uncomputed.append(key)
+
+        for key in [k for k in self.raw if k[0] == sheet and k not in seen]:
+            self._set(key, None)
+            changed += 1
+
+        if uncomputed:
+            order, cycles = self.dependents(uncomputed, include_sources=True)
+            unknown = self._unknown(order)
+            for key in order:
+                if key in unknown:
+                    self.values[key] = None
+                elif key in self.trees:
+                    self.values[key] = "#CIRC!" if key in cycles else self._evaluate_cell(key, {})
+        return changed
+
+    def _set(self, key: tuple, raw: Any):
+        """Replace a cell's content and its outgoing dependency edges"""
+        cells, ranges = self.precedents.pop(key, (set(), []))
+        for cell in cells:
+            self.cell_dependents.get(cell, set()).discard(key)
+        for sheet, first_row, first_col, last_row, last_col in ranges:
+            for column in range(first_col, last_col + 1):
+                self.range_dependents.get((sheet, column), {}).pop(key, None)
+        self.trees.pop(key, None)
+
+        if raw is None or raw == "":
+            self.raw.pop(key, None)
+            self.values.pop(key, None)
+            return
+
+        self.raw[key] = raw
+        if not (isinstance(raw, str) and raw.startswith("=")):
+            self.values[key] = raw
+            return
+
+        try:
+            tree = parse_formula(raw, key[0])
+        except UnsupportedFormula:
+            # Kept without edges; its Excel value is used as-is
+            return
+        cells, ranges = set(), []
+        _references(tree, cells, ranges)
+        self.trees[key] = tree
+        self.precedents[key] = (cells, ranges)
+        for cell in cells:
+            self.cell_dependents.setdefault(cell, set()).add(key)
+        for sheet, first_row, first_col, last_row, last_col in ranges:
+            for column in range(first_col, last_col + 1):
+                self.range_dependents.setdefault((sheet, column), {}).setdefault(key, []).append((first_row, last_row))
+
+    def direct_dependents(self, key: tuple) -> Set[tuple]:
+        """Formula cells that read a cell directly or through a range"""
+        sheet, row, column = key
+        dependents = set(self.cell_dependents.get(key, ()))
+        for dependent, spans in self.range_dependents.get((sheet, column), {}).items():
+            if any(first <= row <= last for first, last in spans):
+                dependents.add(dependent)
+        return dependents
+
+    def dependents(self, keys: List[tuple], include_sources: bool = False) -> Tuple[List[tuple], Set[tuple]]:
+        """
+        Every cell downstream of the given cells in evaluation order, plus the
+        cells that sit on a cycle. The given cells lead the order when
+        include_sources is set.
+        """
+        order, cycles = [], set()
+        state: Dict[tuple, int] = {}  # 1 while on the DFS stack, 2 once finished
+        for start in keys:
+            if start in state:
+                continue
+            stack = [(start, iter(self.direct_dependents(start)))]
+            state[start] = 1
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    state[node] = 2
+                    order.append(node)
+                elif state.get(child) == 1:
+                    cycles.update(n for n, _ in stack[[n for n, _ in stack].index(child):])
+                elif child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(self.direct_dependents(child))))
+        order.reverse()
+        if include_sources:
+            return order, cycles
+        sources = set(keys)
+        return [key for key in order if key not in sources], cycles
+
+    def precedents_of(self, key: tuple) -> List[str]:
+        """Addresses a formula cell reads"""
+        cells, ranges = self.precedents.get(key, (set(), []))
+        return sorted(self._address(c, key[0]) for c in cells) + [
+            self._address(r, key[0]) for r in ranges
+        ]
+
+    @staticmethod
+    def _address(ref: tuple, sheet: str) -> str:
+        address = format_cell(*ref[1:]) if len(ref) == 3 else format_range(*ref[1:])
+        return address if ref[0] == sheet else f"'{ref[0]}'!{address}"
+
+    def preview(self, sheet: str, changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """New values of the cells downstream of the changes, leaving the graph untouched"""
+        return self._recalculate(sheet, changes, commit=False)
+
+    def apply(self, sheet: str, changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Record written cells and recalculate only the affected subgraph"""
+        return self._recalculate(sheet, changes, commit=True)
+
+    def unresolved_sheets(self, sheet: str, changes: List[str]) -> Set[str]:
+        """Sheets without values that the cells downstream of the changes read"""
+        affected, _ = self.dependents([(sheet,) + parse_cell(cell) for cell in changes])
+        return {
+            ref[0] for key in affected for group in self.precedents.get(key, (set(), [])) for ref in group
+        } - self.loaded - self.external.keys()
+
+    def _unknown(self, order: List[tuple]) -> Set[tuple]:
+        """
+        Cells, in evaluation order, that read a sheet with no values, directly
+        or through another such cell; their local result would be made up
+        """
+        unknown: Set[tuple] = set()
+        for key in order:
+            cells, ranges = self.precedents.get(key, (set(), []))
+            reads = [ref[0] for ref in cells] + [ref[0] for ref in ranges]
+            if (any(name not in self.loaded and name not in self.external for name in reads)
+                    or any(cell in unknown for cell in cells)
+                    or any(u[0] == r[0] and r[1] <= u[1] <= r[3] and r[2] <= u[2] <= r[4]
+                           for r in ranges for u in unknown)):
+                unknown.add(key)
+        return unknown
+
+    def _recalculate(self, sheet: str, changes: Dict[str, Any], commit: bool) -> List[Dict[str, Any]]:
+        keys = [(sheet,) + parse_cell(cell) for cell in changes]
+        previous = {key: self.raw.get(key) for key in keys}
+        previous_values = {key: self.values.get(key) for key in keys}
+        for key, value in zip(keys, changes.values()):
+            self._set(key, value)
+
+        try:
+            affected, cycles = self.dependents(keys)
+            unknown = self._unknown(affected)
+            affected = [key for key in affected if key not in unknown]
+            overlay: Dict[tuple, Any] = {}
+            for key in keys + affected:
+                if key in cycles:
+                    overlay[key] = "#CIRC!"
+                elif key in self.trees:
+                    overlay[key] = self._evaluate_cell(key, overlay)
+                elif key in self.raw:
+                    overlay[key] = self.raw[key]
+                else:
+                    overlay[key] = None
+        finally:
+            if not commit:
+                for key, raw in previous.items():
+                    self._set(key, raw)
+                    if key in self.raw:
+                        self.values[key] = previous_values[key]
+
+        results = [
+            {"cell": self._address(key, sheet), "old": self.values.get(key), "new": overlay[key]}
+            for key in affected
+        ]
+        if commit:
+            self.values.update(overlay)
+        return results
+
+    def _evaluate_cell(self, key: tuple, overlay: Dict[tuple, Any]) -> Any:
+        try:
+            return self._evaluate(self.trees[key], overlay)
+        except FormulaError as e:
+            return e.code
+        except UnsupportedFormula:
+            return None
+
+    def _value(self, key: tuple, overlay: Dict[tuple, Any]) -> Any:
+        if key in overlay:
+            return overlay[key]
+        if key[0] in self.external and key[0] not in self.loaded:
+            return self.external[key[0]](key[1], key[2])
+        return self.values.get(key)
+
+    def _evaluate(self, tree: tuple, overlay: Dict[tuple, Any]) -> Any:
+        kind = tree[0]
+        if kind in ("num", "str", "bool"):
+            return tree[1]
+        if kind == "ref":
+            value = self._value(tree[1:], overlay)
+            if _is_error(value):
+                raise FormulaError(value)
+            return value
+        if kind == "range":
+            raise FormulaError("#VALUE!")
+        if kind == "neg":
+            return -_to_number(self._evaluate(tree[1], overlay))
+        if kind == "op":
+            return self._operate(tree[1], self._evaluate(tree[2], overlay), self._evaluate(tree[3], overlay))
+        return self._call(tree[1], tree[2], overlay)
+
+    @staticmethod
+    def _operate(op: str, left: Any, right: Any) -> Any:
+        if op == "&":
+            return _to_text(left) + _to_text(right)
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            if isinstance(left, str) or isinstance(right, str):
+                left, right = _to_text(left).lower(), _to_text(right).lower()
+            else:
+                left, right = _to_number(left), _to_number(right)
+            return {
+                "=": left == right, "<>": left != right, "<": left < right,
+                ">": left > right, "<=": left <= right, ">=": left >= right
+            }[op]
+        left, right = _to_number(left), _to_number(right)
+        if op == "+":
+            return left + right
+        if op == "-":
+            return left - right
+        if op == "*":
+            return left * right
+        if op == "/":
+            if right == 0:
+                raise FormulaError("#DIV/0!")
+            return left / right
+        try:
+            return math.pow(left, right)
+        except (ValueError, OverflowError):
+            raise FormulaError("#NUM!")
+
+    def _numbers(self, args: List[tuple], overlay: Dict[tuple, Any]) -> List[float]:
+        """
+        Numeric arguments. As in Excel, text, booleans and blanks in referenced
+        cells are skipped, whether referenced alone or in a range; only literals
+        and expressions are coerced, so SUM(A1,"x") is #VALUE! but not SUM(A1,B1)
+        """
+        numbers = []
+        for arg in args:
+            if arg[0] == "ref":
+                cells = [arg[1:]]
+            elif arg[0] == "range":
+                sheet, first_row, first_col, last_row, last_col = arg[1:]
+                cells = ((sheet, row, column) for row in range(first_row, last_row + 1)
+                         for column in range(first_col, last_col + 1))
+            else:
+                numbers.append(_to_number(self._evaluate(arg, overlay)))
+                continue
+            for key in cells:
+                value = self._value(key, overlay)
+                if _is_error(value):
+                    raise FormulaError(value)
+                if isinstance(value, (int, float, datetime)) and not isinstance(value, bool):
+                    numbers.append(_to_number(value))
+        return numbers
+
+    def _call(self, name: str, args: List[tuple], overlay: Dict[tuple, Any]) -> Any:
+        if name not in self.FUNCTIONS:
+            raise UnsupportedFormula(f"Unsupported function {name}")
+        if name == "IF":
+            condition = self._evaluate(args[0], overlay)
+            branch = args[1] if _to_number(condition) else (args[2] if len(args) > 2 else ("bool", False))
+            return self._evaluate(branch, overlay)
+        if name == "ABS":
+            return abs(_to_number(self._evaluate(args[0], overlay)))
+        if name == "ROUND":
+            digits = int(_to_number(self._evaluate(args[1], overlay))) if len(args) > 1 else 0
+            value = _to_number(self._evaluate(args[0], overlay))
+            # Excel rounds halves away from zero
+            scaled = abs(value) * 10 ** digits
+            return math.copysign(math.floor(scaled + 0.5) / 10 ** digits, value)
+
+        numbers = self._numbers(args, overlay)
+        if name == "SUM":
+            return sum(numbers)
+        if name == "COUNT":
+            return float(len(numbers))
+        if name == "PRODUCT":
+            return math.prod(numbers) if numbers else 0.0
+        if name == "AVERAGE":
+            if not numbers:
+                raise FormulaError("#DIV/0!")
+            return sum(numbers) / len(numbers)
+        if name == "MIN":
+            return min(numbers) if numbers else 0.0
+        return max(numbers) if numbers else 0.0
+
+    def describe(self, sheet: str, cells: List[str], max_items: int = 8) -> List[Dict[str, Any]]:
+        """Formula, precedents and downstream cells of each referenced cell"""
+        described = []
+        for cell in cells:
+            key = (sheet,) + parse_cell(cell)
+            affected, _ = self.dependents([key])
+            if key not in self.trees and not affected:
+                continue
+            described.append({
+                "cell": cell,
+                "formula": self.raw.get(key) if key in self.trees else None,
+                "precedents": self.precedents_of(key)[:max_items],
+                "dependents": [self._address(k, sheet) for k in affected[:max_items]],
+                "dependent_count": len(affected)
+            })
+        return described
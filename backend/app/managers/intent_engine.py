@@ -0,0 +1,142 @@
+from typing import Dict, List, Any, Optional, Tuple
+from ..addressing import parse_range, format_cell
+import re
+
+CELL = r'\$?[A-Za-z]{1,3}\$?\d+'
+RANGE = rf'{CELL}(?::{CELL})?'
+
+# Words that carry no meaning for the intent and are removed before matching
+FILLER_PATTERN = re.compile(
+    r"\b(?:please|can you|could you|would you|will you|i want to|i'd like to|for me|"
+    r"the|cells?|ranges?|values?|result|it|them|now|thanks|thank you)\b|[?.!,]"
+)
+
+AGGREGATES = {
+    "sum": "SUM", "total": "SUM",
+    "average": "AVERAGE", "avg": "AVERAGE", "mean": "AVERAGE",
+    "min": "MIN", "minimum": "MIN", "lowest": "MIN", "smallest": "MIN",
+    "max": "MAX", "maximum": "MAX", "highest": "MAX", "largest": "MAX",
+    "count": "COUNT"
+}
+
+FORMATS = {
+    "currency": "CURRENCY", "dollars": "CURRENCY", "money": "CURRENCY",
+    "percent": "PERCENTAGE", "percentage": "PERCENTAGE", "percentages": "PERCENTAGE",
+    "date": "DATE", "dates": "DATE",
+    "number": "NUMBER", "numbers": "NUMBER"
+}
+
+AGGREGATE_WORDS = "|".join(AGGREGATES)
+FORMAT_WORDS = "|".join(FORMATS)
+PLACE = r'(?:in|into|to|at|on)'
+VERBS = r'put|place|write|add|calculate|compute|insert|get|show|find'
+# Words that may start a second instruction after "and"
+CLAUSE_START = rf'{VERBS}|format|make|set|apply|use|in|{AGGREGATE_WORDS}|percentage|percent|%'
+
+# Each rule matches one whole clause once filler words are removed
+RULES = [
+    # "sum of A1:A3 in A4", "put the average of B2:B9 into B10"
+    ("aggregate", re.compile(
+        rf'^(?:{VERBS})?\s*(?P<fn>{AGGREGATE_WORDS})\s+(?:of\s+)?'
+        rf'(?P<src>{RANGE})\s+{PLACE}\s+(?P<dest>{CELL})$', re.I
+    )),
+    # "in A4 put the sum of A1:A3"
+    ("aggregate", re.compile(
+        rf'^{PLACE}\s+(?P<dest>{CELL})\s+(?:{VERBS})?\s*'
+        rf'(?P<fn>{AGGREGATE_WORDS})\s+(?:of\s+)?(?P<src>{RANGE})$', re.I
+    )),
+    # "A4 = sum of A1:A3", "set A4 to average of A1:A3"
+    ("aggregate", re.compile(
+        rf'^(?:set|make)?\s*(?P<dest>{CELL})\s+(?:=|to|as|equal to|equals)\s+(?P<fn>{AGGREGATE_WORDS})\s+(?:of\s+)?(?P<src>{RANGE})$', re.I
+    )),
+    # "percentage change from B2 to C2 in D2"
+    ("change", re.compile(
+        rf'^(?:{VERBS})?\s*(?:percentage|percent|%)\s+(?:change|growth|increase)\s+'
+        rf'(?:from|between)\s+(?P<old>{CELL})\s+(?:to|and)\s+(?P<new>{CELL})\s+{PLACE}\s+(?P<dest>{CELL})$', re.I
+    )),
+    # "format A1:A10 as currency", "make B2:B9 percentage", "apply date format to C2:C9"
+    ("format", re.compile(
+        rf'^(?:format|make|set|show|display|change)?\s*(?P<range>{RANGE})\s+(?:as|to|in|into)?\s*(?:a\s+)?(?P<fmt>{FORMAT_WORDS})(?:\s+format)?$', re.I
+    )),
+    ("format", re.compile(
+        rf'^(?:apply|use|add)\s+(?:a\s+)?(?P<fmt>{FORMAT_WORDS})\s+(?:format|formatting)\s+(?:to|on|for)\s+(?P<range>{RANGE})$', re.I
+    )),
+]
+
+class IntentEngine:
+    """
+    Deterministic handling of common formula and formatting requests. Builds
+    the same edit_sheet operations the LLM path would, with no API call, and
+    defers to the LLM whenever any part of the message is not understood.
+    """
+
+    def __init__(self, min_confidence: float = 0.9):
+        self.min_confidence = min_confidence
+
+    def match(self, message: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return edit_sheet operations, or None to fall back to the LLM. They go
+        through validate_operations like the model's before reaching the sheet.
+        """
+        operations = []
+        confidence = 1.0
+
+        for clause in self._clauses(message):
+            result = self._match_clause(clause)
+            if result is None:
+                return None
+            clause_operations, clause_confidence = result
+            operations.extend(clause_operations)
+            confidence = min(confidence, clause_confidence)
+
+        if not operations or confidence < self.min_confidence:
+            return None
+        return operations
+
+    @staticmethod
+    def _clauses(message: str) -> List[str]:
+        """Split a message into clauses joined by "and", "then" or semicolons"""
+        text = message.lower().replace("%", " % ")
+        text = FILLER_PATTERN.sub(" ", text)
+        clauses = re.split(rf'\s*(?:;|\bthen\b|\band(?: then)?\b(?=\s+(?:{CLAUSE_START})\b))\s*', text)
+        return [" ".join(clause.split()) for clause in clauses if clause.strip()]
+
+    def _match_clause(self, clause: str) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """Match a clause against the rules, returning (operations, confidence)"""
+        for kind, pattern in RULES:
+            match = pattern.match(clause)
+            if not match:
+                continue
+            groups = {k: (v.upper().replace("$", "") if v and re.fullmatch(RANGE, v.upper()) else v)
+                      for k, v in match.groupdict().items()}
+
+            if kind == "aggregate":
+                fn = AGGREGATES[groups["fn"]]
+                try:
+                    circular = groups["dest"] in self._range_cells(groups["src"])
+                except ValueError:
+                    return None
+                if circular:
+                    # A formula inside its own range would be circular
+                    return None
+                return [{"op": "update", "range": groups["dest"], "value": f"={fn}({groups['src']})"}], 0.95
+
+            if kind == "change":
+                old, new, dest = groups["old"], groups["new"], groups["dest"]
+                return [
+                    {"op": "update", "range": dest, "value": f"=({new}-{old})/{old}"},
+                    {"op": "format", "range": dest, "format": "PERCENTAGE"}
+                ], 0.95
+
+            if kind == "format":
+                return [{"op": "format", "range": groups["range"], "format": FORMATS[groups["fmt"]]}], 0.95
+
+        return None
+
+    @staticmethod
+    def _range_cells(range_: str) -> set:
+        """Cells covered by a small range, used to reject circular references"""
+        first_row, first_col, last_row, last_col = parse_range(range_)
+        if (last_row - first_row + 1) * (last_col - first_col + 1) > 10000:
+            return set()
+        return {format_cell(r, c) for r in range(first_row, last_row + 1) for c in range(first_col, last_col + 1)}
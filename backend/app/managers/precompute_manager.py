@@ -0,0 +1,115 @@
+from typing import Dict, List, Any, Optional
+from .ai_manager import AIManager
+from .cache_manager import ResponseCache
+from ..telemetry import metrics, trace, span
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+welcome_total = metrics.counter("fintelligent_welcome_total", "Welcome messages sent, by whether the model's was ready")
+
+WELCOME_PROMPT = "Generate a welcome message appropriate for the current context."
+
+class PrecomputeManager:
+    """
+    Works ahead of the client. When a sheet snapshot changes, its suggestions
+    are computed and, once the sheet has been quiet for a moment, the model
+    writes a welcome message for it. Both are cached under the snapshot's
+    version, so connect and sync frames are answered without waiting and an
+    edited sheet never gets an answer meant for an older version.
+    """
+
+    def __init__(self, ai_manager: AIManager, cache: Optional[ResponseCache] = None,
+                 delay: float = 3.0, llm_welcome: bool = True):
+        self.ai_manager = ai_manager
+        self.cache = cache or ResponseCache()
+        self.delay = delay
+        self.llm_welcome = llm_welcome
+        # Precomputation in flight per snapshot version
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Version each scope (a session) last saw, and the suggestions it was last sent
+        self._scopes: Dict[str, str] = {}
+        self._suggestions: Dict[str, List[str]] = {}
+
+    def key(self, excel_context: Optional[Dict[str, Any]]) -> str:
+        """Snapshot version a result belongs to"""
+        if not self.ai_manager._has_data(excel_context):
+            return "empty"
+        return self.ai_manager.context_builder.profile_key(excel_context)
+
+    async def _entry(self, key: str) -> Dict[str, Any]:
+        return await self.cache.get(f"precompute:{key}") or {}
+
+    async def welcome(self, excel_context: Optional[Dict[str, Any]], scope: str) -> Dict[str, Any]:
+        """
+        The welcome frame's content and suggestions: the model's message when it
+        is ready for this version, otherwise one built from the sheet at once
+        """
+        key = self.key(excel_context)
+        entry = await self._entry(key)
+        self.schedule(excel_context, scope)
+        if entry.get("welcome"):
+            welcome_total.inc(source="precomputed")
+            return {"content": entry["welcome"], "suggestions": entry.get("suggestions") or []}
+        welcome_total.inc(source="template")
+        suggestions = entry.get("suggestions") or self.ai_manager.get_suggestions(excel_context)
+        self._suggestions[scope] = suggestions
+        return {"content": self.ai_manager.get_welcome(excel_context), "suggestions": suggestions}
+
+    async def suggestions(self, excel_context: Optional[Dict[str, Any]], scope: str) -> List[str]:
+        """Suggestions for a sync reply; the previous version's serve until this one's are ready"""
+        entry = await self._entry(self.key(excel_context))
+        self.schedule(excel_context, scope)
+        suggestions = entry.get("suggestions") or self._suggestions.get(scope)
+        if suggestions is None:
+            suggestions = self._suggestions[scope] = self.ai_manager.get_suggestions(excel_context)
+        return suggestions
+
+    def schedule(self, excel_context: Optional[Dict[str, Any]], scope: str):
+        """Precompute for the scope's current snapshot, dropping work for the version it replaced"""
+        key = self.key(excel_context)
+        previous = self._scopes.get(scope)
+        self._scopes[scope] = key
+        if previous and previous != key and previous not in self._scopes.values():
+            # No client is looking at that version any more
+            stale = self.tasks.pop(previous, None)
+            if stale is not None:
+                stale.cancel()
+        if key not in self.tasks:
+            task = asyncio.create_task(self._precompute(key, excel_context))
+            self.tasks[key] = task
+            task.add_done_callback(lambda done, key=key: self.tasks.pop(key, None) if self.tasks.get(key) is done else None)
+
+    def release(self, scope: str):
+        """Forget a scope whose connection closed; finished results stay cached for reconnects"""
+        self._scopes.pop(scope, None)
+        self._suggestions.pop(scope, None)
+
+    async def _precompute(self, key: str, excel_context: Optional[Dict[str, Any]]):
+        try:
+            with trace(key[-12:], "precompute") as request:
+                entry = await self._entry(key)
+                if not entry.get("suggestions"):
+                    with span("suggestions"):
+                        entry["suggestions"] = self.ai_manager.get_suggestions(excel_context)
+                    await self.cache.set(f"precompute:{key}", entry)
+                for scope, scoped_key in self._scopes.items():
+                    if scoped_key == key:
+                        self._suggestions[scope] = entry["suggestions"]
+
+                if not self.llm_welcome or entry.get("welcome"):
+                    return
+                # Syncs arrive in bursts while the user edits; a newer version
+                # cancels this one before it spends a completion
+                await asyncio.sleep(self.delay)
+                result = await self.ai_manager.analyze_message(WELCOME_PROMPT, excel_context)
+                if result.get("type") != "message" or not result.get("content"):
+                    request.outcome = "error"
+                    return
+                entry["welcome"] = result["content"]
+                await self.cache.set(f"precompute:{key}", entry)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Precomputation failed for %s: %s", key, e)
@@ -0,0 +1,311 @@
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Tuple, Type
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from .snapshot_manager import SnapshotManager
+from ..telemetry import metrics, record_span
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+syncs_coalesced = metrics.counter("fintelligent_syncs_coalesced_total", "excel_sync frames folded into a queued sync")
+requests_cancelled = metrics.counter("fintelligent_requests_cancelled_total", "Requests cancelled or superseded by the client")
+retries_total = metrics.counter("fintelligent_upstream_retries_total", "Completion attempts retried after a transient failure")
+
+class RequestCancelled(Exception):
+    """The client cancelled or superseded the request while it was running"""
+
+class Lease:
+    """A granted slot; charge() corrects the token estimate once usage is known"""
+
+    def __init__(self, limiter: "FairRateLimiter", owner: str, cost: int):
+        self.limiter = limiter
+        self.owner = owner
+        self.cost = cost
+
+    def charge(self, tokens: int):
+        if self.limiter.tokens_per_minute:
+            self.limiter.tokens -= tokens - self.cost
+            self.cost = tokens
+
+class FairRateLimiter:
+    """
+    Bounds completions in flight and, when tokens_per_minute is set, the
+    tokens they spend through a token bucket. Waiters queue per owner and
+    are granted round-robin, so one busy connection cannot starve the others.
+    """
+
+    def __init__(self, max_concurrency: int = 8, tokens_per_minute: int = 0):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.in_flight = 0
+        self._updated = time.monotonic()
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.granted = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def acquire(self, owner: str, cost: int = 0):
+        """Wait for a slot and enough tokens for an estimated cost"""
+        lease = await self._wait(owner, cost)
+        try:
+            yield lease
+        finally:
+            self.in_flight -= 1
+            self._dispatch()
+
+    async def _wait(self, owner: str, cost: int) -> Lease:
+        # A request larger than the bucket would never fit, charge it a full bucket
+        cost = min(cost, self.tokens_per_minute) if self.tokens_per_minute else 0
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(owner, deque()).append((future, cost))
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the waiter was cancelled, give the slot back
+                self.in_flight -= 1
+            else:
+                waiters = self._queues.get(owner)
+                if waiters is not None:
+                    try:
+                        waiters.remove((future, cost))
+                    except ValueError:
+                        pass
+                    if not waiters:
+                        del self._queues[owner]
+            self._dispatch()
+            raise
+        waited = time.monotonic() - started
+        self.granted += 1
+        self.wait_seconds += waited
+        record_span("queue_wait", waited)
+        return Lease(self, owner, cost)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.tokens_per_minute:
+            self.tokens = min(
+                float(self.tokens_per_minute),
+                self.tokens + (now - self._updated) * self.tokens_per_minute / 60
+            )
+        self._updated = now
+
+    def _dispatch(self):
+        """Grant queued waiters in round-robin order while slots and tokens allow"""
+        self._refill()
+        while self._queues and self.in_flight < self.max_concurrency:
+            owner, waiters = next(iter(self._queues.items()))
+            future, cost = waiters[0]
+            if future.done():
+                waiters.popleft()
+            elif cost > self.tokens:
+                # The head waits for the bucket rather than letting smaller requests
+                # overtake it, so large prompts are not starved
+                self._schedule((cost - self.tokens) * 60 / self.tokens_per_minute)
+                return
+            else:
+                waiters.popleft()
+                self.tokens -= cost
+                self.in_flight += 1
+                future.set_result(None)
+            # Move the owner to the back of the rotation
+            del self._queues[owner]
+            if waiters:
+                self._queues[owner] = waiters
+
+    def _schedule(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": sum(len(waiters) for waiters in self._queues.values()),
+            "tokens": round(self.tokens, 1) if self.tokens_per_minute else None,
+            "granted": self.granted,
+            "avg_wait_ms": self.wait_seconds * 1000 / self.granted if self.granted else 0.0
+        }
+
+async def retry_with_jitter(call: Callable[[], Awaitable[Any]], retry_on: Tuple[Type[BaseException], ...],
+                            attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0) -> Any:
+    """
+    Await call(), retrying the given errors with exponential backoff and full
+    jitter so clients that failed together do not retry together
+    """
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except retry_on as e:
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            # Respect the server's Retry-After when it sends one
+            headers = getattr(getattr(e, "response", None), "headers", None) or {}
+            try:
+                delay = max(delay, min(max_delay, float(headers.get("retry-after", 0))))
+            except (TypeError, ValueError):
+                pass
+            logger.warning("Upstream request failed (%s), retrying in %.2fs", type(e).__name__, delay)
+            retries_total.inc(error=type(e).__name__)
+            await asyncio.sleep(delay)
+
+class RequestScheduler:
+    """
+    Orders one connection's frames. Rapid excel_sync frames are coalesced
+    while they wait, and the AI request in flight can be cancelled by a
+    cancel frame or superseded by a newer message.
+    """
+
+    REQUEST_TYPES = ("message", "suggestion")
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[None]], max_pending: int = 16,
+                 sync_debounce: float = 0.15):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.sync_debounce = sync_debounce
+        # Entries are [frame, ready_at]; syncs wait out the debounce window
+        self.pending: deque = deque()
+        self._changed = asyncio.Event()
+        self._space = asyncio.Event()
+        self.current: Optional[Dict[str, Any]] = None
+        self._request_task: Optional[asyncio.Task] = None
+        self._cancel_current = False
+        self._request_done = False
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def submit(self, frame: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Queue a frame, waiting while the queue is full. Returns the request frames it cancelled."""
+        kind = frame.get("type")
+        if kind == "cancel":
+            return self.cancel(frame.get("request_id"))
+
+        cancelled = self.cancel() if kind in self.REQUEST_TYPES and frame.get("supersede") else []
+        if kind == "excel_sync" and self._coalesce(frame):
+            self.coalesced += 1
+            syncs_coalesced.inc()
+            return cancelled
+
+        while len(self.pending) >= self.max_pending:
+            self._space.clear()
+            await self._space.wait()
+
+        loop = asyncio.get_running_loop()
+        if kind == "excel_sync":
+            ready_at = loop.time() + self.sync_debounce
+        else:
+            # Anything queued behind a sync needs it applied, stop debouncing
+            ready_at = 0.0
+            for entry in self.pending:
+                entry[1] = 0.0
+        self.pending.append([frame, ready_at])
+        self._changed.set()
+        return cancelled
+
+    def _coalesce(self, frame: Dict[str, Any]) -> bool:
+        """Fold a sync into the sync at the back of the queue when both cover the same sheet"""
+        if not self.pending or self.pending[-1][0].get("type") != "excel_sync":
+            return False
+        entry = self.pending[-1]
+        queued, payload = entry[0].get("content"), frame.get("content")
+        if not isinstance(queued, dict) or not isinstance(payload, dict):
+            return False
+        if SnapshotManager._sheet_name(queued) != SnapshotManager._sheet_name(payload):
+            return False
+
+        if payload == queued:
+            return True
+        if not payload.get("full", True) and payload.get("version", 0) <= queued.get("version", 0):
+            # A repeat of a delta the queued sync already covers
+            return True
+        if payload.get("full", True):
+            # A full sync carries the whole sheet, the queued one is moot
+            entry[0] = frame
+            return True
+        if not queued.get("full", True) and payload.get("base_version") == queued.get("version"):
+            # Chain two deltas into one; later blocks overwrite earlier ones
+            entry[0] = dict(frame, content=dict(
+                payload,
+                base_version=queued.get("base_version"),
+                blocks=list(queued.get("blocks", [])) + list(payload.get("blocks", []))
+            ))
+            return True
+        return False
+
+    def cancel(self, request_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Cancel the request in flight and queued requests, or only the one with request_id"""
+        def matches(frame: Dict[str, Any]) -> bool:
+            return frame.get("type") in self.REQUEST_TYPES and (
+                request_id is None or frame.get("request_id") == request_id
+            )
+
+        cancelled = [entry[0] for entry in self.pending if matches(entry[0])]
+        if cancelled:
+            self.pending = deque(entry for entry in self.pending if not matches(entry[0]))
+            self._space.set()
+        # Once its reply exists the current request is past cancelling
+        if self.current is not None and matches(self.current) and not self._request_done:
+            self._cancel_current = True
+            if self._request_task is not None:
+                self._request_task.cancel()
+            cancelled.insert(0, self.current)
+        self.cancelled += len(cancelled)
+        if cancelled:
+            requests_cancelled.inc(len(cancelled))
+        return cancelled
+
+    async def cancellable(self, awaitable: Awaitable[Any]) -> Any:
+        """Run the current frame's AI request so cancel() can stop it; raises RequestCancelled"""
+        if self._cancel_current:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise RequestCancelled()
+        task = asyncio.ensure_future(awaitable)
+        self._request_task = task
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if self._cancel_current and task.cancelled():
+                raise RequestCancelled()
+            raise
+        finally:
+            self._request_task = None
+            self._request_done = True
+
+    async def run(self):
+        """Handle frames in order until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+            frame, ready_at = self.pending[0]
+            delay = ready_at - loop.time()
+            if delay > 0:
+                # Wait out the debounce unless another frame arrives first
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.pending.popleft()
+            self._space.set()
+            self.current = frame
+            self._cancel_current = self._request_done = False
+            try:
+                await self.handler(frame)
+            finally:
+                self.current = None
@@ -0,0 +1,87 @@
+from typing import Dict, List, Optional
+from collections import deque
+from .snapshot_manager import SnapshotManager
+from .context_builder import estimate_tokens
+from .state_store import StateStore
+import json
+import uuid
+
+class ConversationSession:
+    """
+    State owned by one connection: sheet snapshots and conversation memory.
+    With a state store the session outlives the connection, so a client that
+    reconnects to another worker resumes where it left off.
+    """
+
+    def __init__(self, token_budget: int = 1500, max_messages: int = 40, session_id: Optional[str] = None,
+                 store: Optional[StateStore] = None, ttl_seconds: float = 86400):
+        self.token_budget = token_budget
+        self.session_id = session_id or uuid.uuid4().hex
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.snapshots = SnapshotManager(store, self.session_id, ttl_seconds)
+        # Ring buffer of recent messages; older ones are folded into the summary
+        self.history: deque = deque(maxlen=max_messages)
+        self.summary = ""
+
+    @property
+    def state_key(self) -> str:
+        return f"session:{self.session_id}"
+
+    async def restore(self) -> bool:
+        """Load the stored conversation memory, returning False when there is none"""
+        if self.store is None:
+            return False
+        data = await self.store.get(self.state_key)
+        if not data:
+            return False
+        state = json.loads(data)
+        self.history.clear()
+        self.history.extend(state.get("history", []))
+        self.summary = state.get("summary", "")
+        self.snapshots.active_sheet = state.get("active_sheet")
+        return True
+
+    async def save(self):
+        """Write the conversation memory to the store, refreshing its expiry"""
+        if self.store is None:
+            return
+        state = {"history": list(self.history), "summary": self.summary, "active_sheet": self.snapshots.active_sheet}
+        await self.store.set(self.state_key, json.dumps(state).encode(), self.ttl_seconds)
+
+    async def discard(self):
+        """Delete everything stored for the session, once it cannot be resumed"""
+        if self.store is not None:
+            await self.store.delete(self.state_key)
+        await self.snapshots.discard()
+
+    def history_messages(self) -> List[Dict[str, str]]:
+        """Messages to send ahead of the current request"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        messages.extend(self.history)
+        return messages
+
+    def add_turn(self, user_message: str, assistant_message: str):
+        """Record a completed exchange"""
+        self.history.append({"role": "user", "content": user_message})
+        self.history.append({"role": "assistant", "content": assistant_message})
+
+    def history_tokens(self) -> int:
+        return sum(estimate_tokens(m["content"]) for m in self.history)
+
+    def needs_compaction(self) -> bool:
+        return self.history_tokens() > self.token_budget
+
+    def take_oldest(self) -> List[Dict[str, str]]:
+        """Remove the oldest exchanges until the history fits in half the budget"""
+        taken = []
+        while len(self.history) > 2 and self.history_tokens() > self.token_budget // 2:
+            taken.append(self.history.popleft())
+            taken.append(self.history.popleft())
+        return taken
+
+    def restore_oldest(self, messages: List[Dict[str, str]]):
+        """Put back messages whose summarization failed"""
+        self.history.extendleft(reversed(messages))
@@ -0,0 +1,161 @@
+from typing import Dict, List, Any, Optional
+from ..addressing import split_sheet
+from ..columnar import ColumnarSheet
+from .state_store import StateStore
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class SheetSnapshot:
+    """Server-side copy of one sheet's used range, kept current by client deltas"""
+
+    def __init__(self, sheet: str, address: str, values: List[List[Any]], version: int):
+        self.sheet = sheet
+        self.version = version
+        # Identifies this snapshot across connections, combined with the version
+        self.token = uuid.uuid4().hex
+        self.table = ColumnarSheet.from_rows(values, address, sheet)
+
+    @classmethod
+    def from_state(cls, data: bytes) -> "SheetSnapshot":
+        """
+        Rebuild a snapshot written by to_state, keeping its token and version.
+        The shared store is not trusted, so this parses data and never unpickles.
+        """
+        table, meta = ColumnarSheet.from_bytes(data)
+        snapshot = cls.__new__(cls)
+        snapshot.sheet = table.sheet
+        snapshot.version = int(meta["version"])
+        snapshot.token = str(meta["token"])
+        snapshot.table = table
+        return snapshot
+
+    def to_state(self) -> bytes:
+        return self.table.to_bytes({"token": self.token, "version": self.version})
+
+    @property
+    def address(self) -> str:
+        return self.table.address
+
+    def apply_blocks(self, address: str, blocks: List[Dict[str, Any]], version: int):
+        """Resize to the new used range and write the changed cell blocks"""
+        # Only the columns the blocks touch are copied
+        self.table = self.table.with_blocks(address, blocks)
+        self.version = version
+
+    def to_context(self) -> Dict[str, Any]:
+        """Build the Excel context consumed by the AI manager"""
+        return {
+            "is_empty": self.table.is_empty(),
+            "sheet": self.sheet,
+            "version": self.version,
+            "fingerprint": f"{self.token}:{self.version}",
+            "table": self.table,
+            "headers": list(self.table.headers),
+            "address": self.address,
+            "activeRange": self.address,
+            "row_count": self.table.row_count,
+            "column_count": self.table.column_count,
+            "data_start_row": self.table.data_start_row
+        }
+
+class SnapshotManager:
+    """
+    Per-session sheet snapshots keyed by sheet name. With a state store every
+    applied sync is written through, so deltas can land on any worker.
+    """
+
+    def __init__(self, store: Optional[StateStore] = None, session_id: str = "", ttl_seconds: float = 86400):
+        self.snapshots: Dict[str, SheetSnapshot] = {}
+        self.active_sheet: Optional[str] = None
+        self.store = store
+        self.session_id = session_id
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _sheet_name(payload: Dict[str, Any]) -> str:
+        return payload.get("sheet") or split_sheet(payload.get("address") or "")[0] or "Sheet1"
+
+    def _state_key(self, sheet: str) -> str:
+        return f"snapshot:{self.session_id}:{sheet}"
+
+    async def _load(self, sheet: str) -> Optional[SheetSnapshot]:
+        """Replace the local copy of a sheet with the stored one, when there is one"""
+        data = await self.store.get(self._state_key(sheet))
+        if data:
+            try:
+                self.snapshots[sheet] = SheetSnapshot.from_state(data)
+            except (KeyError, TypeError, ValueError) as e:
+                # The client resyncs the full sheet when it has no snapshot
+                logger.warning("Discarding unreadable snapshot of %s: %s", sheet, e)
+                self.snapshots.pop(sheet, None)
+                await self.store.delete(self._state_key(sheet))
+        return self.snapshots.get(sheet)
+
+    async def sync(self, payload: Dict[str, Any]) -> bool:
+        """apply_sync against the shared copy of the sheet, written back afterwards"""
+        if self.store is None:
+            return self.apply_sync(payload)
+
+        sheet = self._sheet_name(payload)
+        if not payload.get("full", True):
+            # Another worker may have applied the syncs since our copy was taken
+            local = self.snapshots.get(sheet)
+            if local is None or local.version != payload.get("base_version"):
+                await self._load(sheet)
+
+        applied = self.apply_sync(payload)
+        snapshot = self.snapshots.get(sheet)
+        if snapshot is not None:
+            await self.store.set(self._state_key(sheet), snapshot.to_state(), self.ttl_seconds)
+        else:
+            await self.store.delete(self._state_key(sheet))
+        return applied
+
+    async def discard(self):
+        """Delete this session's stored snapshots"""
+        if self.store is not None:
+            for sheet in self.snapshots:
+                await self.store.delete(self._state_key(sheet))
+        self.snapshots.clear()
+
+    async def load_context(self, sheet: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """get_context, fetching the sheet from the store when this worker has no copy"""
+        sheet = sheet or self.active_sheet
+        if self.store is not None and sheet and sheet not in self.snapshots:
+            await self._load(sheet)
+        return self.get_context(sheet)
+
+    def apply_sync(self, payload: Dict[str, Any]) -> bool:
+        """
+        Apply a full or delta sync payload. Returns False when the client's base
+        version does not match ours and it must resend the full sheet.
+        """
+        address = payload.get("address") or ""
+        sheet = self._sheet_name(payload)
+        version = payload.get("version", 0)
+        self.active_sheet = sheet
+
+        if payload.get("full", True):
+            if not address:
+                self.snapshots.pop(sheet, None)
+                return True
+            self.snapshots[sheet] = SheetSnapshot(sheet, address, payload.get("values") or [], version)
+            return True
+
+        snapshot = self.snapshots.get(sheet)
+        if snapshot is None or snapshot.version != payload.get("base_version"):
+            return False
+        try:
+            snapshot.apply_blocks(address, payload.get("blocks", []), version)
+        except (ValueError, IndexError, KeyError) as e:
+            logger.warning("Delta sync failed for %s: %s", sheet, e)
+            self.snapshots.pop(sheet, None)
+            return False
+        return True
+
+    def get_context(self, sheet: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the Excel context for a sheet, defaulting to the last synced one"""
+        snapshot = self.snapshots.get(sheet or self.active_sheet)
+        return snapshot.to_context() if snapshot else None
@@ -0,0 +1,126 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+import time
+
+class StateStore:
+    """
+    Key-value store for state shared between workers: sessions, sheet
+    snapshots and cached responses. Values are bytes, and every call is
+    async so a networked store never blocks the event loop.
+    """
+
+    # Whether other workers read the same keys; a process-local store's
+    # keys die with the process, so nothing outlives the connection there
+    shared = True
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """Store a value, expiring it after ttl seconds when given"""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+class MemoryStateStore(StateStore):
+    """
+    Process-local store, enough for a single worker. Holds at most
+    max_entries keys, evicting the least recently used, and sweeps expired
+    keys every sweep_interval writes.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries: int = 10000, sweep_interval: int = 1000):
+        self._data: OrderedDict = OrderedDict()
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and time.monotonic() > expires:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._data.move_to_end(key)
+        self._writes += 1
+        if self._writes % self.sweep_interval == 0:
+            self._sweep()
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _sweep(self):
+        now = time.monotonic()
+        for key in [k for k, (_, expires) in self._data.items() if expires is not None and now > expires]:
+            del self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+class RedisStateStore(StateStore):
+    """
+    Store shared by every worker and node through Redis. Accepts any client
+    with the redis.asyncio get/set/delete interface, so a stand-in can be
+    injected where no server is running.
+    """
+
+    def __init__(self, client: Any = None, url: str = "redis://localhost:6379/0", prefix: str = "fintelligent:"):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+class FakeRedisClient:
+    """In-memory stand-in for redis.asyncio.Redis covering the calls RedisStateStore makes"""
+
+    def __init__(self):
+        self.data: Dict[str, tuple] = {}
+        self.calls = 0
+
+    async def get(self, name: str) -> Optional[bytes]:
+        self.calls += 1
+        entry = self.data.get(name)
+        if entry is None or (entry[1] is not None and time.monotonic() > entry[1]):
+            self.data.pop(name, None)
+            return None
+        return entry[0]
+
+    async def set(self, name: str, value: bytes, px: Optional[int] = None):
+        self.calls += 1
+        self.data[name] = (bytes(value), time.monotonic() + px / 1000 if px else None)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        self.calls += 1
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+def create_state_store(url: Optional[str] = None) -> Optional[StateStore]:
+    """
+    Redis for redis:// URLs, otherwise None: a single worker already keeps
+    sessions, snapshots and replies in process, and a store would only copy them
+    """
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(url=url)
+    return None
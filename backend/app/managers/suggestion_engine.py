@@ -0,0 +1,134 @@
+from typing import Dict, List, Any, Optional
+from datetime import date, datetime
+from .context_builder import SheetProfile
+import numpy as np
+import re
+
+REVENUE_PATTERN = re.compile(r'revenue|sales|income|turnover|bookings', re.I)
+COST_PATTERN = re.compile(r'cost|expense|cogs|opex|spend|payroll', re.I)
+DATE_PATTERN = re.compile(r'date|month|year|period|quarter|week|day', re.I)
+PERCENT_PATTERN = re.compile(r'%|percent|margin|rate|growth|yield|share', re.I)
+# Headers of period columns in a financial model, such as FY2023, Q1 or Jan-24
+PERIOD_PATTERN = re.compile(
+    r'^(?:fy\s*)?(?:19|20)\d{2}[ea]?$|^(?:q[1-4]|h[12])\b|^(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b',
+    re.I
+)
+DATE_VALUE_PATTERN = re.compile(r'^\d{4}-\d{1,2}-\d{1,2}|^\d{1,2}/\d{1,2}/\d{2,4}$')
+
+DEFAULT_SUGGESTIONS = [
+    "Analyze this data",
+    "Create a summary of this data",
+    "Find patterns or trends"
+]
+
+class SuggestionEngine:
+    """
+    Reads what a sheet holds from its column profile: revenue and cost lines,
+    dates, percentages and categories. Suggestions and the instant welcome
+    message are phrased around them, with no API call.
+    """
+
+    def __init__(self, count: int = 3):
+        self.count = count
+
+    def describe(self, profile: SheetProfile) -> Dict[str, Any]:
+        """The notable columns and rows of a sheet, by role"""
+        headers = profile.headers
+        numeric = profile.numeric_columns
+        facts: Dict[str, Any] = {}
+
+        percent = [i for i in numeric if PERCENT_PATTERN.search(headers[i]) or self._is_fraction(profile, i)]
+        periods = [headers[i] for i in numeric if PERIOD_PATTERN.match(headers[i].strip())]
+        measures = [i for i in numeric if i not in percent and headers[i] not in periods]
+        if percent:
+            facts["percent"] = headers[percent[0]]
+        if len(periods) >= 2:
+            facts["periods"] = (periods[0], periods[-1])
+
+        # Revenue and cost appear as column headers, or as row labels when
+        # line items run down the sheet
+        for role, pattern in (("revenue", REVENUE_PATTERN), ("cost", COST_PATTERN)):
+            column = next((i for i in measures if pattern.search(headers[i])), None)
+            label = headers[column] if column is not None else self._find_label(profile, pattern)
+            if label:
+                facts[role] = label
+        if measures:
+            revenue = next((i for i in measures if headers[i] == facts.get("revenue")), None)
+            facts["measure"] = headers[revenue if revenue is not None else measures[0]]
+
+        for i, column in enumerate(profile.table.columns):
+            if i in numeric:
+                continue
+            if "date" not in facts and (DATE_PATTERN.search(headers[i]) or self._holds_dates(column)):
+                facts["date"] = headers[i]
+            elif "category" not in facts and 2 <= profile.stats[i]["distinct"] <= min(50, max(2, profile.row_count // 2)):
+                facts["category"] = headers[i]
+        return facts
+
+    def suggest(self, profile: SheetProfile) -> List[str]:
+        """Questions worth asking about this sheet, the most specific first"""
+        facts = self.describe(profile)
+        measure = facts.get("measure")
+        suggestions = []
+        if facts.get("revenue") and facts.get("cost"):
+            suggestions.append(f"What is the margin of {facts['revenue']} over {facts['cost']}?")
+        if facts.get("periods") and (facts.get("revenue") or measure):
+            first, last = facts["periods"]
+            suggestions.append(f"How did {facts.get('revenue') or measure} change from {first} to {last}?")
+        if facts.get("date") and measure:
+            suggestions.append(f"Show the trend of {measure} by {facts['date']}")
+        if facts.get("category") and measure:
+            suggestions.append(f"Which {facts['category']} has the highest {measure}?")
+        if facts.get("percent"):
+            suggestions.append(f"Which rows have the lowest {facts['percent']}?")
+        if measure:
+            suggestions.append(f"Find outliers in {measure}")
+
+        for suggestion in DEFAULT_SUGGESTIONS:
+            if len(suggestions) >= self.count:
+                break
+            suggestions.append(suggestion)
+        return suggestions[:self.count]
+
+    def welcome(self, profile: Optional[SheetProfile], sheet: Optional[str] = None) -> str:
+        """A welcome message built from the sheet, sent while the model's is not ready"""
+        if profile is None or profile.row_count == 0:
+            return ("Welcome to Fintelligent. Open a sheet with data and I can analyze it, "
+                    "or ask me anything about Excel and finance.")
+        facts = self.describe(profile)
+        notable = [facts[role] for role in ("revenue", "cost", "measure", "date", "category") if facts.get(role)]
+        notable = list(dict.fromkeys(notable))[:3]
+        where = f" in {sheet}" if sheet else ""
+        text = f"Welcome to Fintelligent. I can see {profile.row_count} rows across {len(profile.headers)} columns{where}"
+        if notable:
+            text += ", including " + (", ".join(notable[:-1]) + " and " + notable[-1] if len(notable) > 1 else notable[0])
+        return text + ". What would you like to know?"
+
+    @staticmethod
+    def _is_fraction(profile: SheetProfile, i: int) -> bool:
+        """Numeric columns of fractions between -1 and 1, how percentages are stored"""
+        stats = profile.stats[i]
+        if stats["min"] < -1 or stats["max"] > 1:
+            return False
+        values = profile.table.columns[i].numeric()
+        # Columns of 0 and 1 are flags, not rates
+        return bool(np.any(np.nan_to_num(values) % 1 != 0))
+
+    @staticmethod
+    def _holds_dates(column) -> bool:
+        sample = list(column.categories[:5]) if column.categories else []
+        return bool(sample) and all(
+            isinstance(value, (date, datetime)) or (isinstance(value, str) and DATE_VALUE_PATTERN.match(value))
+            for value in sample
+        )
+
+    @staticmethod
+    def _find_label(profile: SheetProfile, pattern: re.Pattern) -> Optional[str]:
+        """First row label matching a pattern, as written in the sheet"""
+        for i, column in enumerate(profile.table.columns):
+            if i in profile.numeric_columns or not column.categories:
+                continue
+            for value in column.categories[:200]:
+                if isinstance(value, str) and pattern.search(value):
+                    return value.strip()
+        return None
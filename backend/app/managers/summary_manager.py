@@ -0,0 +1,278 @@
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator, TYPE_CHECKING
+from .context_builder import estimate_tokens, _format_value
+from .session_manager import ConversationSession
+from ..columnar import ColumnarSheet
+from ..addressing import format_range
+from ..telemetry import metrics, span
+import asyncio
+import logging
+import re
+
+if TYPE_CHECKING:
+    from .ai_manager import AIManager
+
+logger = logging.getLogger(__name__)
+
+blocks_total = metrics.counter("fintelligent_summary_blocks_total", "Sheet blocks summarized, by whether the summary was cached")
+
+# Requests about the sheet as a whole rather than particular cells
+SUMMARY_PATTERN = re.compile(
+    r'\bsummar(?:y|ise|ize|ising|izing)\b|\boverview\b|\brecap\b'
+    r'|\b(?:whole|entire|full|all of the) (?:sheet|workbook|dataset|data|table)\b'
+    r'|\bdescribe (?:the|this) (?:sheet|workbook|data|table)\b',
+    re.I
+)
+
+# Rows a block keeps at the least; narrower column groups are used before going below it
+MIN_BLOCK_ROWS = 20
+# Rows rendered to estimate the tokens a row costs
+SAMPLE_ROWS = 200
+
+MAP_PROMPT = (
+    "You summarize one block of rows from a larger spreadsheet. Other blocks are summarized "
+    "separately and the summaries are combined later, so describe only this block. Give the "
+    "row span, totals and ranges of the numeric columns, trends, and rows that stand out, "
+    "citing cells as A1 references. Use plain sentences and stay under 120 words."
+)
+REDUCE_PROMPT = (
+    "You combine summaries of consecutive blocks of one spreadsheet into a single summary "
+    "of all of them. Keep figures, trends and cell references, and stay under 200 words."
+)
+
+class SummaryManager:
+    """
+    Map-reduce answers for requests about a whole sheet too large for one
+    prompt. The snapshot is cut into blocks of rows, and of columns on wide
+    sheets, each within a token budget. Blocks are summarized concurrently
+    and each summary is cached by the block's content, so a later request
+    only pays for the blocks that changed. The summaries are then reduced,
+    level by level if needed, into the final answer.
+    """
+
+    def __init__(self, ai_manager: "AIManager", block_tokens: int = 3000, max_concurrency: int = 4,
+                 reduce_tokens: int = 6000):
+        self.ai_manager = ai_manager
+        self.block_tokens = block_tokens
+        # Blocks in flight for one request; the rate limiter still bounds the server
+        self.max_concurrency = max_concurrency
+        self.reduce_tokens = reduce_tokens
+
+    def wants_summary(self, message: str, excel_context: Optional[Dict]) -> bool:
+        """Whole-sheet requests on sheets whose rows do not fit the regular prompt"""
+        if not SUMMARY_PATTERN.search(message) or not self.ai_manager._has_data(excel_context):
+            return False
+        table = excel_context["table"]
+        return sum(self._row_tokens(table)) * table.row_count > self.ai_manager.context_builder.token_budget
+
+    async def summarize(self, message: str, excel_context: Dict[str, Any],
+                        session: Optional[ConversationSession] = None, use_cache: bool = True,
+                        stream: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield progress frames while blocks are summarized, delta frames of the
+        answer when streaming, then the final response
+        """
+        table = excel_context["table"]
+        # Rendering tens of thousands of rows stays off the event loop
+        with span("summary_split"):
+            blocks = await asyncio.to_thread(self.split, table)
+        total = len(blocks)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        summaries: List[str] = [""] * total
+        cached = 0
+
+        async def summarize_block(i: int):
+            nonlocal cached
+            async with semaphore:
+                summary, hit = await self._complete(MAP_PROMPT, blocks[i][1], session, use_cache, "summary_map")
+            summaries[i] = f"{blocks[i][0]}: {summary}"
+            cached += hit
+
+        if total > 1:
+            async for frame in self._fan_out("map", [summarize_block(i) for i in range(total)]):
+                yield frame
+
+        # Reduce in groups until the summaries fit one prompt
+        level = summaries
+        while len(level) > 1 and estimate_tokens("\n".join(level)) > self.reduce_tokens:
+            groups = self._group(level)
+            level = [""] * len(groups)
+
+            async def reduce_group(i: int, group: List[str]):
+                async with semaphore:
+                    level[i], _ = await self._complete(REDUCE_PROMPT, "\n\n".join(group), session,
+                                                       use_cache, "summary_reduce")
+
+            async for frame in self._fan_out("reduce", [reduce_group(i, group) for i, group in enumerate(groups)]):
+                yield frame
+
+        # A single block fits one prompt, so the answer reads its rows directly
+        messages = self._final_messages(message, excel_context, level, session,
+                                        rows=blocks[0][1] if total == 1 else None)
+        answer = None
+        cache_key = self.ai_manager._cache_key(messages) if use_cache else None
+        if cache_key:
+            answer = await self.ai_manager.cache.get(cache_key)
+        if answer is None:
+            chunks = []
+            async for chunk in self._answer(messages, session, stream):
+                chunks.append(chunk)
+                if stream:
+                    yield {"type": "delta", "content": chunk}
+            answer = "".join(chunks)
+            if cache_key and answer:
+                await self.ai_manager.cache.set(cache_key, answer)
+        elif stream:
+            yield {"type": "delta", "content": answer}
+
+        yield {
+            "type": "message",
+            "content": answer,
+            "summary": {"rows": table.row_count, "blocks": total, "cached_blocks": cached}
+        }
+
+    @staticmethod
+    async def _fan_out(stage: str, jobs: List[Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Run jobs concurrently, yielding a progress frame as each finishes"""
+        yield {"type": "progress", "stage": stage, "done": 0, "total": len(jobs)}
+        tasks = [asyncio.create_task(job) for job in jobs]
+        try:
+            for done, task in enumerate(asyncio.as_completed(tasks), 1):
+                await task
+                yield {"type": "progress", "stage": stage, "done": done, "total": len(tasks)}
+        finally:
+            # A cancelled request or a failed job stops the rest
+            for task in tasks:
+                task.cancel()
+
+    def split(self, table: ColumnarSheet) -> List[Tuple[str, str]]:
+        """(range, text) of each block, rows in sheet order and column groups side by side"""
+        values = [column.to_list() for column in table.columns]
+        costs = self._row_tokens(table)
+        first_row = table.data_start_row
+        blocks = []
+        for group in self._column_groups(table, costs):
+            # The row number leads each line
+            row_tokens = sum(costs[c] for c in group) + 2
+            rows_per_block = max(1, int(self.block_tokens // row_tokens))
+            header = "Row\t" + "\t".join(f"{table.headers[c]} ({table.column_letters[c]})" for c in group) + "\n"
+            for start in range(0, table.row_count, rows_per_block):
+                end = min(start + rows_per_block, table.row_count)
+                lines = [
+                    f"{first_row + r + 1}\t" + "\t".join(self._cell(values[c][r]) for c in group) + "\n"
+                    for r in range(start, end)
+                ]
+                address = format_range(first_row + start, table.first_col + min(group),
+                                       first_row + end - 1, table.first_col + max(group))
+                sheet = f"{table.sheet}!" if table.sheet else ""
+                blocks.append((f"{sheet}{address}", f"Block {sheet}{address}\n" + header + "".join(lines)))
+        return blocks
+
+    @staticmethod
+    def _cell(value: Any) -> str:
+        return "" if value is None or value != value else _format_value(value)
+
+    def _row_tokens(self, table: ColumnarSheet) -> List[float]:
+        """Estimated tokens each column adds to a rendered row, from evenly spaced sample rows"""
+        sample = range(0, table.row_count, max(1, table.row_count // SAMPLE_ROWS))
+        return [
+            sum(len(self._cell(column.get(r))) + 1 for r in sample) / (4 * len(sample) or 1)
+            for column in table.columns
+        ]
+
+    def _column_groups(self, table: ColumnarSheet, costs: List[float]) -> List[List[int]]:
+        """
+        All columns together when MIN_BLOCK_ROWS rows fit a block; otherwise
+        groups that do, each repeating the label column so rows stay identifiable
+        """
+        per_row = self.block_tokens // MIN_BLOCK_ROWS
+        if sum(costs) <= per_row:
+            return [list(range(table.column_count))]
+        label = 0 if table.columns and table.columns[0].kind == "text" else None
+        groups, group, used = [], [], 0
+        for c in range(table.column_count):
+            if c == label:
+                continue
+            if group and used + costs[c] > per_row:
+                groups.append(group)
+                group, used = [], 0
+            if not group and label is not None:
+                group, used = [label], costs[label]
+            group.append(c)
+            used += costs[c]
+        if group:
+            groups.append(group)
+        return groups
+
+    def _group(self, summaries: List[str]) -> List[List[str]]:
+        """Consecutive summaries batched under the reduce budget, at least two per batch"""
+        groups, group, used = [], [], 0
+        for summary in summaries:
+            cost = estimate_tokens(summary)
+            if len(group) >= 2 and used + cost > self.reduce_tokens:
+                groups.append(group)
+                group, used = [], 0
+            group.append(summary)
+            used += cost
+        if group:
+            groups.append(group)
+        return groups
+
+    async def _complete(self, system: str, text: str, session: Optional[ConversationSession],
+                        use_cache: bool, stage: str) -> Tuple[str, bool]:
+        """Summary of one block or batch, and whether it came from the cache"""
+        ai = self.ai_manager
+        cache_key = ai.cache.make_key(ai.model, system, text) if ai.cache else None
+        # Bypassing the cache still refreshes it
+        cached = await ai.cache.get(cache_key) if cache_key and use_cache else None
+        if cached is not None:
+            blocks_total.inc(cached="true")
+            return cached, True
+
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": text}]
+        async with ai.limiter.acquire(ai._owner(session), ai._request_cost(messages)) as lease:
+            with span(stage):
+                response = await ai._create_completion(messages)
+            if response.usage and response.usage.total_tokens:
+                lease.charge(response.usage.total_tokens)
+        summary = (response.choices[0].message.content or "").strip()
+        ai._record_usage(messages, summary, response.usage)
+        blocks_total.inc(cached="false")
+        if cache_key and summary:
+            await ai.cache.set(cache_key, summary)
+        return summary, False
+
+    def _final_messages(self, message: str, excel_context: Dict[str, Any], summaries: List[str],
+                        session: Optional[ConversationSession], rows: Optional[str] = None) -> List[Dict[str, str]]:
+        """The regular prompt, with the block summaries, or the one block's rows, standing in for the rows"""
+        ai = self.ai_manager
+        profile = ai.context_builder.get_profile(excel_context)
+        analysis = ai.analysis_engine.analyze(profile, ai.context_builder.profile_key(excel_context), message)
+        prompt = ai._construct_user_prompt(message, excel_context, analysis)
+        if rows is not None:
+            prompt += "- Every row of the sheet:\n" + rows + "\n"
+        else:
+            prompt += "- Summaries of the sheet in blocks, together covering every row:\n"
+            prompt += "\n".join(f"  {summary}" for summary in summaries) + "\n"
+        history = session.history_messages() if session else []
+        return [{"role": "system", "content": ai._get_system_prompt()}, *history, {"role": "user", "content": prompt}]
+
+    async def _answer(self, messages: List[Dict[str, str]], session: Optional[ConversationSession],
+                      stream: bool) -> AsyncIterator[str]:
+        """Text of the final answer, in chunks as they arrive when streaming"""
+        ai = self.ai_manager
+        async with ai.limiter.acquire(ai._owner(session), ai._request_cost(messages)) as lease:
+            with span("summary_answer"):
+                if not stream:
+                    response = await ai._create_completion(messages)
+                    if response.usage and response.usage.total_tokens:
+                        lease.charge(response.usage.total_tokens)
+                    reply = response.choices[0].message.content or ""
+                    ai._record_usage(messages, reply, response.usage)
+                    yield reply
+                    return
+                chunks = []
+                async for chunk in await ai._create_completion(messages, stream=True):
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                ai._record_usage(messages, "".join(chunks))
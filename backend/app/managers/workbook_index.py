@@ -0,0 +1,169 @@
+from typing import Dict, List, Any, Optional, Tuple
+from collections import OrderedDict
+from .excel_backends import ExcelBackend
+from ..columnar import ColumnarSheet
+from .context_builder import message_phrases
+from ..addressing import parse_range, format_range
+import time
+import re
+
+# References into a named sheet, such as WACC!B5 or 'Cost Model'!C2:D9
+SHEET_REFERENCE_PATTERN = re.compile(
+    r"(?:'([^']+)'|([A-Za-z0-9_.&]+))!(\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?)"
+)
+
+class SheetEntry:
+    """Used range, header row and row labels of one sheet, without its body"""
+
+    def __init__(self, name: str, address: str, headers: List[str], labels: Dict[str, Tuple[int, int]]):
+        self.name = name
+        self.address = address
+        self.headers = headers
+        # Lowercase label to the zero-based (row, column) of its cell
+        self.labels = labels
+
+class WorkbookIndex:
+    """
+    Names, used ranges, header rows and row labels of every sheet. Only the
+    header row and the first label columns of a sheet are read, and an entry
+    is reused for as long as its sheet's used range is unchanged.
+    """
+
+    def __init__(self, max_label_rows: int = 500, label_columns: int = 2, refresh_interval: float = 5.0):
+        self.max_label_rows = max_label_rows
+        self.label_columns = label_columns
+        self.refresh_interval = refresh_interval
+        self.refreshed = 0.0
+        self.workbook: Optional[str] = None
+        self.sheets: Dict[str, SheetEntry] = {}
+        self.labels: Dict[str, List[Tuple[str, int, int]]] = {}
+
+    def refresh(self, backend: ExcelBackend) -> List[str]:
+        """Re-read changed sheets; returns the names of sheets that changed or disappeared"""
+        workbook = backend.workbook_name()
+        if workbook != self.workbook:
+            self.workbook, self.sheets = workbook, {}
+        elif time.monotonic() - self.refreshed < self.refresh_interval:
+            # Checking every tab costs a round-trip each, so recent indexes are reused
+            return []
+
+        sheets = {}
+        for name in backend.sheet_names():
+            address = backend.used_range_address(name)
+            entry = self.sheets.get(name)
+            if entry is None or entry.address != address:
+                entry = self._read_entry(backend, name, address)
+            sheets[name] = entry
+
+        changed = [name for name, entry in self.sheets.items() if sheets.get(name) is not entry]
+        self.sheets = sheets
+        self.refreshed = time.monotonic()
+        self.labels = {}
+        for entry in sheets.values():
+            for label, (row, column) in entry.labels.items():
+                self.labels.setdefault(label, []).append((entry.name, row, column))
+        return changed
+
+    def _read_entry(self, backend: ExcelBackend, name: str, address: str) -> SheetEntry:
+        first_row, first_col, last_row, last_col = parse_range(address)
+        header = backend.get_values(format_range(first_row, first_col, first_row, last_col), name)[0]
+        headers = [str(h) if h not in (None, "") else "" for h in header]
+
+        labels = {}
+        label_rows = backend.get_values(format_range(
+            first_row, first_col,
+            min(last_row, first_row + self.max_label_rows - 1), min(last_col, first_col + self.label_columns - 1)
+        ), name)
+        for r, row in enumerate(label_rows):
+            for c, value in enumerate(row):
+                if isinstance(value, str) and len(value.strip()) >= 3:
+                    labels.setdefault(value.strip().lower(), (first_row + r, first_col + c))
+        return SheetEntry(name, address, headers, labels)
+
+    def lookup(self, message: str, exclude: Optional[str] = None,
+               max_sheets: int = 3, max_row_cells: int = 12) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Sheets a message refers to, with (range, label) pairs to quote from
+        each. A sheet named without any cell maps to an empty list.
+        """
+        phrases = message_phrases(message)
+        by_name = {name.lower(): name for name in self.sheets}
+        refs: Dict[str, List[Tuple[str, str]]] = {}
+
+        for match in SHEET_REFERENCE_PATTERN.finditer(message):
+            name = by_name.get((match.group(1) or match.group(2)).lower())
+            if name and name != exclude:
+                refs.setdefault(name, []).append((match.group(3).upper().replace("$", ""), ""))
+
+        # A row label quotes the cells to its right
+        for label in sorted(phrases & self.labels.keys()):
+            for name, row, column in self.labels[label]:
+                if name == exclude:
+                    continue
+                _, _, _, last_col = parse_range(self.sheets[name].address)
+                last = min(last_col, column + max_row_cells)
+                if last > column:
+                    refs.setdefault(name, []).append((format_range(row, column + 1, row, last), label))
+
+        for lower, name in sorted(by_name.items()):
+            if lower in phrases and name != exclude:
+                refs.setdefault(name, [])
+
+        return dict(list(refs.items())[:max_sheets])
+
+    def expire(self):
+        """Check every sheet again on the next refresh"""
+        self.refreshed = 0.0
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Name, used range and headers of every sheet"""
+        return [
+            {"name": entry.name, "address": entry.address, "headers": [h for h in entry.headers if h]}
+            for entry in self.sheets.values()
+        ]
+
+class SheetStore:
+    """
+    Bodies of non-active sheets, loaded on first use and bounded by total
+    cell count. The least recently used sheets are evicted first.
+    """
+
+    def __init__(self, max_cells: int = 1_000_000, max_age: float = 30.0):
+        self.max_cells = max_cells
+        self.max_age = max_age
+        self._sheets: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.cells = 0
+
+    def get(self, name: str, address: str) -> Optional[Dict[str, Any]]:
+        entry = self._sheets.get(name)
+        if entry is None or entry["address"] != address or time.monotonic() - entry["loaded"] > self.max_age:
+            return None
+        self._sheets.move_to_end(name)
+        return entry
+
+    def put(self, name: str, address: str, values: Any) -> Dict[str, Any]:
+        self.discard(name)
+        table = ColumnarSheet.from_rows(values, address, name)
+        entry = {
+            "address": address,
+            "table": table,
+            "loaded": time.monotonic(),
+            "cells": table.cell_count + table.column_count,
+            "context": None
+        }
+        self._sheets[name] = entry
+        self.cells += entry["cells"]
+        # Always keep the sheet just loaded, even when it alone exceeds the bound
+        while self.cells > self.max_cells and len(self._sheets) > 1:
+            _, evicted = self._sheets.popitem(last=False)
+            self.cells -= evicted["cells"]
+        return entry
+
+    def discard(self, name: str):
+        entry = self._sheets.pop(name, None)
+        if entry:
+            self.cells -= entry["cells"]
+
+    def clear(self):
+        self._sheets.clear()
+        self.cells = 0
@@ -0,0 +1,212 @@
+from typing import Dict, List, Any, Optional, Tuple
+from .addressing import split_sheet, parse_range, format_cell, format_range
+import json
+
+# Number formats the edit tool can apply, by the name the model uses
+NUMBER_FORMATS = {
+    "CURRENCY": "$#,##0.00",
+    "PERCENTAGE": "0.00%",
+    "NUMBER": "#,##0.00",
+    "DATE": "mm/dd/yyyy"
+}
+
+# Excel's grid limits
+MAX_ROWS = 1_048_576
+MAX_COLUMNS = 16_384
+
+# Largest range one update or clear may expand to, in cells
+MAX_OPERATION_CELLS = 10_000
+
+EDIT_TOOL_NAME = "edit_sheet"
+
+# Offered to the model on edit requests; its arguments are the only way
+# changes reach the sheet, so reply text is never parsed for commands
+EDIT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": EDIT_TOOL_NAME,
+        "description": (
+            "Change cells of the active sheet. Operations run in order, except that "
+            "inserts run first, so address later operations against the sheet after "
+            "the inserts. Use A1 references such as B2, AA10 or C2:F20."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "operations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "op": {"type": "string", "enum": ["update", "format", "insert", "clear"]},
+                            "range": {"type": "string", "description": "Cell or range in A1 notation"},
+                            "value": {
+                                "type": ["string", "number", "boolean", "null"],
+                                "description": "update: value written to every cell; formulas start with ="
+                            },
+                            "values": {
+                                "type": "array",
+                                "items": {"type": "array", "items": {"type": ["string", "number", "boolean", "null"]}},
+                                "description": "update: rows of values matching the range shape"
+                            },
+                            "format": {"type": "string", "enum": list(NUMBER_FORMATS)},
+                            "shift": {
+                                "type": "string", "enum": ["down", "right"],
+                                "description": "insert: where existing cells move, down by default"
+                            }
+                        },
+                        "required": ["op", "range"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["operations"],
+            "additionalProperties": False
+        }
+    }
+}
+
+class OperationError(ValueError):
+    """A tool call that cannot be applied to the sheet"""
+
+def parse_tool_call(name: str, arguments: str) -> List[Dict[str, Any]]:
+    """Decode one edit_sheet call into its raw operations"""
+    if name != EDIT_TOOL_NAME:
+        raise OperationError(f"Unknown tool: {name}")
+    try:
+        payload = json.loads(arguments or "{}")
+    except json.JSONDecodeError as e:
+        raise OperationError(f"Malformed {name} arguments: {e}")
+    operations = payload.get("operations") if isinstance(payload, dict) else None
+    if not isinstance(operations, list):
+        raise OperationError(f"{name} needs a list of operations")
+    return operations
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+def _check_formula(value: Any):
+    """Catch formulas Excel would refuse outright; evaluation is left to Excel"""
+    if not isinstance(value, str) or not value.startswith("="):
+        return
+    depth, quoted = 0, False
+    for char in value:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+            if depth < 0:
+                break
+    if depth != 0 or quoted or len(value) < 2:
+        raise OperationError(f"Malformed formula: {value}")
+
+def _used_bounds(context: Optional[Dict[str, Any]]) -> Optional[Tuple[int, int, int, int]]:
+    address = (context or {}).get("address")
+    if not address:
+        return None
+    try:
+        return parse_range(address)
+    except ValueError:
+        return None
+
+def _validate(operation: Any, context: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Updates for one operation, in the shape ExcelManager.apply_batch takes"""
+    if not isinstance(operation, dict):
+        raise OperationError("Each operation must be an object")
+    op, address = operation.get("op"), operation.get("range")
+    if op not in ("update", "format", "insert", "clear"):
+        raise OperationError(f"Unsupported operation: {op}")
+    if not isinstance(address, str) or not address.strip():
+        raise OperationError(f"{op} needs a range")
+
+    sheet, range_ = split_sheet(address.strip())
+    active_sheet = (context or {}).get("sheet")
+    if sheet and active_sheet and sheet != active_sheet:
+        raise OperationError(f"{address} is on {sheet}; only {active_sheet} can be edited")
+    try:
+        first_row, first_col, last_row, last_col = parse_range(range_)
+    except ValueError as e:
+        raise OperationError(str(e))
+    if first_row < 0 or first_col < 0 or last_row >= MAX_ROWS or last_col >= MAX_COLUMNS:
+        raise OperationError(f"{range_} is outside the sheet")
+    rows, columns = last_row - first_row + 1, last_col - first_col + 1
+    target = format_range(first_row, first_col, last_row, last_col)
+
+    if op == "update":
+        # Checked before anything is built from the range, which the model chooses
+        if rows * columns > MAX_OPERATION_CELLS:
+            raise OperationError(f"update of {target} covers more than {MAX_OPERATION_CELLS} cells")
+        if "values" in operation:
+            grid = operation["values"]
+            if (not isinstance(grid, list) or len(grid) != rows
+                    or any(not isinstance(row, list) or len(row) != columns for row in grid)):
+                raise OperationError(f"values for {target} must be {rows} row(s) of {columns} value(s)")
+            value_at = lambda r, c: grid[r][c]
+        elif "value" in operation:
+            value = operation["value"]
+            value_at = lambda r, c: value
+        else:
+            raise OperationError(f"update of {target} needs a value")
+        updates = []
+        for r in range(rows):
+            for c in range(columns):
+                cell_value = value_at(r, c)
+                if not _is_scalar(cell_value):
+                    raise OperationError(f"Unsupported value for {format_cell(first_row + r, first_col + c)}")
+                _check_formula(cell_value)
+                updates.append({"type": "update", "cell": format_cell(first_row + r, first_col + c), "value": cell_value})
+        return updates
+
+    if op == "format":
+        number_format = str(operation.get("format") or "").upper()
+        if number_format not in NUMBER_FORMATS:
+            raise OperationError(f"Unsupported format for {target}: {operation.get('format')}")
+        return [{"type": "format", "range": target, "format": number_format}]
+
+    if op == "clear":
+        used = _used_bounds(context)
+        if used is not None:
+            # Cells outside the used range are already empty
+            first_row, first_col = max(first_row, used[0]), max(first_col, used[1])
+            last_row, last_col = min(last_row, used[2]), min(last_col, used[3])
+            if first_row > last_row or first_col > last_col:
+                return []
+        if (last_row - first_row + 1) * (last_col - first_col + 1) > MAX_OPERATION_CELLS:
+            raise OperationError(f"clear of {target} covers more than {MAX_OPERATION_CELLS} cells")
+        return [{"type": "clear", "range": format_range(first_row, first_col, last_row, last_col)}]
+
+    shift = operation.get("shift") or "down"
+    if shift not in ("down", "right"):
+        raise OperationError(f"insert shift must be down or right, not {shift}")
+    used = _used_bounds(context)
+    if used is not None and (
+        (shift == "down" and used[2] + rows >= MAX_ROWS) or (shift == "right" and used[3] + columns >= MAX_COLUMNS)
+    ):
+        raise OperationError(f"Inserting {target} would push cells off the sheet")
+    return [{"type": "insert", "range": target, "shift": shift}]
+
+def validate_operations(operations: List[Any], context: Optional[Dict[str, Any]] = None
+                        ) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Check operations against the sheet snapshot and expand them into updates.
+    Returns (updates, errors); the batch should be applied only without errors.
+    """
+    updates, errors = [], []
+    for i, operation in enumerate(operations):
+        try:
+            updates.extend(_validate(operation, context))
+        except OperationError as e:
+            errors.append(f"Operation {i + 1}: {e}")
+    return updates, errors
+
+def describe_operation(update: Dict[str, Any]) -> str:
+    """One-line summary of an update, as listed in excel_update replies"""
+    if update["type"] == "update":
+        return f"UPDATE {update['cell']} TO {update['value']}"
+    if update["type"] == "format":
+        return f"FORMAT {update['range']} AS {update['format']}"
+    if update["type"] == "insert":
+        return f"INSERT {update['range']} SHIFT {update['shift'].upper()}"
+    return f"CLEAR {update['range']}"
@@ -0,0 +1,96 @@
+from typing import Dict, List, Any, Union
+import json
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Binary frames are optional; every client can fall back to JSON
+    msgpack = None
+
+JSON_SUBPROTOCOL = "fintelligent.json"
+MSGPACK_SUBPROTOCOL = "fintelligent.msgpack"
+
+# Frame keys holding grids (lists of rows) whose numeric columns are packed
+GRID_KEYS = {"values"}
+GRID_MARKER = "$grid"
+
+def _is_number(value: Any) -> bool:
+    return type(value) in (int, float)
+
+def pack_grid(rows: List[List[Any]]) -> Dict[str, Any]:
+    """
+    Column-wise grid for binary frames: numeric columns become little-endian
+    float64 bytes with NaN for blanks, other columns stay as value lists
+    """
+    width = max((len(row) for row in rows), default=0)
+    padded = [row if len(row) == width else list(row) + [None] * (width - len(row)) for row in rows]
+    columns = []
+    for column in zip(*padded):
+        if all(_is_number(v) or v is None for v in column):
+            array = np.fromiter((np.nan if v is None else v for v in column), dtype="<f8", count=len(column))
+            columns.append(array.tobytes())
+        else:
+            columns.append(list(column))
+    return {GRID_MARKER: {"rows": len(rows), "columns": columns}}
+
+def unpack_grid(packed: Dict[str, Any]) -> List[List[Any]]:
+    columns = [
+        [None if v != v else v for v in np.frombuffer(column, dtype="<f8").tolist()] if isinstance(column, bytes) else column
+        for column in packed["columns"]
+    ]
+    if not columns:
+        return [[] for _ in range(packed["rows"])]
+    return [list(row) for row in zip(*columns)]
+
+def _is_grid(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(row, list) for row in value)
+
+def _pack_frame(value: Any) -> Any:
+    """Replace grids nested anywhere in dicts with their packed form"""
+    if isinstance(value, dict):
+        return {
+            k: pack_grid(v) if k in GRID_KEYS and _is_grid(v) else _pack_frame(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [_pack_frame(v) for v in value]
+    return value
+
+def _unpack_object(obj: Dict[str, Any]) -> Any:
+    return unpack_grid(obj[GRID_MARKER]) if GRID_MARKER in obj and len(obj) == 1 else obj
+
+class JsonCodec:
+    """The original protocol: one JSON text frame per message"""
+
+    subprotocol = JSON_SUBPROTOCOL
+    binary = False
+
+    def encode(self, frame: Dict[str, Any]) -> str:
+        return json.dumps(frame)
+
+    def decode(self, data: Union[str, bytes]) -> Dict[str, Any]:
+        return json.loads(data)
+
+class MsgpackCodec:
+    """MessagePack binary frames with numeric grid columns carried as packed float64 arrays"""
+
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    def encode(self, frame: Dict[str, Any]) -> bytes:
+        return msgpack.packb(_pack_frame(frame), use_bin_type=True)
+
+    def decode(self, data: Union[str, bytes]) -> Dict[str, Any]:
+        # Text frames are always JSON, whatever was negotiated
+        if isinstance(data, str):
+            return json.loads(data)
+        return msgpack.unpackb(data, raw=False, object_hook=_unpack_object)
+
+def negotiate(offered: List[str]):
+    """Pick the first subprotocol the client offered that this server supports"""
+    for subprotocol in offered:
+        if subprotocol == MSGPACK_SUBPROTOCOL and msgpack is not None:
+            return MsgpackCodec()
+        if subprotocol == JSON_SUBPROTOCOL:
+            return JsonCodec()
+    return JsonCodec()
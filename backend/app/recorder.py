@@ -0,0 +1,39 @@
+from typing import Dict, Any, Optional
+import json
+import os
+import time
+
+class Recording:
+    """
+    One connection's frames as JSON lines of {"t", "dir", "frame"}, where t is
+    seconds since the connection opened and dir is "in" or "out"
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._started = time.monotonic()
+
+    def write(self, direction: str, frame: Dict[str, Any]):
+        record = {"t": round(time.monotonic() - self._started, 4), "dir": direction, "frame": frame}
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class SessionRecorder:
+    """Writes one recording per connection into a directory, for offline replay"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, session_id: str) -> Recording:
+        return Recording(os.path.join(self.directory, f"{session_id}-{int(time.time())}.jsonl"))
+
+def load_recording(path: str, direction: Optional[str] = None) -> list:
+    """Records of a recording file, optionally only one direction"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if direction is None or r["dir"] == direction]
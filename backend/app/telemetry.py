@@ -0,0 +1,261 @@
+from typing import Dict, List, Any, Optional, Callable, Iterable, Tuple
+from bisect import bisect_left
+from collections import Counter as FrameCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger("fintelligent.trace")
+
+# Seconds; covers a cache hit through a long completion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per 1K prompt and completion tokens, matched by model name prefix, longest first
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+def configure_logging(level: str = "INFO"):
+    """
+    Route log records to stderr. The level applies to the backend's own
+    loggers, where records below it cost one comparison; libraries stay at
+    WARNING.
+    """
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    for name in ("app", "fintelligent"):
+        logging.getLogger(name).setLevel(getattr(logging, level.upper(), logging.INFO))
+
+def _label_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_label_text(key)} {value}" for key, value in sorted(self.values.items()))
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus text format"""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # Per label set: bucket counts, sum, count
+        self.series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items())) if len(labels) > 1 else tuple(labels.items())
+        # Counts are kept per bucket and made cumulative when rendered
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_text(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Metrics kept in-process, plus collectors that report gauges when scraped"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self.collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]):
+        """Add a callable returning {metric name: value} gauges read at scrape time"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, value in collector().items():
+                if value is not None:
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("fintelligent_stage_seconds", "Time spent in each request stage")
+request_seconds = metrics.histogram("fintelligent_request_seconds", "End-to-end time per client frame")
+requests_total = metrics.counter("fintelligent_requests_total", "Client frames handled by type and outcome")
+tokens_total = metrics.counter("fintelligent_tokens_total", "Completion tokens by model and kind")
+cost_total = metrics.counter("fintelligent_cost_usd_total", "Estimated completion cost in USD by model")
+
+class RequestTrace:
+    """Spans and usage recorded while handling one client frame"""
+
+    def __init__(self, request_id: str, kind: str):
+        self.request_id = request_id
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.tokens = 0
+        self.cost = 0.0
+        self.outcome = "ok"
+
+    def summary(self) -> Dict[str, Any]:
+        stages: Dict[str, float] = {}
+        for stage, seconds in self.spans:
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        return {
+            "request_id": self.request_id,
+            "type": self.kind,
+            "outcome": self.outcome,
+            "ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": {stage: round(seconds * 1000, 1) for stage, seconds in stages.items()},
+            "tokens": self.tokens,
+            "cost_usd": round(self.cost, 6)
+        }
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("fintelligent_trace", default=None)
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+@contextmanager
+def trace(request_id: str, kind: str):
+    """Scope spans to one client frame; logs a structured summary when it ends"""
+    request = RequestTrace(request_id, kind)
+    token = _current_trace.set(request)
+    try:
+        yield request
+    except BaseException:
+        request.outcome = "error"
+        raise
+    finally:
+        _current_trace.reset(token)
+        elapsed = time.perf_counter() - request.started
+        request_seconds.observe(elapsed, type=kind)
+        requests_total.inc(type=kind, outcome=request.outcome)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(request.summary()))
+
+@contextmanager
+def span(stage: str):
+    """Time a stage, tagged with the current request ID"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+def record_span(stage: str, elapsed: float):
+    """Record a stage timed elsewhere, such as the wait for a stream's first token"""
+    stage_seconds.observe(elapsed, stage=stage)
+    request = _current_trace.get()
+    if request is not None:
+        request.spans.append((stage, elapsed))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("span stage=%s request_id=%s ms=%.2f", stage,
+                     request.request_id if request else "-", elapsed * 1000)
+
+def model_price(model: str) -> Tuple[float, float]:
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    return (0.0, 0.0)
+
+def record_usage(model: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False):
+    """Count tokens and their cost against the model and the current request"""
+    prompt_price, completion_price = model_price(model)
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+    source = "estimated" if estimated else "reported"
+    tokens_total.inc(prompt_tokens, model=model, kind="prompt", source=source)
+    tokens_total.inc(completion_tokens, model=model, kind="completion", source=source)
+    cost_total.inc(cost, model=model)
+    request = _current_trace.get()
+    if request is not None:
+        request.tokens += prompt_tokens + completion_tokens
+        request.cost += cost
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack at a fixed interval from a background thread
+    and aggregates them as folded stacks, the input format of flame graph tools.
+    Nothing runs while it is stopped.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: FrameCounter = FrameCounter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._target: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, thread_id: Optional[int] = None):
+        """Start sampling the given thread, by default the calling one"""
+        if self.running:
+            return
+        self.samples.clear()
+        self._target = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and return the folded stacks, hottest first"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
@@ -0,0 +1,62 @@
+"""
+Workbook round-trips and apply time for AI-generated updates, one call per
+update versus the coalesced batch.
+
+Usage (from backend/):
+    python -m benchmarks.batch_apply_bench --updates 10 50 200 --call-latency 0.005
+"""
+import argparse
+import time
+
+from app.addressing import format_cell
+from app.managers.excel_backends import FakeWorkbookBackend
+from app.managers.excel_manager import ExcelManager
+
+class SlowBackend(FakeWorkbookBackend):
+    """Fake workbook that charges a fixed latency per call, like a COM round-trip"""
+
+    def __init__(self, latency: float):
+        super().__init__({"Sheet1": []})
+        self.latency = latency
+
+    def __getattribute__(self, name):
+        attr = super().__getattribute__(name)
+        if name in ("get_formulas", "get_number_format", "set_value", "set_number_format"):
+            time.sleep(super().__getattribute__("latency"))
+        return attr
+
+def make_updates(count: int):
+    # A column of values plus a total row, then currency formatting on the column
+    updates = [{"type": "update", "cell": format_cell(r, c), "value": r * 10 + c} for r in range(1, count // 4 + 1) for c in range(4)]
+    updates.append({"type": "format", "range": f"A2:A{count // 4 + 1}", "format": "CURRENCY"})
+    updates.append({"type": "format", "range": f"C2:C{count // 4 + 1}", "format": "CURRENCY"})
+    return updates
+
+def main(args):
+    print(f"{'updates':>8} {'per-update calls':>17} {'batch calls':>12} {'per-update ms':>14} {'batch ms':>9}")
+    for count in args.updates:
+        updates = make_updates(count)
+
+        backend = SlowBackend(args.call_latency)
+        manager = ExcelManager(backend)
+        start = time.perf_counter()
+        for update in updates:
+            if update["type"] == "update":
+                manager.update_cell(update["cell"], update["value"])
+            else:
+                manager.format_range(update["range"], update["format"])
+        single_ms = (time.perf_counter() - start) * 1000
+        single_calls = backend.calls
+
+        backend = SlowBackend(args.call_latency)
+        manager = ExcelManager(backend)
+        start = time.perf_counter()
+        manager.apply_batch(updates)
+        batch_ms = (time.perf_counter() - start) * 1000
+        print(f"{len(updates):>8} {single_calls:>17} {backend.calls:>12} {single_ms:>14.1f} {batch_ms:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--call-latency", type=float, default=0.005)
+    main(parser.parse_args())
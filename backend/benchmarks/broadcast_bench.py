@@ -0,0 +1,72 @@
+"""
+Broadcast fan-out with one stalled client, serial against concurrent sends,
+and the cost of handing a session and its sheet snapshot to another worker
+through the Redis store (against an in-process stand-in).
+
+Usage (from backend/):
+    python -m benchmarks.broadcast_bench --sockets 10 100 1000
+"""
+import argparse
+import asyncio
+import time
+
+from app.managers.connection_manager import ConnectionManager
+from app.managers.session_manager import ConversationSession
+from app.managers.state_store import RedisStateStore, FakeRedisClient
+
+class FakeSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(self.delay)
+
+async def serial_broadcast(connections, frame):
+    # The previous behaviour: one send after another, without a timeout
+    manager = ConnectionManager()
+    for connection in connections:
+        await manager.send(connection, frame)
+
+async def run(args):
+    frame = {"type": "message", "content": "Workbook updated"}
+    print(f"{'sockets':>8} {'serial ms':>10} {'concurrent ms':>14} {'failed':>7}")
+    for sockets in args.sockets:
+        # The stalled client is first, so serially everyone else waits on it
+        connections = [FakeSocket(args.stall)] + [FakeSocket(args.latency) for _ in range(sockets - 1)]
+        start = time.perf_counter()
+        await serial_broadcast(connections, frame)
+        serial_ms = (time.perf_counter() - start) * 1000
+
+        manager = ConnectionManager(broadcast_timeout=args.timeout)
+        manager.active_connections = connections
+        start = time.perf_counter()
+        failed = await manager.broadcast(frame)
+        concurrent_ms = (time.perf_counter() - start) * 1000
+        print(f"{sockets:>8} {serial_ms:>10.1f} {concurrent_ms:>14.1f} {len(failed):>7}")
+
+    store = RedisStateStore(FakeRedisClient())
+    session = ConversationSession(store=store)
+    for i in range(20):
+        session.add_turn(f"Question {i} about revenue", f"Answer {i} " * 40)
+    rows = [["Region", "Month", "Revenue"]] + [[f"R{r % 12}", r % 12 + 1, r * 1.5] for r in range(args.rows)]
+    await session.snapshots.sync({"sheet": "Data", "address": f"A1:C{len(rows)}", "values": rows, "version": 1})
+
+    start = time.perf_counter()
+    await session.save()
+    save_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    resumed = ConversationSession(session_id=session.session_id, store=store)
+    await resumed.restore()
+    context = await resumed.snapshots.load_context()
+    restore_ms = (time.perf_counter() - start) * 1000
+    print(f"\nsession handoff with a {args.rows}-row snapshot: save {save_ms:.2f} ms, "
+          f"restore {restore_ms:.2f} ms, {context['row_count']} rows resumed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sockets", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds each healthy send takes")
+    parser.add_argument("--stall", type=float, default=2.0, help="Seconds the stalled client takes")
+    parser.add_argument("--timeout", type=float, default=0.5, help="Per-socket send timeout")
+    parser.add_argument("--rows", type=int, default=50000)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Payload size and encode/decode time of WebSocket frames: the JSON text path
+against MessagePack with packed numeric grids, each with and without the
+deflate compression permessage-deflate applies on the wire.
+
+Usage (from backend/):
+    python -m benchmarks.codec_bench --rows 1000 10000 50000 --columns 10
+"""
+import argparse
+import random
+import time
+import zlib
+
+from app.addressing import format_range
+from app.protocol import JsonCodec, MsgpackCodec, msgpack
+
+def make_sync_frame(rows: int, columns: int):
+    header = ["Account"] + [f"FY{2000 + c}" for c in range(columns - 1)]
+    grid = [header] + [
+        [f"Account {r % 200}"] + [round(random.random() * 100000, 2) for _ in range(columns - 1)]
+        for r in range(rows - 1)
+    ]
+    return {
+        "type": "excel_sync",
+        "content": {"sheet": "Sheet1", "address": format_range(0, 0, rows - 1, columns - 1),
+                    "version": 1, "full": True, "values": grid}
+    }
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def deflate(data) -> bytes:
+    # permessage-deflate runs raw deflate over each message
+    compressor = zlib.compressobj(wbits=-15)
+    return compressor.compress(data.encode() if isinstance(data, str) else data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def main(args):
+    codecs = [("json", JsonCodec())]
+    if msgpack is not None:
+        codecs.append(("msgpack", MsgpackCodec()))
+    else:
+        print("msgpack is not installed, only the JSON path is measured")
+
+    print(f"{'rows':>7} {'codec':>8} {'bytes':>11} {'deflated':>10} {'encode ms':>10} {'decode ms':>10} {'deflate ms':>11}")
+    for rows in args.rows:
+        frame = make_sync_frame(rows, args.columns)
+        for name, codec in codecs:
+            data = codec.encode(frame)
+            assert codec.decode(data)["content"]["values"][1][1] == frame["content"]["values"][1][1]
+            encode_ms = timed(lambda: codec.encode(frame), args.repeat)
+            decode_ms = timed(lambda: codec.decode(data), args.repeat)
+            deflate_ms = timed(lambda: deflate(data), args.repeat)
+            print(f"{rows:>7} {name:>8} {len(data):>11} {len(deflate(data)):>10} "
+                  f"{encode_ms:>10.2f} {decode_ms:>10.2f} {deflate_ms:>11.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
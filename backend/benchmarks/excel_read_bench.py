@@ -0,0 +1,59 @@
+"""
+Cost of reading sheet context per frame: a full rebuild versus the cached
+context served by ExcelManager.get_context, which reads values only when
+the workbook, sheet, used range or a change counter moves.
+
+Usage (from backend/):
+    python -m benchmarks.excel_read_bench --rows 1000 10000 50000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.managers.excel_backends import FakeWorkbookBackend
+from app.managers.excel_manager import ExcelManager
+
+def make_sheet(rows: int, columns: int):
+    header = [f"Column {c}" for c in range(columns)]
+    return [header] + [[round(random.random() * 1000, 2) for _ in range(columns)] for _ in range(rows - 1)]
+
+async def measure(rows: int, columns: int, repeat: int):
+    manager = ExcelManager(FakeWorkbookBackend({"Sheet1": make_sheet(rows, columns)}))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        manager.connect_to_excel()
+        manager.read_active_sheet()
+    full_ms = (time.perf_counter() - start) / repeat * 1000
+
+    await manager.get_context()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await manager.get_context()
+    handler_ms = (time.perf_counter() - start) / repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await manager.refresh()
+    refresh_ms = (time.perf_counter() - start) / repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        manager.mark_changed()
+        await manager.refresh()
+    changed_ms = (time.perf_counter() - start) / repeat * 1000
+    return full_ms, handler_ms, refresh_ms, changed_ms
+
+def main(args):
+    print(f"{'rows':>8} {'rebuild ms':>11} {'handler ms':>11} {'unchanged refresh ms':>21} {'signalled refresh ms':>21}")
+    for rows in args.rows:
+        full_ms, handler_ms, refresh_ms, changed_ms = asyncio.run(measure(rows, args.columns, args.repeat))
+        print(f"{rows:>8} {full_ms:>11.2f} {handler_ms:>11.3f} {refresh_ms:>21.2f} {changed_ms:>21.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
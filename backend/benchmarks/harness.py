@@ -0,0 +1,271 @@
+"""
+Offline harness for the whole /ws pipeline: a fake workbook stands in for
+Excel and a scripted stub stands in for the LLM, so runs need no network and
+no Excel and are reproducible.
+
+Reports request latency percentiles, throughput against concurrent sockets
+and memory per connection across sheet sizes, replays recorded sessions
+(captured with WS_RECORD_DIR), and exits non-zero when a result regresses
+past the tolerance against a stored baseline. Tail latencies (p95, p99) and
+replay latencies rest on a handful of samples, so they get a wider tolerance.
+
+Usage (from backend/):
+    python -m benchmarks.harness --sockets 1 4 16 --sizes 1000 10000 50000
+    python -m benchmarks.harness --replay benchmarks/recordings/*.jsonl
+    python -m benchmarks.harness --baseline benchmarks/baseline.json
+    python -m benchmarks.harness --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+import numpy as np
+
+from .stub_llm import StubLLMServer
+
+SCRIPT = [
+    {"match": "welcome message", "reply": "Welcome to Fintelligent. Ask me about any figure in this sheet."},
+    {"match": r"User request: .*\b(set|update|put)\b", "reply": "F2 now multiplies units by price.",
+     "tool_calls": [{"name": "edit_sheet", "arguments": {"operations": [{"op": "update", "range": "F2", "value": "=D2*E2"}]}}]},
+    {"match": ".", "reply": "Revenue grew 12% over the period, led by the North region. Would you like a monthly breakdown?"},
+]
+
+MESSAGES = [
+    "What is the total revenue?",
+    "Analyze revenue by region",
+    "Please update F2 with units times price",
+    "Which product sold the most units?",
+]
+
+def make_sheet(rows: int):
+    regions = ["North", "South", "East", "West"]
+    products = ["Widget", "Gadget", "Gizmo"]
+    grid = [["Date", "Region", "Product", "Units", "Price", "Revenue"]]
+    for r in range(rows):
+        units = 10 + r % 90
+        price = 5.0 + r % 7
+        grid.append([f"2024-{r % 12 + 1:02d}-{r % 28 + 1:02d}", regions[r % 4], products[r % 3], units, price, units * price])
+    return grid
+
+def sync_payload(grid):
+    last_column = chr(ord("A") + len(grid[0]) - 1)
+    return {"sheet": "Sheet1", "address": f"Sheet1!A1:{last_column}{len(grid)}", "values": grid, "version": 1, "full": True}
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2)}
+
+async def read_reply(ws, request_id: str):
+    """Read frames until the final reply to request_id"""
+    while True:
+        frame = json.loads(await ws.recv())
+        if frame.get("type") not in ("delta", "cancelled") and frame.get("request_id") == request_id:
+            return frame
+
+async def run_client(url: str, client: int, requests: int, grid, stream: bool):
+    import websockets
+
+    latencies = []
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.recv()  # welcome message
+        for i in range(requests):
+            request_id = f"c{client}-{i}"
+            frame = {"type": "message", "content": MESSAGES[i % len(MESSAGES)], "stream": stream,
+                     "no_cache": True, "request_id": request_id}
+            if i == 0:
+                frame["sync"] = sync_payload(grid)
+            start = time.perf_counter()
+            await ws.send(json.dumps(frame))
+            await read_reply(ws, request_id)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+async def measure_load(url: str, sockets: int, requests: int, grid, stream: bool):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_client(url, c, requests, grid, stream) for c in range(sockets)))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for result in results for latency in result]
+    return latencies, len(latencies) / elapsed
+
+async def measure_memory(url: str, rows: int, sockets: int) -> float:
+    """Traced bytes held per open connection after syncing a sheet of the given size"""
+    import websockets
+
+    payload = json.dumps({"type": "excel_sync", "content": sync_payload(make_sheet(rows))})
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    connections = []
+    for _ in range(sockets):
+        ws = await websockets.connect(url, max_size=None)
+        await ws.recv()
+        await ws.send(payload)
+        await ws.recv()  # sync acknowledgement
+        connections.append(ws)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for ws in connections:
+        await ws.close()
+    return held / sockets
+
+async def replay(url: str, path: str, speed: float):
+    """Send a recording's client frames with their original spacing; returns latencies and replies missed"""
+    import websockets
+    from app.recorder import load_recording
+
+    frames = load_recording(path, "in")
+    sent, latencies = {}, []
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.recv()
+
+        async def reader():
+            while True:
+                frame = json.loads(await ws.recv())
+                started = sent.pop(frame.get("request_id"), None)
+                if started is not None and frame.get("type") not in ("delta", "cancelled"):
+                    latencies.append(time.perf_counter() - started)
+                elif frame.get("type") == "cancelled":
+                    sent.pop(frame.get("request_id"), None)
+
+        reading = asyncio.create_task(reader())
+        start = time.perf_counter()
+        for i, record in enumerate(frames):
+            await asyncio.sleep(max(0.0, start + record["t"] / speed - time.perf_counter()))
+            frame = dict(record["frame"])
+            if frame.get("type") in ("message", "suggestion"):
+                frame.setdefault("request_id", f"replay-{i}")
+                sent[frame["request_id"]] = time.perf_counter()
+            await ws.send(json.dumps(frame))
+        deadline = time.perf_counter() + 30
+        while sent and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        reading.cancel()
+    return latencies, len(sent)
+
+def is_noisy(name: str) -> bool:
+    """Metrics drawn from a few samples: tail percentiles and the short replayed sessions"""
+    return "_p95_" in name or "_p99_" in name or name.startswith("replay_latency")
+
+def compare(results, baseline, tolerance: float, tail_tolerance: Optional[float] = None):
+    """Metrics worse than the baseline by more than the tolerance, or tail_tolerance for noisy ones"""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        allowed = tail_tolerance if tail_tolerance is not None and is_noisy(name) else tolerance
+        # Throughput is better higher, every other metric lower
+        worse = value < base * (1 - allowed) if name.startswith("throughput") else value > base * (1 + allowed)
+        if worse:
+            regressions.append(f"{name}: {value} against baseline {base}")
+    return regressions
+
+async def main(args):
+    import uvicorn
+
+    stub = StubLLMServer(latency=args.latency, script=SCRIPT).start()
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("AI_MAX_CONCURRENCY", str(max(args.sockets)))
+    # The background welcome call lands on whichever request is in flight, which made runs unrepeatable
+    os.environ.setdefault("PRECOMPUTE_WELCOME", "false")
+    if args.record:
+        os.environ["WS_RECORD_DIR"] = args.record
+
+    import app.main as server_module
+    from app.managers.excel_backends import FakeWorkbookBackend
+    from app.managers.excel_manager import ExcelManager
+
+    grid = make_sheet(args.rows)
+    # Handlers look the manager up at call time, so the fake workbook serves every request
+    server_module.excel_manager = ExcelManager(FakeWorkbookBackend({"Sheet1": [list(row) for row in grid]}))
+
+    server = uvicorn.Server(uvicorn.Config(server_module.app, host="127.0.0.1", port=args.port,
+                                           log_level="warning", ws_max_size=1 << 28))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    # Measure steady state; cold start is benchmarks.startup_bench's job
+    await server_module.ai_manager.warm_up()
+    url = f"ws://127.0.0.1:{args.port}/ws"
+    results = {}
+
+    print(f"LLM latency {args.latency}s, {args.requests} requests per socket, {args.rows}-row sheet")
+    print(f"{'sockets':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for sockets in args.sockets:
+        latencies, throughput = await measure_load(url, sockets, args.requests, grid, args.stream)
+        stats = percentiles(latencies)
+        print(f"{sockets:>8} {throughput:>8.1f} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}")
+        results[f"throughput_{sockets}_sockets"] = round(throughput, 2)
+        for name, value in stats.items():
+            results[f"latency_{name}_ms_{sockets}_sockets"] = value
+
+    if args.sizes:
+        print(f"\n{'rows':>8} {'KB per connection':>18}")
+        for rows in args.sizes:
+            per_connection = await measure_memory(url, rows, args.memory_sockets)
+            print(f"{rows:>8} {per_connection / 1024:>18.1f}")
+            results[f"memory_kb_per_connection_{rows}_rows"] = round(per_connection / 1024, 1)
+
+    if args.replay:
+        print(f"\n{'recording':<40} {'requests':>9} {'missed':>7} {'p50 ms':>9} {'p95 ms':>9}")
+        outcomes = await asyncio.gather(*(replay(url, path, args.speed) for path in args.replay))
+        all_latencies = []
+        for path, (latencies, missed) in zip(args.replay, outcomes):
+            stats = percentiles(latencies)
+            all_latencies.extend(latencies)
+            print(f"{os.path.basename(path):<40} {len(latencies) + missed:>9} {missed:>7} {stats['p50']:>9.1f} {stats['p95']:>9.1f}")
+        stats = percentiles(all_latencies)
+        results["replay_latency_p50_ms"] = stats["p50"]
+        results["replay_latency_p95_ms"] = stats["p95"]
+        results["replay_missed"] = sum(missed for _, missed in outcomes)
+
+    server.should_exit = True
+    await serve_task
+    stub.shutdown()
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.tail_tolerance)
+        limits = f"{args.tolerance:.0%} ({args.tail_tolerance:.0%} for tail and replay latencies)"
+        if regressions:
+            print(f"\nRegressions beyond {limits}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {limits} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub LLM latency in seconds")
+    parser.add_argument("--sockets", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50, help="Requests per socket")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows in the sheet behind the load runs")
+    parser.add_argument("--stream", action="store_true", help="Request streamed replies")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 50000],
+                        help="Sheet sizes for the memory runs")
+    parser.add_argument("--memory-sockets", type=int, default=8)
+    parser.add_argument("--replay", nargs="*", default=[], help="Recorded sessions to replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up factor")
+    parser.add_argument("--record", help="Record the harness's own sessions into this directory")
+    parser.add_argument("--baseline", help="Fail when results regress against this file")
+    parser.add_argument("--save-baseline", help="Write the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--tail-tolerance", type=float, default=1.0, help="Tolerance for tail and replay latencies")
+    parser.add_argument("--port", type=int, default=8767)
+    sys.exit(asyncio.run(main(parser.parse_args())))
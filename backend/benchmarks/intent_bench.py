@@ -0,0 +1,73 @@
+"""
+Accuracy and latency of the local intent engine against a labelled corpus.
+
+Every corpus entry lists the updates the local path must produce once its
+operations are validated, or null when the message has to fall through to
+the LLM. The latency section
+compares the local path with a completion from the stub LLM server.
+
+Usage (from backend/):
+    python -m benchmarks.intent_bench --latency 2.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.managers.intent_engine import IntentEngine
+from app.operations import validate_operations
+from .stub_llm import StubLLMServer
+
+CORPUS = os.path.join(os.path.dirname(__file__), "intent_corpus.json")
+
+def check_accuracy(engine: IntentEngine):
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+
+    failures = []
+    for entry in corpus:
+        operations = engine.match(entry["message"])
+        produced = validate_operations(operations)[0] if operations else None
+        if produced != entry["expected"]:
+            failures.append((entry["message"], entry["expected"], produced))
+
+    handled = sum(1 for entry in corpus if entry["expected"] is not None)
+    print(f"Accuracy: {len(corpus) - len(failures)}/{len(corpus)} correct, {handled} handled locally")
+    for message, expected, produced in failures:
+        print(f"  MISMATCH {message!r}\n    expected {expected}\n    produced {produced}")
+    return not failures
+
+async def measure_latency(engine: IntentEngine, latency: float, repeat: int):
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    from app.managers.ai_manager import AIManager
+
+    message = "Put the sum of A1:A3 in A4 and format A4 as currency"
+    start = time.perf_counter()
+    for _ in range(repeat):
+        engine.match(message)
+    local_ms = (time.perf_counter() - start) / repeat * 1000
+
+    stub = StubLLMServer(latency=latency, reply="", tool_calls=[{"name": "edit_sheet", "arguments": {"operations": [
+        {"op": "update", "range": "A4", "value": "=SUM(A1:A3)"},
+        {"op": "format", "range": "A4", "format": "CURRENCY"}
+    ]}}]).start()
+    manager = AIManager("stub-key", base_url=stub.base_url)
+    start = time.perf_counter()
+    await manager.analyze_message(message)
+    llm_ms = (time.perf_counter() - start) * 1000
+    stub.shutdown()
+
+    print(f"Latency: local {local_ms:.3f} ms, LLM path {llm_ms:.1f} ms (stub latency {latency}s)")
+
+def main(args):
+    engine = IntentEngine()
+    ok = check_accuracy(engine)
+    asyncio.run(measure_latency(engine, args.latency, args.repeat))
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=1000)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""
+Concurrent-socket load test for the /ws endpoint.
+
+Starts a stub LLM server and the FastAPI app in-process, then measures how
+message throughput scales with the number of simultaneously connected sockets.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --latency 0.5 --messages 5 --sockets 1 2 4 8 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from .stub_llm import StubLLMServer
+
+async def run_client(url: str, messages: int) -> int:
+    import websockets
+
+    async with websockets.connect(url) as ws:
+        await ws.recv()  # welcome message
+        for i in range(messages):
+            await ws.send(json.dumps({"type": "message", "content": f"Hello {i}"}))
+            await ws.recv()
+    return messages
+
+async def run_round(url: str, sockets: int, messages: int) -> float:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_client(url, messages) for _ in range(sockets)))
+    elapsed = time.perf_counter() - start
+    return sum(results) / elapsed
+
+async def main(args):
+    import uvicorn
+
+    stub = StubLLMServer(latency=args.latency).start()
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    os.environ.setdefault("AI_MAX_CONCURRENCY", str(max(args.sockets)))
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"ws://127.0.0.1:{args.port}/ws"
+    print(f"LLM latency {args.latency}s, {args.messages} messages per socket")
+    print(f"{'sockets':>8} {'msg/s':>10} {'speedup':>8}")
+    baseline = None
+    for sockets in args.sockets:
+        throughput = await run_round(url, sockets, args.messages)
+        baseline = baseline or throughput
+        print(f"{sockets:>8} {throughput:>10.2f} {throughput / baseline:>7.1f}x")
+
+    server.should_exit = True
+    await serve_task
+    stub.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sockets", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+Request scheduling under load: how long a light connection waits behind a
+busy one for shared completion slots, how many upstream calls a burst of
+superseding messages costs, and whether throttled completions recover.
+
+Usage (from backend/):
+    python -m benchmarks.scheduler_bench --latency 0.3 --burst 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from .stub_llm import StubLLMServer
+
+async def light_wait(fair: bool, heavy: int, service: float) -> float:
+    """Seconds a single request waits while another owner has heavy requests queued"""
+    from app.managers.request_scheduler import FairRateLimiter
+
+    # Four slots shared by every connection; the bucket holds a minute of tokens
+    limiter = FairRateLimiter(max_concurrency=4, tokens_per_minute=600000)
+
+    async def request(owner: str) -> float:
+        start = time.perf_counter()
+        async with limiter.acquire(owner, 1000):
+            waited = time.perf_counter() - start
+            await asyncio.sleep(service)
+        return waited
+
+    heavy_tasks = [asyncio.create_task(request("heavy")) for _ in range(heavy)]
+    await asyncio.sleep(0.01)
+    # Without fair queuing every request waits in one line
+    waited = await request("light" if fair else "heavy")
+    await asyncio.gather(*heavy_tasks)
+    return waited
+
+async def read_reply(ws, request_id: str) -> dict:
+    """Read frames until the final reply to request_id"""
+    while True:
+        frame = json.loads(await ws.recv())
+        if frame.get("type") not in ("delta", "cancelled") and frame.get("request_id") == request_id:
+            return frame
+
+async def burst(url: str, stub: StubLLMServer, count: int, supersede: bool):
+    import websockets
+
+    async with websockets.connect(url) as ws:
+        await ws.recv()  # welcome message
+        before = stub.requests
+        start = time.perf_counter()
+        for i in range(count):
+            await ws.send(json.dumps({
+                "type": "suggestion", "content": f"Summarize trend {i}", "stream": True,
+                "no_cache": True, "supersede": supersede, "request_id": f"r{i}"
+            }))
+        await read_reply(ws, f"r{count - 1}")
+        return time.perf_counter() - start, stub.requests - before
+
+async def main(args):
+    import uvicorn
+    import websockets
+
+    print(f"{'queuing':>8} {'light request wait ms':>22}")
+    for fair in (False, True):
+        waited = await light_wait(fair, args.heavy, 0.05)
+        print(f"{'fair' if fair else 'fifo':>8} {waited * 1000:>22.1f}")
+
+    stub = StubLLMServer(latency=args.latency).start()
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    os.environ.setdefault("AI_RETRY_BASE_SECONDS", "0.05")
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    url = f"ws://127.0.0.1:{args.port}/ws"
+
+    print(f"\n{args.burst} messages sent back to back, LLM latency {args.latency}s")
+    print(f"{'mode':>10} {'last reply s':>13} {'upstream calls':>15}")
+    for supersede in (False, True):
+        elapsed, calls = await burst(url, stub, args.burst, supersede)
+        print(f"{'supersede' if supersede else 'queue':>10} {elapsed:>13.2f} {calls:>15}")
+
+    async with websockets.connect(url) as ws:
+        await ws.recv()
+        stub.fail_first = stub.requests + 2
+        await ws.send(json.dumps({"type": "message", "content": "Retry check", "no_cache": True, "request_id": "retry"}))
+        reply = await read_reply(ws, "retry")
+        print(f"\n2 throttled responses, then: {'error' if reply.get('type') == 'error' else 'reply'} "
+              f"after {stub.requests - stub.fail_first + 2} attempts")
+
+    server.should_exit = True
+    await serve_task
+    stub.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--burst", type=int, default=8)
+    parser.add_argument("--heavy", type=int, default=30, help="Requests queued by the busy connection")
+    parser.add_argument("--port", type=int, default=8766)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,77 @@
+"""
+Memory and CPU of the columnar sheet snapshot against the list-of-lists plus
+DataFrame path it replaces, at 10k, 100k and 1M cells.
+
+The old path builds a DataFrame to read the sheet, converts it back to rows
+and rebuilds a DataFrame in each of three consumers (prompt, analysis and
+suggestions). The columnar path builds one snapshot and hands the same
+arrays to every consumer.
+
+Usage (from backend/):
+    python -m benchmarks.snapshot_bench --cells 10000 100000 1000000 --columns 10
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from app.columnar import ColumnarSheet
+from app.addressing import format_range
+
+def make_grid(rows: int, columns: int):
+    labels = [f"Account {i}" for i in range(200)]
+    header = ["Account"] + [f"FY{2000 + c}" for c in range(columns - 1)]
+    return [header] + [
+        [random.choice(labels)] + [round(random.random() * 1000, 2) for _ in range(columns - 1)]
+        for _ in range(rows)
+    ]
+
+def list_path(grid):
+    """Context as rows, then a DataFrame rebuilt by each consumer"""
+    df = pd.DataFrame(grid)
+    values = df.iloc[1:].reset_index(drop=True).values.tolist()
+    for _ in range(3):
+        pd.DataFrame(values).apply(pd.to_numeric, errors="coerce")
+    return values
+
+def columnar_path(grid, address):
+    """One snapshot whose arrays every consumer reads directly"""
+    table = ColumnarSheet.from_rows(grid, address)
+    for _ in range(3):
+        table.numeric_matrix(range(table.column_count))
+    return table
+
+def measure(fn, *args):
+    """Wall time, then peak allocation and memory still held by the result in a traced run"""
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    result = fn(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, retained
+
+def main(args):
+    print(f"{'cells':>9} {'list ms':>9} {'columnar ms':>12} {'list peak MB':>13} {'columnar peak MB':>17} "
+          f"{'list held MB':>13} {'columnar held MB':>17}")
+    for cells in args.cells:
+        rows = cells // args.columns
+        grid = make_grid(rows, args.columns)
+        address = format_range(0, 0, rows, args.columns - 1)
+
+        list_ms, list_peak, list_held = measure(list_path, grid)
+        columnar_ms, columnar_peak, columnar_held = measure(columnar_path, grid, address)
+        mb = 1024 * 1024
+        print(f"{cells:>9} {list_ms:>9.1f} {columnar_ms:>12.1f} {list_peak / mb:>13.1f} {columnar_peak / mb:>17.1f} "
+              f"{list_held / mb:>13.1f} {columnar_held / mb:>17.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cells", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--columns", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,110 @@
+"""
+Cold start of the backend as a fresh worker process sees it.
+
+Each run spawns uvicorn against the stub LLM server and measures the time
+until the worker answers HTTP, the import time the app reports on
+/metrics, and the latency of the first chat reply, sent after a short idle
+gap like a load balancer's first health check. Modes compare the
+background warm-up with deferring everything to first use.
+
+Usage (from backend/):
+    python -m benchmarks.startup_bench --runs 5
+    python -m benchmarks.startup_bench --baseline benchmarks/startup_baseline.json
+    python -m benchmarks.startup_bench --save-baseline benchmarks/startup_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+from .harness import compare, percentiles
+from .stub_llm import StubLLMServer
+
+MODES = {"warm": "true", "lazy": "false"}
+
+def scrape(port: int):
+    """Startup gauges from /metrics, or None while the worker is not answering"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+            text = response.read().decode()
+    except OSError:
+        return None
+    return {name: float(value) for name, value in re.findall(r"^fintelligent_startup_(\w+)_seconds (\S+)$", text, re.M)}
+
+async def first_reply(port: int) -> float:
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws") as ws:
+        await ws.recv()  # welcome message
+        start = time.perf_counter()
+        await ws.send(json.dumps({"type": "message", "content": "What can you help me with?",
+                                  "no_cache": True, "request_id": "first"}))
+        while json.loads(await ws.recv()).get("request_id") != "first":
+            pass
+        return time.perf_counter() - start
+
+def run_once(mode: str, port: int, base_url: str, idle: float):
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="stub-key", STARTUP_WARM_UP=MODES[mode],
+               PRECOMPUTE_WELCOME="false", LOG_LEVEL="WARNING")
+    started = time.perf_counter()
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while (gauges := scrape(port)) is None:
+            if worker.poll() is not None or time.perf_counter() - started > 60:
+                raise RuntimeError(f"Worker did not start in {mode} mode")
+            time.sleep(0.01)
+        ready = time.perf_counter() - started
+        time.sleep(idle)
+        reply = asyncio.run(first_reply(port))
+        return ready, gauges.get("import", 0.0), reply
+    finally:
+        worker.terminate()
+        worker.wait()
+
+def main(args):
+    stub = StubLLMServer(latency=args.latency).start()
+    results = {}
+    print(f"{args.runs} runs per mode, LLM latency {args.latency}s, first request {args.idle}s after ready")
+    print(f"{'mode':>6} {'ready ms':>9} {'import ms':>10} {'first reply ms':>15}")
+    for mode in args.modes:
+        samples = [run_once(mode, args.port, stub.base_url, args.idle) for _ in range(args.runs)]
+        ready, imported, reply = (percentiles([s[i] for s in samples])["p50"] for i in range(3))
+        print(f"{mode:>6} {ready:>9.1f} {imported:>10.1f} {reply:>15.1f}")
+        results.update({f"{mode}_ready_ms": ready, f"{mode}_import_ms": imported, f"{mode}_first_reply_ms": reply})
+    stub.shutdown()
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub LLM latency in seconds")
+    parser.add_argument("--idle", type=float, default=1.0, help="Seconds between ready and the first request")
+    parser.add_argument("--baseline", help="Fail when results regress against this file")
+    parser.add_argument("--save-baseline", help="Write the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--port", type=int, default=8768)
+    sys.exit(main(parser.parse_args()))
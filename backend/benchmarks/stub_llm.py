@@ -0,0 +1,165 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Replies after a configurable delay so benchmarks can exercise the backend
+without network access or API cost. A script of regex rules can pick the
+reply from the latest prompt, and a rule can call tools when the request
+offers them, to drive specific paths such as sheet edits.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional, Tuple
+import argparse
+import json
+import re
+import threading
+import time
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        # Model listing, which clients use to check the endpoint and warm a connection
+        if not self.path.rstrip("/").endswith("/models"):
+            self.send_error(404)
+            return
+        body = json.dumps({"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.requests += 1
+            throttled = self.server.requests <= self.server.fail_first
+        if throttled:
+            self._too_many_requests()
+            return
+        if request.get("stream"):
+            self._stream_reply(request)
+            return
+        time.sleep(self.server.latency)
+
+        reply, tool_calls = self.server.reply_for(request)
+        message = {"role": "assistant", "content": reply}
+        if tool_calls:
+            message["tool_calls"] = [
+                {"id": f"call_{i}", "type": "function",
+                 "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])}}
+                for i, call in enumerate(tool_calls)
+            ]
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _too_many_requests(self):
+        body = json.dumps({"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_reply(self, request: dict):
+        """Send the reply as server-sent events spread over the configured latency"""
+        reply, tool_calls = self.server.reply_for(request)
+        deltas = [{"content": token if i == 0 else " " + token} for i, token in enumerate(reply.split(" ")) if reply]
+        for i, call in enumerate(tool_calls):
+            # Name first, then the arguments in fragments, as the API streams them
+            arguments = json.dumps(call["arguments"])
+            deltas.append({"tool_calls": [{"index": i, "id": f"call_{i}", "type": "function",
+                                           "function": {"name": call["name"], "arguments": ""}}]})
+            deltas.extend({"tool_calls": [{"index": i, "function": {"arguments": arguments[start:start + 16]}}]}
+                          for start in range(0, len(arguments), 16))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for delta in deltas:
+            time.sleep(self.server.latency / len(deltas))
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.5, reply: str = "Stub reply.", fail_first: int = 0,
+                 script: Optional[List[Dict[str, Any]]] = None, tool_calls: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(("127.0.0.1", port), StubLLMHandler)
+        self.latency = latency
+        self.reply = reply
+        # [{"name", "arguments"}] called by the default reply when the request offers tools
+        self.tool_calls = tool_calls or []
+        # [{"match": regex, "reply": text, "tool_calls": [...]}], tried in order against the last message
+        self.script = [
+            (re.compile(rule["match"], re.IGNORECASE), rule.get("reply", ""), rule.get("tool_calls", []))
+            for rule in script or []
+        ]
+        # The first fail_first requests get a 429, to exercise client retries
+        self.fail_first = fail_first
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def reply_for(self, request: dict) -> Tuple[str, List[Dict[str, Any]]]:
+        """Reply text and tool calls for a request"""
+        messages = request.get("messages") or [{}]
+        prompt = messages[-1].get("content") or ""
+        reply, tool_calls = self.reply, self.tool_calls
+        for pattern, rule_reply, rule_calls in self.script:
+            if pattern.search(prompt):
+                reply, tool_calls = rule_reply, rule_calls
+                break
+        return reply, tool_calls if request.get("tools") else []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "StubLLMServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI-compatible server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--script", help="JSON file of {match, reply, tool_calls} rules")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    server = StubLLMServer(args.port, args.latency, script=script)
+    print(f"Stub LLM listening on {server.base_url} (latency {args.latency}s)")
+    server.serve_forever()
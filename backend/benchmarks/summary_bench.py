@@ -0,0 +1,56 @@
+"""
+Whole-sheet summaries by map-reduce against the stub LLM server.
+
+For each sheet size, times a cold summary at each concurrency (blocks in
+flight per request), then a warm one after editing a single cell, when
+every other block's summary comes from the cache.
+
+Usage (from backend/):
+    python -m benchmarks.summary_bench --rows 10000 50000 --concurrency 1 4 16 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from .harness import make_sheet
+from .stub_llm import StubLLMServer
+
+async def summarize(manager, context):
+    start = time.perf_counter()
+    result = await manager.analyze_message("Summarize this workbook", context, use_cache=True)
+    return time.perf_counter() - start, result.get("summary") or {}
+
+async def main(args):
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+    from app.columnar import ColumnarSheet
+    from app.managers.ai_manager import AIManager
+    from app.managers.cache_manager import ResponseCache
+    from app.managers.excel_manager import ExcelManager
+
+    stub = StubLLMServer(latency=args.latency, reply="Rows 2 to 300 hold steady revenue across regions.").start()
+    print(f"LLM latency {args.latency}s, blocks of {args.block_tokens} tokens")
+    print(f"{'rows':>8} {'blocks':>7} {'concurrency':>12} {'cold s':>8} {'warm s':>8} {'reused':>7}")
+    for rows in args.rows:
+        grid = make_sheet(rows)
+        context = ExcelManager._table_context(ColumnarSheet.from_rows(grid, f"A1:F{len(grid)}", "Sheet1"))
+        grid[len(grid) // 2][3] += 1
+        edited = ExcelManager._table_context(ColumnarSheet.from_rows(grid, f"A1:F{len(grid)}", "Sheet1"))
+        for concurrency in args.concurrency:
+            # A fresh cache per run, so each cold run summarizes every block
+            manager = AIManager("stub-key", base_url=stub.base_url, max_concurrency=concurrency,
+                                cache=ResponseCache(max_entries=100000),
+                                summary_block_tokens=args.block_tokens, summary_concurrency=concurrency)
+            cold, summary = await summarize(manager, context)
+            warm, warm_summary = await summarize(manager, edited)
+            print(f"{rows:>8} {summary.get('blocks', 0):>7} {concurrency:>12} {cold:>8.2f} {warm:>8.2f} "
+                  f"{warm_summary.get('cached_blocks', 0):>7}")
+    stub.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency in seconds")
+    parser.add_argument("--block-tokens", type=int, default=3000)
+    asyncio.run(main(parser.parse_args()))
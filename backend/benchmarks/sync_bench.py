@@ -0,0 +1,72 @@
+"""
+Bytes on the wire and server parse time for full-grid versus delta sync frames.
+
+Usage (from backend/):
+    python -m benchmarks.sync_bench --rows 1000 10000 50000 --columns 10
+"""
+import argparse
+import json
+import random
+import time
+
+from app.addressing import format_range
+from app.managers.snapshot_manager import SnapshotManager
+
+def make_grid(rows: int, columns: int):
+    header = [f"Column {c}" for c in range(columns)]
+    return [header] + [[round(random.random() * 1000, 2) for _ in range(columns)] for _ in range(rows - 1)]
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main(args):
+    print(f"{'rows':>8} {'full bytes':>12} {'delta bytes':>12} {'full ms':>9} {'delta ms':>9}")
+    for rows in args.rows:
+        grid = make_grid(rows, args.columns)
+        address = "Sheet1!" + format_range(0, 0, rows - 1, args.columns - 1)
+
+        # Current protocol: every message ships the whole used range
+        full_frame = json.dumps({
+            "type": "message",
+            "content": "What changed?",
+            "excel_context": {"values": grid, "address": address}
+        })
+
+        # Delta protocol: the snapshot is already synced, one row edit is sent
+        snapshots = SnapshotManager()
+        snapshots.apply_sync({"sheet": "Sheet1", "address": address, "version": 1, "full": True, "values": grid})
+        row = rows // 2
+        block = {"address": format_range(row, 1, row, 3), "values": [[1.0, 2.0, 3.0]]}
+
+        def delta_frame(version):
+            return json.dumps({
+                "type": "message",
+                "content": "What changed?",
+                "sync": {"sheet": "Sheet1", "address": address, "version": version,
+                         "base_version": version - 1, "full": False, "blocks": [block]}
+            })
+
+        def parse_full():
+            json.loads(full_frame)["excel_context"]
+
+        version = [1]
+
+        def parse_delta():
+            version[0] += 1
+            message = json.loads(delta_frame(version[0]))
+            snapshots.apply_sync(message["sync"])
+            snapshots.get_context()
+
+        full_ms = timed(parse_full, args.repeat)
+        delta_ms = timed(parse_delta, args.repeat)
+        print(f"{rows:>8} {len(full_frame):>12} {len(delta_frame(2)):>12} {full_ms:>9.3f} {delta_ms:>9.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,53 @@
+"""
+Per-call cost of the instrumentation on the request path: a timing span
+with and without an active request trace, a debug record while DEBUG is
+disabled, and the print it replaced.
+
+Usage (from backend/):
+    python -m benchmarks.telemetry_bench --calls 100000
+"""
+import argparse
+import io
+import logging
+import time
+from contextlib import redirect_stdout
+
+from app.telemetry import span, trace
+
+def per_call_ns(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) * 1e9 / calls
+
+def main(args):
+    logger = logging.getLogger("app.bench")
+    logger.setLevel(logging.INFO)
+    logging.getLogger("fintelligent").setLevel(logging.WARNING)
+    message = {"type": "message", "content": "What is the total revenue for Q3?", "stream": True}
+
+    def bare_span():
+        with span("bench"):
+            pass
+
+    def debug_record():
+        logger.debug("Received message: %s", message)
+
+    def debug_print():
+        print(f"Received message: {message}")
+
+    results = [("span, no request", per_call_ns(bare_span, args.calls))]
+    with trace("bench", "message"):
+        results.append(("span, in a request", per_call_ns(bare_span, args.calls)))
+    results.append(("logger.debug, disabled", per_call_ns(debug_record, args.calls)))
+    with redirect_stdout(io.StringIO()):
+        results.append(("print (previous)", per_call_ns(debug_print, args.calls)))
+
+    print(f"{'call':<24} {'ns/call':>10}")
+    for name, ns in results:
+        print(f"{name:<24} {ns:>10.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    main(parser.parse_args())
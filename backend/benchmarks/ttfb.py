@@ -0,0 +1,66 @@
+"""
+Time-to-first-frame comparison between buffered and streamed replies.
+
+Usage (from backend/):
+    python -m benchmarks.ttfb --latency 3 --words 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from .stub_llm import StubLLMServer
+
+async def measure(url: str, stream: bool, rounds: int):
+    import websockets
+
+    first, total = [], []
+    async with websockets.connect(url) as ws:
+        await ws.recv()  # welcome message
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await ws.send(json.dumps({"type": "message", "content": "Explain this model", "stream": stream}))
+            first_frame = None
+            while True:
+                frame = json.loads(await ws.recv())
+                first_frame = first_frame or time.perf_counter() - start
+                if not stream or frame.get("stream_end"):
+                    break
+            first.append(first_frame)
+            total.append(time.perf_counter() - start)
+    return sum(first) / rounds, sum(total) / rounds
+
+async def main(args):
+    import uvicorn
+
+    reply = " ".join(f"word{i}" for i in range(args.words))
+    stub = StubLLMServer(latency=args.latency, reply=reply).start()
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub-key")
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    url = f"ws://127.0.0.1:{args.port}/ws"
+    print(f"LLM latency {args.latency}s, {args.words} words per reply")
+    print(f"{'mode':>10} {'first frame (s)':>16} {'complete (s)':>13}")
+    for stream in (False, True):
+        first, total = await measure(url, stream, args.rounds)
+        print(f"{'streamed' if stream else 'buffered':>10} {first:>16.3f} {total:>13.3f}")
+
+    server.should_exit = True
+    await serve_task
+    stub.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=3.0)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8766)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+"""
+Cost of indexing a many-tab workbook: the first index build, a full
+re-check of an unchanged workbook and a cross-sheet lookup, against reading
+every sheet body.
+
+Usage (from backend/):
+    python -m benchmarks.workbook_index_bench --sheets 10 40 80 --rows 2000 --call-latency 0.002 --cell-cost 0.000002
+"""
+import argparse
+import time
+
+from app.managers.excel_backends import FakeWorkbookBackend
+from app.managers.excel_manager import ExcelManager
+
+class SlowBackend(FakeWorkbookBackend):
+    """Fake workbook charging a round-trip per call plus a transfer cost per cell, like COM"""
+
+    def __init__(self, sheets, latency: float, cell_cost: float):
+        super().__init__(sheets)
+        self.latency = latency
+        self.cell_cost = cell_cost
+
+    def _charge(self, cells: int = 0):
+        time.sleep(self.latency + cells * self.cell_cost)
+
+    def sheet_names(self):
+        self._charge()
+        return super().sheet_names()
+
+    def used_range_address(self, sheet=None):
+        self._charge()
+        return super().used_range_address(sheet)
+
+    def used_range_values(self, sheet=None):
+        values = super().used_range_values(sheet)
+        self._charge(sum(len(row) for row in values))
+        return values
+
+    def get_values(self, address, sheet=None):
+        values = super().get_values(address, sheet)
+        self._charge(sum(len(row) for row in values))
+        return values
+
+def make_workbook(sheets: int, rows: int):
+    workbook = {}
+    for s in range(sheets):
+        grid = [["Line item"] + [f"FY{2020 + c}" for c in range(10)]]
+        grid += [[f"Sheet {s} item {r}"] + [r * c + s for c in range(10)] for r in range(rows)]
+        workbook[f"Tab{s}"] = grid
+    workbook["Tab1"][5][0] = "Cost of Equity"
+    return workbook
+
+def main(args):
+    print(f"{'sheets':>7} {'read all ms':>12} {'index ms':>9} {'refresh ms':>11} {'lookup ms':>10} {'cached cells':>13}")
+    for count in args.sheets:
+        backend = SlowBackend(make_workbook(count, args.rows), args.call_latency, args.cell_cost)
+
+        start = time.perf_counter()
+        for name in backend.sheet_names():
+            backend.used_range_values(name)
+        read_all_ms = (time.perf_counter() - start) * 1000
+
+        manager = ExcelManager(backend)
+        start = time.perf_counter()
+        manager.index.refresh(backend)
+        index_ms = (time.perf_counter() - start) * 1000
+
+        manager.index.expire()
+        start = time.perf_counter()
+        manager.index.refresh(backend)
+        refresh_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        workbook = manager._workbook_context("What is the cost of equity?", "Tab0")
+        lookup_ms = (time.perf_counter() - start) * 1000
+        assert workbook["cells"], "label lookup found nothing"
+
+        print(f"{count:>7} {read_all_ms:>12.1f} {index_ms:>9.1f} {refresh_ms:>11.1f} {lookup_ms:>10.1f} {manager.sheet_store.cells:>13}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sheets", type=int, nargs="+", default=[10, 40, 80])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--call-latency", type=float, default=0.002)
+    parser.add_argument("--cell-cost", type=float, default=0.000002)
+    main(parser.parse_args())
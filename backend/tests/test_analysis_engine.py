@@ -0,0 +1,21 @@
+import pytest
+
+from app.managers.analysis_engine import RATE_MESSAGE_PATTERN
+
+def message_rate(message):
+    match = RATE_MESSAGE_PATTERN.search(message)
+    return match and float(match.group(1) or match.group(2))
+
+@pytest.mark.parametrize("message, expected", [
+    ("what is the NPV at 8%", 8),
+    ("npv at 7.5 %", 7.5),
+    ("use a discount rate of 9%", 9),
+    ("discounted at 10%", 10),
+    ("assume 11% WACC", 11)
+])
+def test_rates_beside_rate_wording_are_found(message, expected):
+    assert message_rate(message) == expected
+
+@pytest.mark.parametrize("message", ["at year end it grew 12%", "sales grew 12%", "at 2023 revenue was up 5%"])
+def test_unrelated_percentages_are_ignored(message):
+    assert message_rate(message) is None
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from app.managers.cache_manager import ResponseCache
+from app.managers.state_store import MemoryStateStore
+
+def test_sqlite_tier_survives_eviction_and_restarts(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        cache = ResponseCache(max_entries=1, db_path=path)
+        await cache.set("a", {"reply": "first"})
+        await cache.set("b", "second")
+        assert await cache.get("a") == {"reply": "first"}
+        assert cache.stats()["disk_hits"] == 1
+        assert await ResponseCache(db_path=path).get("b") == "second"
+
+    asyncio.run(run())
+
+def test_expired_entries_are_not_served(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        await ResponseCache(db_path=path).set("a", "old")
+        cache = ResponseCache(db_path=path, ttl_seconds=0.01)
+        time.sleep(0.02)
+        assert await cache.get("a") is None
+        assert cache.stats()["misses"] == 1
+
+    asyncio.run(run())
+
+def test_shared_store_fills_the_local_tier():
+    async def run():
+        store = MemoryStateStore()
+        await ResponseCache(store=store).set("k", [1, 2])
+        cache = ResponseCache(store=store)
+        assert await cache.get("k") == [1, 2]
+        assert cache.stats()["shared_hits"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import pytest
+
+from app.columnar import ColumnarSheet
+
+ROWS = [
+    ["Name", "Amount", "Flag"],
+    ["alpha", 1, True],
+    ["beta", 1.0, None],
+    [None, 2.5, "yes"],
+    ["alpha", None, False]
+]
+
+def make_table():
+    return ColumnarSheet.from_rows(ROWS, "A1:C5", "Data")
+
+def test_bytes_round_trip_keeps_values_and_metadata():
+    table = make_table()
+    restored, meta = ColumnarSheet.from_bytes(table.to_bytes({"version": 3}))
+    assert meta == {"version": 3}
+    assert restored.to_rows() == table.to_rows()
+    assert (restored.address, restored.sheet, restored.headers) == (table.address, table.sheet, table.headers)
+    assert restored.fingerprint() == table.fingerprint()
+
+def test_bytes_round_trip_keeps_bool_and_number_distinct():
+    table = ColumnarSheet.from_rows([["Mixed"], [True], [1], [1.0], ["1"]], "A1:A5")
+    values = [row[0] for row in ColumnarSheet.from_bytes(table.to_bytes())[0].to_rows(include_header=False)]
+    assert values == [True, 1, 1.0, "1"]
+    assert [type(v) for v in values] == [bool, int, float, str]
+
+@pytest.mark.parametrize("data", [b"", b"\x05\x00\x00\x00{}", b"\xff\xff\x00\x00{}"])
+def test_malformed_bytes_raise_value_error(data):
+    with pytest.raises(ValueError):
+        ColumnarSheet.from_bytes(data)
+
+def test_truncated_buffer_raises_value_error():
+    data = make_table().to_bytes()
+    with pytest.raises(ValueError):
+        ColumnarSheet.from_bytes(data[:-4])
+
+def test_with_blocks_writes_cells_and_shares_untouched_columns():
+    table = make_table()
+    updated = table.with_blocks("A1:C5", [{"address": "B2:B3", "values": [[10], [20]]}])
+    assert [row[1] for row in updated.to_rows(include_header=False)] == [10, 20, 2.5, None]
+    assert updated.columns[0] is table.columns[0]
+    assert table.value_at(1, 1) == 1
+
+def test_with_blocks_grows_the_range_and_renames_headers():
+    updated = make_table().with_blocks("A1:D6", [
+        {"address": "D1", "values": [["Note"]]},
+        {"address": "A6:D6", "values": [["gamma", 4, True, "new"]]}
+    ])
+    assert updated.headers[-1] == "Note"
+    assert updated.row(updated.row_count - 1) == ["gamma", 4, True, "new"]
+    assert updated.value_at(1, 3) is None
+
+def test_with_blocks_rejects_a_moved_origin():
+    with pytest.raises(ValueError):
+        make_table().with_blocks("B2:D6", [])
@@ -0,0 +1,63 @@
+from app.managers.excel_backends import FakeWorkbookBackend
+from app.managers.excel_manager import ExcelManager
+
+def make_manager():
+    backend = FakeWorkbookBackend({"Sheet1": [[1, 2, 3], [4, 5, 6], [7, 8, 9]]})
+    manager = ExcelManager(backend)
+    manager.connect_to_excel()
+    return backend, manager
+
+def fail_at(backend, method, address):
+    original = getattr(backend, method)
+
+    def call(target, *args):
+        if target == address:
+            raise RuntimeError(f"{method} failed")
+        return original(target, *args)
+
+    setattr(backend, method, call)
+
+def test_batch_applies_values_and_formats():
+    backend, manager = make_manager()
+    result = manager.apply_batch([
+        {"type": "update", "cell": "A1", "value": 10},
+        {"type": "update", "cell": "B1", "value": 20},
+        {"type": "format", "range": "C1:C3", "format": "CURRENCY"}
+    ])
+    assert result["success"]
+    assert backend.sheets["Sheet1"][0][:2] == [10, 20]
+    assert backend.get_number_format("C1:C3") == "$#,##0.00"
+
+def test_failed_write_rolls_back_earlier_writes():
+    backend, manager = make_manager()
+    fail_at(backend, "set_value", "C3")
+    result = manager.apply_batch([
+        {"type": "update", "cell": "A1", "value": 10},
+        {"type": "update", "cell": "C3", "value": 30}
+    ])
+    assert not result["success"] and result["rolled_back"]
+    assert [s["status"] for s in result["statuses"]] == ["rolled_back", "failed"]
+    assert backend.sheets["Sheet1"] == [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+
+def test_rollback_restores_mixed_number_formats():
+    backend, manager = make_manager()
+    backend.set_number_format("A1", "0.00%")
+    backend.set_number_format("B3:C3", "$#,##0.00")
+    before = {cell: f for cell, f in backend.number_formats.items() if f != "General"}
+
+    fail_at(backend, "set_number_format", "D1")
+    result = manager.apply_batch([
+        {"type": "format", "range": "A1:C3", "format": "NUMBER"},
+        {"type": "format", "range": "D1", "format": "CURRENCY"}
+    ])
+    assert result["rolled_back"]
+    assert {cell: f for cell, f in backend.number_formats.items() if f != "General"} == before
+
+def test_invalid_plan_applies_nothing():
+    backend, manager = make_manager()
+    result = manager.apply_batch([
+        {"type": "update", "cell": "A1", "value": 10},
+        {"type": "update", "cell": "not a cell", "value": 1}
+    ])
+    assert not result["success"] and not result["rolled_back"]
+    assert backend.sheets["Sheet1"][0][0] == 1
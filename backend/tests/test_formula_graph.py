@@ -0,0 +1,76 @@
+import pytest
+
+from app.managers.formula_graph import FormulaGraph, UnsupportedFormula, parse_formula
+
+def graph(formulas, values=None, sheet="Sheet1", address=None):
+    g = FormulaGraph()
+    address = address or f"A1:{chr(ord('A') + len(formulas[0]) - 1)}{len(formulas)}"
+    g.load_sheet(sheet, address, formulas, values or formulas)
+    return g
+
+def new_values(g, changes, sheet="Sheet1"):
+    return {result["cell"]: result["new"] for result in g.preview(sheet, changes)}
+
+def test_parse_follows_excel_precedence():
+    # Unary minus binds tighter than ^, and ^ is left-associative
+    assert parse_formula("=-2^2", "S") == ("op", "^", ("neg", ("num", 2.0)), ("num", 2.0))
+    assert parse_formula("=2^3^2", "S") == ("op", "^", ("op", "^", ("num", 2.0), ("num", 3.0)), ("num", 2.0))
+    assert parse_formula("=A1+B2*3", "S") == (
+        "op", "+", ("ref", "S", 0, 0), ("op", "*", ("ref", "S", 1, 1), ("num", 3.0))
+    )
+    assert parse_formula("='My Rates'!B2:B9", "S") == ("range", "My Rates", 1, 1, 8, 1)
+
+@pytest.mark.parametrize("formula", ["=SUM(A1", "=A1+", "=A0*2", "=1 2"])
+def test_unparseable_formulas_are_unsupported(formula):
+    with pytest.raises(UnsupportedFormula):
+        parse_formula(formula, "S")
+
+@pytest.mark.parametrize("formula, expected", [
+    ("=COUNT(A1,B1)", 1.0),
+    ("=AVERAGE(A1,B1)", 6.0),
+    ("=SUM(A1,B1)", 6.0),
+    ("=SUM(A1:B1)", 6.0),
+    ("=MIN(A1,B1)", 6.0),
+    ("=SUM(A1,\"4\")", 10.0),
+    ("=SUM(A1,TRUE)", 7.0),
+])
+def test_referenced_blanks_and_text_are_skipped(formula, expected):
+    for blank in (None, "x", True):
+        g = graph([[6, blank, formula]])
+        assert new_values(g, {"A1": 6}) == {"C1": expected}
+
+def test_literal_text_is_coerced():
+    g = graph([[6, None, "=SUM(A1,\"x\")"]])
+    assert new_values(g, {"A1": 6}) == {"C1": "#VALUE!"}
+
+def test_errors_propagate_and_division_by_zero():
+    g = graph([[1, None, "=A1/B1", "=C1+1", "=IF(A1>0,\"up\",\"down\")"]])
+    assert new_values(g, {"A1": 2}) == {"C1": "#DIV/0!", "D1": "#DIV/0!", "E1": "up"}
+
+def test_round_halves_away_from_zero():
+    g = graph([[2.5, "=ROUND(A1)", "=ROUND(-A1)", "=ROUND(A1/10,1)"]])
+    assert new_values(g, {"A1": 2.5}) == {"B1": 3.0, "C1": -3.0, "D1": 0.3}
+
+def test_preview_leaves_the_graph_untouched_and_apply_commits():
+    g = graph([[10, "=A1*2", "=B1+1"]], [[10, 20, 21]])
+    assert new_values(g, {"A1": 20}) == {"B1": 40.0, "C1": 41.0}
+    assert g.values[("Sheet1", 0, 1)] == 20
+    g.apply("Sheet1", {"A1": 20})
+    assert g.values[("Sheet1", 0, 2)] == 41.0
+
+def test_cycles_are_reported():
+    g = graph([[1, "=A1+C1", "=B1"]], [[1, 0, 0]])
+    assert new_values(g, {"A1": 2}) == {"B1": "#CIRC!", "C1": "#CIRC!"}
+
+def test_other_sheets_are_read_through_external_values():
+    g = graph([[10, "=Rates!A1*A1", "=B1+1"]], [[10, 0.5, 1.5]])
+    assert g.unresolved_sheets("Sheet1", ["A1"]) == {"Rates"}
+    g.external = {"Rates": lambda row, column: 0.05 if (row, column) == (0, 0) else None}
+    assert g.unresolved_sheets("Sheet1", ["A1"]) == set()
+    assert new_values(g, {"A1": 20}) == {"B1": 1.0, "C1": 2.0}
+
+def test_cells_reading_unloaded_sheets_are_left_out():
+    g = graph([[10, "=SUM(Rates!A1:A3)*A1", "=B1+1", "=A1*2", "=SUM(B1:B2)"]], [[10, 1, 2, 20, 1]])
+    assert new_values(g, {"A1": 20}) == {"D1": 40.0}
+    g.apply("Sheet1", {"A1": 20})
+    assert g.values[("Sheet1", 0, 1)] == 1
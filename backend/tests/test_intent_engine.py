@@ -0,0 +1,30 @@
+from app.managers.ai_manager import AIManager
+from app.managers.intent_engine import IntentEngine
+
+CONTEXT = {"sheet": "Sheet1", "address": "A1:C5"}
+
+def local_result(message, context=CONTEXT):
+    return AIManager("test-key", intent_engine=IntentEngine())._match_local(message, context, None)
+
+def test_match_returns_edit_sheet_operations():
+    assert IntentEngine().match("put the sum of A1:A3 in A4 and format A4 as currency") == [
+        {"op": "update", "range": "A4", "value": "=SUM(A1:A3)"},
+        {"op": "format", "range": "A4", "format": "CURRENCY"},
+    ]
+
+def test_local_result_is_validated():
+    result = local_result("percentage change from B2 to C2 in D2")
+    assert result["local"] is True
+    assert result["updates"] == [
+        {"type": "update", "cell": "D2", "value": "=(C2-B2)/B2"},
+        {"type": "format", "range": "D2", "format": "PERCENTAGE"},
+    ]
+
+def test_invalid_operations_fall_back_to_the_model():
+    assert local_result("sum of A1:A3 in A0") is None
+    assert local_result("sum of A0:A3 in A5") is None
+    assert local_result("sum of A1:A3 in Rates!A4", {"sheet": "Sheet1", "address": "A1:C5"}) is None
+
+def test_circular_and_unknown_requests_fall_back():
+    assert IntentEngine().match("sum of A1:A4 in A3") is None
+    assert IntentEngine().match("explain the revenue trend") is None
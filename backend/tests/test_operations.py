@@ -0,0 +1,64 @@
+import pytest
+
+from app.addressing import parse_cell, parse_range
+from app.operations import MAX_OPERATION_CELLS, validate_operations
+
+CONTEXT = {"sheet": "Sheet1", "address": "A1:F20"}
+
+def test_parse_cell_rejects_row_zero():
+    with pytest.raises(ValueError):
+        parse_cell("A0")
+    with pytest.raises(ValueError):
+        parse_range("A0:B2")
+    assert parse_cell("$B$10") == (9, 1)
+
+@pytest.mark.parametrize("address", ["A0", "A0:B2", "XFE1", "A1048577"])
+def test_update_outside_the_sheet_is_rejected(address):
+    updates, errors = validate_operations([{"op": "update", "range": address, "value": 1}], CONTEXT)
+    assert updates == []
+    assert len(errors) == 1
+
+def test_update_expands_values_by_shape():
+    updates, errors = validate_operations(
+        [{"op": "update", "range": "B2:C3", "values": [[1, 2], [3, "=B2*2"]]}], CONTEXT
+    )
+    assert errors == []
+    assert [(u["cell"], u["value"]) for u in updates] == [("B2", 1), ("C2", 2), ("B3", 3), ("C3", "=B2*2")]
+
+@pytest.mark.parametrize("values", [[[1, 2]], [[1], [2]], [[1, 2], [3]], "12", [[1, 2], [3, {"x": 1}]]])
+def test_update_values_of_the_wrong_shape_are_rejected(values):
+    updates, errors = validate_operations([{"op": "update", "range": "B2:C3", "values": values}], CONTEXT)
+    assert updates == []
+    assert len(errors) == 1
+
+def test_update_cell_count_is_checked_before_expanding():
+    _, errors = validate_operations([{"op": "update", "range": "A1:XFD1048576", "value": 0}], CONTEXT)
+    assert errors == [f"Operation 1: update of A1:XFD1048576 covers more than {MAX_OPERATION_CELLS} cells"]
+
+def test_malformed_formula_is_rejected():
+    _, errors = validate_operations([{"op": "update", "range": "A1", "value": "=SUM(A2:A3"}], CONTEXT)
+    assert len(errors) == 1
+
+def test_other_sheets_cannot_be_edited():
+    _, errors = validate_operations([{"op": "update", "range": "Rates!A1", "value": 1}], CONTEXT)
+    assert "only Sheet1 can be edited" in errors[0]
+
+def test_clear_is_clipped_to_the_used_range():
+    updates, errors = validate_operations([{"op": "clear", "range": "E10:Z500"}], CONTEXT)
+    assert errors == []
+    assert updates == [{"type": "clear", "range": "E10:F20"}]
+    assert validate_operations([{"op": "clear", "range": "H1:H5"}], CONTEXT) == ([], [])
+
+def test_insert_that_pushes_cells_off_the_sheet_is_rejected():
+    context = {"sheet": "Sheet1", "address": "A1:B1048570"}
+    _, errors = validate_operations([{"op": "insert", "range": "A2:A20"}], context)
+    assert "off the sheet" in errors[0]
+    updates, errors = validate_operations([{"op": "insert", "range": "C1", "shift": "right"}], context)
+    assert errors == [] and updates == [{"type": "insert", "range": "C1", "shift": "right"}]
+
+def test_errors_name_the_operation_and_keep_valid_ones():
+    updates, errors = validate_operations(
+        [{"op": "format", "range": "B2:B5", "format": "currency"}, {"op": "delete", "range": "A1"}], CONTEXT
+    )
+    assert updates == [{"type": "format", "range": "B2:B5", "format": "CURRENCY"}]
+    assert errors == ["Operation 2: Unsupported operation: delete"]
@@ -0,0 +1,94 @@
+import asyncio
+
+from app.managers.request_scheduler import RequestCancelled, RequestScheduler
+
+def sync(version, base_version=None, blocks=None, full=False):
+    content = {"sheet": "Sheet1", "version": version, "full": full, "blocks": blocks or []}
+    if base_version is not None:
+        content["base_version"] = base_version
+    return {"type": "excel_sync", "content": content}
+
+def test_rapid_syncs_are_debounced_into_one():
+    handled = []
+
+    async def handler(frame):
+        handled.append(frame)
+
+    async def run():
+        scheduler = RequestScheduler(handler, sync_debounce=0.05)
+        task = asyncio.create_task(scheduler.run())
+        await scheduler.submit(sync(1, 0, [{"address": "A1", "values": [[1]]}]))
+        await scheduler.submit(sync(2, 1, [{"address": "B1", "values": [[2]]}]))
+        await scheduler.submit(sync(2, 1))
+        await asyncio.sleep(0.02)
+        assert handled == []
+        await asyncio.sleep(0.08)
+        task.cancel()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert len(handled) == 1 and scheduler.coalesced == 2
+    content = handled[0]["content"]
+    assert (content["base_version"], content["version"]) == (0, 2)
+    assert [block["address"] for block in content["blocks"]] == ["A1", "B1"]
+
+def test_message_flushes_queued_sync_without_waiting():
+    handled = []
+
+    async def handler(frame):
+        handled.append(frame["type"])
+
+    async def run():
+        scheduler = RequestScheduler(handler, sync_debounce=10)
+        task = asyncio.create_task(scheduler.run())
+        await scheduler.submit(sync(1, full=True))
+        await scheduler.submit({"type": "message", "content": "hi"})
+        await asyncio.sleep(0.02)
+        task.cancel()
+
+    asyncio.run(run())
+    assert handled == ["excel_sync", "message"]
+
+def test_superseding_message_cancels_the_request_in_flight():
+    outcomes = []
+
+    async def run():
+        started = asyncio.Event()
+
+        async def handler(frame):
+            if frame["request_id"] == "1":
+                started.set()
+            try:
+                await scheduler.cancellable(asyncio.sleep(1 if frame["request_id"] == "1" else 0))
+                outcomes.append((frame["request_id"], "done"))
+            except RequestCancelled:
+                outcomes.append((frame["request_id"], "cancelled"))
+
+        scheduler = RequestScheduler(handler)
+        task = asyncio.create_task(scheduler.run())
+        await scheduler.submit({"type": "message", "request_id": "1"})
+        await scheduler.submit({"type": "message", "request_id": "2"})
+        await started.wait()
+        cancelled = await scheduler.submit({"type": "message", "request_id": "3", "supersede": True})
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return cancelled
+
+    cancelled = asyncio.run(run())
+    assert [frame["request_id"] for frame in cancelled] == ["1", "2"]
+    assert outcomes == [("1", "cancelled"), ("3", "done")]
+
+def test_cancel_frame_removes_only_the_matching_request():
+    async def handler(frame):
+        await asyncio.sleep(1)
+
+    async def run():
+        scheduler = RequestScheduler(handler)
+        await scheduler.submit({"type": "message", "request_id": "1"})
+        await scheduler.submit({"type": "message", "request_id": "2"})
+        cancelled = await scheduler.submit({"type": "cancel", "request_id": "1"})
+        return scheduler, cancelled
+
+    scheduler, cancelled = asyncio.run(run())
+    assert [frame["request_id"] for frame in cancelled] == ["1"]
+    assert [entry[0]["request_id"] for entry in scheduler.pending] == ["2"]